@@ -0,0 +1,80 @@
+# assets/fields.py
+"""
+Serializer helpers for image uploads backed by MediaAsset.
+"""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from rest_framework import serializers
+
+from .imaging import SNIFF_BYTES, sniff_extension
+from .models import MediaAsset
+from .storage import store_upload
+
+
+class MediaUploadField(serializers.FileField):
+    """
+    Accepts JPEG, PNG, GIF and WebP uploads up to MEDIA_MAX_UPLOAD_SIZE.
+    The format is checked from the first bytes only; decoding happens in the worker.
+    """
+    default_error_messages = {
+        'invalid_image': "Upload a valid image (JPEG, PNG, GIF or WebP).",
+        'too_large': "The image is too large (at most {max_size} bytes).",
+    }
+
+    def to_internal_value(self, data):
+        upload = super().to_internal_value(data)
+        if upload.size > settings.MEDIA_MAX_UPLOAD_SIZE:
+            self.fail('too_large', max_size=settings.MEDIA_MAX_UPLOAD_SIZE)
+        header = upload.read(SNIFF_BYTES)
+        upload.seek(0)
+        if sniff_extension(header) is None:
+            self.fail('invalid_image')
+        return upload
+
+
+def load_assets(asset_ids):
+    """
+    Returns {asset_id: MediaAsset} with only what is needed to render variant URLs.
+    """
+    asset_ids = {asset_id for asset_id in asset_ids if asset_id is not None}
+    if not asset_ids:
+        return {}
+    return MediaAsset.objects.only('id', 'status', 'variants').in_bulk(asset_ids)
+
+
+def variant_urls(asset, request=None):
+    """
+    Returns {variant: absolute URL} of a processed asset, or None while it is still being processed.
+    """
+    if asset is None or asset.status != MediaAsset.READY:
+        return None
+    urls = {}
+    for variant, name in asset.variants.items():
+        url = default_storage.url(name)
+        urls[variant] = request.build_absolute_uri(url) if request is not None else url
+    return urls
+
+
+class MediaUploadSerializerMixin:
+    """
+    ModelSerializer mixin storing uploads through store_upload(): the model's
+    file field receives the name of the (deduplicated) original and its
+    MediaAsset foreign key the asset. `media_fields` maps each upload field to that foreign key.
+    """
+    media_fields = {}
+
+    def _store_media(self, validated_data):
+        for field, asset_field in self.media_fields.items():
+            if field in validated_data:
+                upload = validated_data[field]
+                asset = store_upload(upload) if upload else None
+                validated_data[field] = asset.original.name if asset else None
+                validated_data[asset_field] = asset
+
+    def create(self, validated_data):
+        self._store_media(validated_data)
+        return super().create(validated_data)
+
+    def update(self, instance, validated_data):
+        self._store_media(validated_data)
+        return super().update(instance, validated_data)
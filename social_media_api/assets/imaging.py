@@ -0,0 +1,55 @@
+# assets/imaging.py
+"""
+Image decoding and resizing, run by the process_media worker pool.
+
+This module only depends on Pillow (no Django imports), so pool processes can
+import it cheaply and nothing here touches the database or settings.
+"""
+from PIL import Image, ImageOps
+
+# Signatures of the accepted upload formats: (prefix offset, prefix) -> extension
+SIGNATURES = (
+    ((0, b'\xff\xd8\xff'), '.jpg'),
+    ((0, b'\x89PNG\r\n\x1a\n'), '.png'),
+    ((0, b'GIF87a'), '.gif'),
+    ((0, b'GIF89a'), '.gif'),
+    ((8, b'WEBP'), '.webp'),
+)
+SNIFF_BYTES = 16
+
+
+def sniff_extension(header):
+    """
+    Returns the file extension for the first bytes of an upload, or None if
+    it is not a supported image format. Nothing is decoded.
+    """
+    for (offset, prefix), extension in SIGNATURES:
+        if header[offset:offset + len(prefix)] == prefix:
+            return extension
+    return None
+
+
+def render_variants(source_path, targets, quality=85, max_pixels=None):
+    """
+    Decodes the image at `source_path` once and writes a JPEG per target.
+    `targets` maps a variant name to (destination path, longest side in pixels);
+    images are only ever scaled down. Returns {'width': ..., 'height': ...} of the original.
+    """
+    Image.MAX_IMAGE_PIXELS = max_pixels
+    with Image.open(source_path) as image:
+        image = ImageOps.exif_transpose(image) # Respect camera orientation
+        width, height = image.size
+        if image.mode in ('RGBA', 'LA', 'P'):
+            # Flatten transparency onto white; JPEG has no alpha channel
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        for destination, longest_side in targets.values():
+            variant = image.copy()
+            variant.thumbnail((longest_side, longest_side), Image.Resampling.LANCZOS)
+            variant.save(destination, 'JPEG', quality=quality, optimize=True, progressive=True)
+    return {'width': width, 'height': height}
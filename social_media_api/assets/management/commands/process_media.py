@@ -0,0 +1,44 @@
+# assets/management/commands/process_media.py
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from assets.processing import process_all
+
+
+class Command(BaseCommand):
+    """
+    Worker that generates the resized variants of uploaded images.
+    Images are decoded in a pool of processes, off the request path.
+    Runs once by default; use --loop to keep polling for new uploads.
+    """
+    help = "Generates thumbnail and preview variants for pending media assets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Image processes in the pool (0 processes inline).")
+        parser.add_argument('--batch-size', type=int, default=20, help="Assets claimed per batch.")
+        parser.add_argument('--max-attempts', type=int, default=3, help="Failed attempts before an asset is marked failed.")
+        parser.add_argument('--loop', action='store_true', help="Keep processing until interrupted.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when nothing is pending (with --loop).")
+
+    def handle(self, *args, **options):
+        executor = None
+        if options['workers'] > 0:
+            # Spawned (not forked) processes: they only import assets/imaging.py and never share DB connections
+            executor = ProcessPoolExecutor(max_workers=options['workers'], mp_context=multiprocessing.get_context('spawn'))
+        try:
+            while True:
+                ready, failed = process_all(
+                    batch_size=options['batch_size'], max_attempts=options['max_attempts'], executor=executor,
+                )
+                if ready or failed or not options['loop']:
+                    self.stdout.write(f"Processed {ready} images, {failed} failed.")
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+        finally:
+            if executor is not None:
+                executor.shutdown()
@@ -0,0 +1,40 @@
+from django.db import models
+# assets/models.py
+
+
+class MediaAsset(models.Model):
+    """
+    An uploaded image, stored once per distinct content (keyed by its SHA-256)
+    together with the resized variants generated by the process_media worker.
+    Post.media and CustomUser.profile_picture point at the original file.
+    """
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (PROCESSING, 'Processing'),
+        (READY, 'Ready'),
+        (FAILED, 'Failed'),
+    )
+
+    sha256 = models.CharField(max_length=64, unique=True)
+    original = models.FileField(upload_to='originals/', max_length=255)
+    size = models.PositiveBigIntegerField() # Bytes
+    width = models.PositiveIntegerField(null=True, blank=True) # Known once processed
+    height = models.PositiveIntegerField(null=True, blank=True)
+    status = models.CharField(max_length=12, choices=STATUS_CHOICES, default=PENDING)
+    variants = models.JSONField(default=dict, blank=True) # Variant name -> storage name
+    attempts = models.PositiveSmallIntegerField(default=0)
+    claimed_at = models.DateTimeField(null=True, blank=True) # When a worker started processing it
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'id'], name='mediaasset_status_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.sha256[:12]} ({self.status})"
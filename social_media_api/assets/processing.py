@@ -0,0 +1,123 @@
+# assets/processing.py
+"""
+Generation of resized variants for pending media assets.
+
+The process_media worker claims a batch of pending assets, decodes and resizes
+them in a process pool (assets/imaging.py), and records the results. Claimed
+assets are marked `processing`; a claim older than MEDIA_CLAIM_TIMEOUT seconds
+is considered abandoned (e.g. the worker crashed) and is picked up again.
+Assets that keep failing are marked `failed` after `max_attempts` tries,
+including those abandoned on their last try.
+"""
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from posts.models import Post
+from users.cards import invalidate_card
+from users.models import CustomUser
+from .imaging import render_variants
+from .models import MediaAsset
+from .storage import variant_name
+
+
+def claim_batch(batch_size, max_attempts):
+    """
+    Marks up to `batch_size` pending (or abandoned) assets as processing and returns them.
+    Abandoned assets without attempts left are marked failed instead.
+    SKIP LOCKED lets several workers claim batches concurrently.
+    """
+    now = timezone.now()
+    abandoned = now - timedelta(seconds=settings.MEDIA_CLAIM_TIMEOUT)
+    MediaAsset.objects.filter(
+        status=MediaAsset.PROCESSING, claimed_at__lt=abandoned, attempts__gte=max_attempts,
+    ).update(status=MediaAsset.FAILED, last_error="Abandoned by a worker on the last attempt.")
+    with transaction.atomic():
+        batch = list(
+            MediaAsset.objects.select_for_update(skip_locked=True)
+            .filter(Q(status=MediaAsset.PENDING) | Q(status=MediaAsset.PROCESSING, claimed_at__lt=abandoned))
+            .filter(attempts__lt=max_attempts)
+            .order_by('id')[:batch_size]
+        )
+        MediaAsset.objects.filter(pk__in=[asset.pk for asset in batch]).update(
+            status=MediaAsset.PROCESSING, claimed_at=now, attempts=F('attempts') + 1,
+        )
+    for asset in batch:
+        asset.attempts += 1
+    return batch
+
+
+def _job(asset):
+    """
+    Returns the render_variants() arguments for an asset; every path is on local disk.
+    """
+    targets = {}
+    for variant, longest_side in settings.MEDIA_VARIANTS.items():
+        name = variant_name(asset.sha256, variant)
+        path = default_storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        targets[variant] = (path, longest_side)
+    return default_storage.path(asset.original.name), targets
+
+
+def process_pending(batch_size=20, max_attempts=3, executor=None):
+    """
+    Processes one batch of pending assets. `executor` is a concurrent.futures
+    executor (the worker passes a ProcessPoolExecutor); without one, images are
+    processed in this process. Returns (ready, failed) counts.
+    """
+    batch = claim_batch(batch_size, max_attempts)
+    if not batch:
+        return 0, 0
+
+    futures = {}
+    for asset in batch:
+        source, targets = _job(asset)
+        arguments = (source, targets, settings.MEDIA_VARIANT_QUALITY, settings.MEDIA_MAX_PIXELS)
+        futures[asset.pk] = executor.submit(render_variants, *arguments) if executor else arguments
+
+    ready, failed = [], []
+    for asset in batch:
+        job = futures[asset.pk]
+        try:
+            result = job.result() if executor else render_variants(*job)
+        except Exception as exc: # Corrupt or unsupported images must not stop the batch
+            exhausted = asset.attempts >= max_attempts
+            MediaAsset.objects.filter(pk=asset.pk).update(
+                status=MediaAsset.FAILED if exhausted else MediaAsset.PENDING,
+                last_error=f"{type(exc).__name__}: {exc}"[:1000],
+            )
+            failed.append(asset.pk)
+            continue
+        MediaAsset.objects.filter(pk=asset.pk).update(
+            status=MediaAsset.READY,
+            width=result['width'],
+            height=result['height'],
+            variants={variant: variant_name(asset.sha256, variant) for variant in settings.MEDIA_VARIANTS},
+            last_error='',
+        )
+        ready.append(asset.pk)
+
+    # Posts now carry variant URLs, and cached user cards show the avatar thumbnail
+    Post.objects.filter(media_asset__in=ready).update(changed_at=timezone.now())
+    for user_id in CustomUser.objects.filter(avatar_asset__in=ready).values_list('pk', flat=True):
+        invalidate_card(user_id)
+    return len(ready), len(failed)
+
+
+def process_all(batch_size=20, max_attempts=3, executor=None):
+    """
+    Processes batches until no claimable assets are left. Returns (ready, failed) totals.
+    """
+    ready_total = failed_total = 0
+    while True:
+        ready, failed = process_pending(batch_size=batch_size, max_attempts=max_attempts, executor=executor)
+        ready_total += ready
+        failed_total += failed
+        if not ready and not failed:
+            return ready_total, failed_total
@@ -0,0 +1,58 @@
+# assets/storage.py
+"""
+Storage of uploaded images, deduplicated by content.
+
+An upload is read once in chunks to compute its SHA-256, without loading it
+into memory or decoding it. If an asset with that hash already exists the
+upload is discarded and the existing asset is reused; otherwise the upload is
+saved under originals/<hash> (Django moves large uploads, which are already
+spooled to a temporary file, instead of copying them) and a pending
+MediaAsset is created for the process_media worker.
+"""
+import hashlib
+import os
+
+from django.core.files.storage import default_storage
+from django.db import IntegrityError, transaction
+
+from .imaging import SNIFF_BYTES, sniff_extension
+from .models import MediaAsset
+
+
+def content_hash(upload):
+    """
+    Returns the hex SHA-256 of an uploaded file, reading it chunk by chunk.
+    """
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def original_name(sha256, extension):
+    return f'originals/{sha256[:2]}/{sha256}{extension}'
+
+
+def variant_name(sha256, variant):
+    return f'variants/{sha256[:2]}/{sha256}/{variant}.jpg'
+
+
+def store_upload(upload):
+    """
+    Stores an uploaded image (already validated by MediaUploadField) and returns its MediaAsset.
+    """
+    sha256 = content_hash(upload)
+    asset = MediaAsset.objects.filter(sha256=sha256).first()
+    if asset is not None:
+        return asset
+
+    extension = sniff_extension(upload.read(SNIFF_BYTES)) or os.path.splitext(upload.name)[1].lower()
+    upload.seek(0)
+    name = default_storage.save(original_name(sha256, extension), upload)
+    try:
+        with transaction.atomic():
+            return MediaAsset.objects.create(sha256=sha256, original=name, size=upload.size)
+    except IntegrityError: # The same content was uploaded concurrently
+        default_storage.delete(name)
+        return MediaAsset.objects.get(sha256=sha256)
@@ -0,0 +1,104 @@
+import io
+import multiprocessing
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import override_settings
+from django.utils import timezone
+from PIL import Image
+
+from posts.models import Post
+from social_media_api.testing import QueryBudgetTestCase
+from .models import MediaAsset
+from .processing import process_all
+
+
+def image_upload(name='photo.png', size=(1600, 900), color=(200, 40, 40)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class MediaPipelineTests(QueryBudgetTestCase):
+    """
+    Uploads are stored once per content and resized off the request path by the worker.
+    """
+    def setUp(self):
+        super().setUp()
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def create_post(self, upload):
+        return self.client.post('/api/posts/', {'content': 'With a picture', 'media': upload}, format='multipart')
+
+    def test_identical_uploads_are_stored_once(self):
+        first = self.create_post(image_upload('a.png'))
+        second = self.create_post(image_upload('b.png'))
+        self.assertEqual(first.status_code, 201)
+        self.assertIsNone(first.data['media_variants']) # Not processed yet
+        self.assertEqual(MediaAsset.objects.count(), 1)
+        self.assertEqual(first.data['media'], second.data['media'])
+
+        self.create_post(image_upload('c.png', color=(0, 0, 255)))
+        self.assertEqual(MediaAsset.objects.count(), 2)
+
+    def test_worker_renders_variants(self):
+        post_id = self.create_post(image_upload()).data['id']
+        self.assertEqual(process_all(), (1, 0))
+
+        asset = MediaAsset.objects.get()
+        self.assertEqual((asset.status, asset.width, asset.height), (MediaAsset.READY, 1600, 900))
+        with default_storage.open(asset.variants['thumbnail']) as thumbnail:
+            self.assertEqual(Image.open(thumbnail).size, (320, 180))
+
+        variants = self.client.get(f'/api/posts/{post_id}/').data['media_variants']
+        self.assertEqual(set(variants), {'thumbnail', 'preview'})
+        self.assertTrue(variants['preview'].endswith('/preview.jpg'))
+
+    def test_worker_process_pool(self):
+        self.create_post(image_upload())
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as executor:
+            self.assertEqual(process_all(executor=executor), (1, 0))
+
+    def test_non_images_are_rejected_without_decoding(self):
+        upload = SimpleUploadedFile('notes.png', b'just some text', content_type='image/png')
+        response = self.create_post(upload)
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(MediaAsset.objects.exists())
+
+    def test_corrupt_image_fails_after_max_attempts(self):
+        upload = SimpleUploadedFile('broken.png', b'\x89PNG\r\n\x1a\n' + b'\x00' * 64, content_type='image/png')
+        self.assertEqual(self.create_post(upload).status_code, 201)
+        self.assertEqual(process_all(max_attempts=2), (0, 2))
+        asset = MediaAsset.objects.get()
+        self.assertEqual((asset.status, asset.attempts), (MediaAsset.FAILED, 2))
+        self.assertTrue(asset.last_error)
+
+    def test_abandoned_claims_are_retried_then_failed(self):
+        self.create_post(image_upload())
+        abandoned = timezone.now() - timedelta(seconds=settings.MEDIA_CLAIM_TIMEOUT + 1)
+        MediaAsset.objects.update(status=MediaAsset.PROCESSING, claimed_at=abandoned, attempts=1) # Worker crashed
+        self.assertEqual(process_all(max_attempts=2), (1, 0))
+
+        MediaAsset.objects.update(status=MediaAsset.PROCESSING, claimed_at=abandoned, attempts=2)
+        self.assertEqual(process_all(max_attempts=2), (0, 0))
+        asset = MediaAsset.objects.get()
+        self.assertEqual((asset.status, asset.attempts), (MediaAsset.FAILED, 2))
+        self.assertTrue(asset.last_error)
+
+    def test_avatar_card_uses_thumbnail(self):
+        response = self.client.patch(f'/api/users/{self.user.pk}/', {'profile_picture': image_upload()}, format='multipart')
+        self.assertEqual(response.status_code, 200)
+        process_all()
+
+        post = Post.objects.filter(user=self.user).first()
+        card = self.client.get(f'/api/posts/{post.pk}/').data['user']
+        self.assertTrue(card['profile_picture'].endswith('/thumbnail.jpg'))
@@ -1,33 +1,72 @@
-import mysql.connector
-from mysql.connector import Error
-from decouple import config
+# database.py
+"""
+Raw SQL helpers for scripts and reports that bypass the ORM.
 
-def create_db_connection(host_name, user_name, user_password, db_name):
-    connection = None
+Connections are checked out of the same pool as Django's own connections
+(see social_media_api/pool.py) and returned when the block ends, so raw SQL
+never opens connections of its own or leaves one open. With the pool turned
+off (DB_POOL_SIZE=0), the helpers use the thread's Django connection.
+
+    import django; django.setup()
+    from database import fetch_all
+    rows = fetch_all("SELECT id, username FROM users_customuser WHERE id < %s", [10])
+"""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+
+@contextmanager
+def connection(alias=DEFAULT_DB_ALIAS):
+    """
+    Yields a raw DB-API connection for the block. Changes are committed when
+    the block ends; if it raises, they are rolled back and the connection is
+    closed. Queries use the driver's parameter style (%s for MySQL).
+    """
+    wrapper = connections[alias]
+    pool = getattr(wrapper, 'pool', None)
+    if pool is None:
+        with transaction.atomic(using=alias), wrapper.wrap_database_errors:
+            yield wrapper.connection
+        return
+
+    raw = pool.acquire()
     try:
-        connection = mysql.connector.connect(
-            host=host_name,
-            user=user_name,
-            passwd=user_password,
-            database=db_name
-        )
-        print("MySQL Database connection successful")
-    except Error as err:
-        print(f"Error: '{err}'")
-
-    return connection
-db_host = config('DB_HOST')
-db_user = config('DB_USER')
-db_password = config('DB_PASSWORD')
-db_name = config('DB_NAME')
-# استخدام الدالة للاتصال
-# تأكد من استبدال القيم أدناه بمعلومات قاعدة بياناتك
-connection = create_db_connection(db_host, db_user, db_password, db_name)
-
-# يمكنك الآن استخدام الكائن connection لإرسال استعلامات SQL
-# مثال:
-# cursor = connection.cursor()
-# cursor.execute("SELECT * FROM users")
-# users = cursor.fetchall()
-# for user in users:
-#     print(user)
\ No newline at end of file
+        # Django returns connections in autocommit mode, where rollback() would undo nothing
+        wrapper.set_raw_autocommit(raw, False)
+        yield raw
+        raw.commit()
+        wrapper.set_raw_autocommit(raw, True) # As Django expects it from the pool
+    except BaseException:
+        try:
+            raw.rollback()
+        finally:
+            pool.release(raw, discard=True) # Unknown state
+        raise
+    pool.release(raw)
+
+
+def fetch_all(sql, params=None, alias=DEFAULT_DB_ALIAS):
+    """
+    Runs a query and returns all rows as tuples.
+    """
+    with connection(alias) as raw:
+        cursor = raw.cursor()
+        try:
+            cursor.execute(sql, params or ())
+            return cursor.fetchall()
+        finally:
+            cursor.close()
+
+
+def execute(sql, params=None, alias=DEFAULT_DB_ALIAS):
+    """
+    Runs a statement and returns the number of affected rows.
+    """
+    with connection(alias) as raw:
+        cursor = raw.cursor()
+        try:
+            cursor.execute(sql, params or ())
+            return cursor.rowcount
+        finally:
+            cursor.close()
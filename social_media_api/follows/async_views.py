@@ -0,0 +1,52 @@
+# follows/async_views.py
+"""
+Async read views of the follows app, served by the ASGI application (see social_media_api/asyncapi.py).
+"""
+from asgiref.sync import sync_to_async
+
+from posts.engagement import combine_engagement, engagement_queries
+from posts.models import Post
+from posts.serializers import PostSerializer, wants_engagement
+from social_media_api.asyncapi import async_api_view, gather_queries, json_response, serialize
+from social_media_api.conditional import is_conditional, not_modified, add_validators
+from .views import FEED_READERS, feed_filters, feed_paginator, feed_ranking, feed_validators, feed_versions
+
+
+@async_api_view()
+async def feed(request):
+    """
+    Async counterpart of FeedView.list. Once the page's post IDs are read from
+    the inbox, the posts and (with `?include=engagement`) the viewer's likes,
+    comments and the recent likers of the page are loaded concurrently.
+    """
+    _, read_ids = FEED_READERS[feed_ranking(request)]
+    paginator = feed_paginator(request)
+    page_size = paginator.get_page_size(request)
+    post_ids = await sync_to_async(read_ids)(
+        request.user, before=paginator.decode_cursor(request), limit=page_size + 1, **feed_filters(request),
+    )
+
+    versions = None
+    if is_conditional(request):
+        versions = await sync_to_async(feed_versions)(post_ids)
+        response = not_modified(request, *await sync_to_async(feed_validators)(request, versions))
+        if response is not None:
+            return response
+        post_ids = [post_id for post_id, _, _ in versions]
+
+    page_ids = post_ids[:page_size]
+    queries = [lambda: Post.objects.order_by().in_bulk(post_ids)]
+    if wants_engagement(request):
+        queries += engagement_queries(request.user, page_ids)
+    posts, *engagement = await gather_queries(*queries)
+    posts = [posts[post_id] for post_id in post_ids if post_id in posts]
+    if versions is None:
+        versions = [(post.pk, post.changed_at, post.user_id) for post in posts]
+
+    context = {'request': request}
+    if engagement:
+        context['post_engagement'] = combine_engagement(page_ids, *engagement)
+    page = paginator.paginate_rows(posts, request)
+    data = await serialize(PostSerializer(page, many=True, context=context))
+    response = json_response({'next': paginator.get_next_link(), 'results': data})
+    return add_validators(response, *await sync_to_async(feed_validators)(request, versions))
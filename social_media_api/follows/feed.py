@@ -0,0 +1,173 @@
+# follows/feed.py
+"""
+Materialized home feeds.
+
+Every post is copied into a FeedEntry row for each follower of its author when
+it is created (fan-out on write), so reading a feed is a range scan over the
+reader's own inbox. Authors with more than FEED_FANOUT_MAX_FOLLOWERS followers
+are flagged with `fanout_on_read`; their posts are not copied and are instead
+pulled and merged into the feed of each reader at read time.
+"""
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Q
+
+from posts.models import Post
+from posts.search import get_search_backend
+from users.authentication import revoke_user_tokens
+from users.models import CustomUser
+from .graph import contains, follow_graph
+from .models import FeedEntry
+
+PULL_AUTHORS_KEY = 'feed:pull-authors:v1'
+
+
+def _cache():
+    return caches[settings.FOLLOW_GRAPH_CACHE]
+
+
+def _bulk_insert(entries):
+    """
+    Inserts FeedEntry rows in batches, skipping rows that already exist.
+    """
+    batch_size = settings.FEED_FANOUT_BATCH_SIZE
+    iterator = iter(entries)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            break
+        FeedEntry.objects.bulk_create(batch, batch_size=batch_size, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """
+    Delivers a newly created post to the inbox of every follower of its author.
+    Switches the author to fan-out on read once they have too many followers.
+    """
+    author = post.user
+    if author.fanout_on_read:
+        return
+
+    follower_ids = follow_graph.followers(author.pk)
+    if len(follower_ids) > settings.FEED_FANOUT_MAX_FOLLOWERS:
+        CustomUser.objects.filter(pk=author.pk).update(fanout_on_read=True)
+        author.fanout_on_read = True
+        revoke_user_tokens(author.pk) # Cached request users of the author still say False
+        forget_pull_authors()
+        return
+
+    _bulk_insert(
+        FeedEntry(owner_id=follower_id, post_id=post.pk, author_id=author.pk, timestamp=post.timestamp)
+        for follower_id in follower_ids
+    )
+
+
+def backfill_follow(follow):
+    """
+    Copies the most recent posts of a newly followed user into the follower's inbox.
+    Nothing is copied for fan-out-on-read authors; they are merged when the feed is read.
+    """
+    if follow.following.fanout_on_read:
+        return
+
+    recent_posts = (
+        Post.objects.filter(user_id=follow.following_id)
+        .order_by('-timestamp', '-id')
+        .values_list('id', 'timestamp')[:settings.FEED_BACKFILL_POSTS]
+    )
+    _bulk_insert(
+        FeedEntry(owner_id=follow.follower_id, post_id=post_id, author_id=follow.following_id, timestamp=timestamp)
+        for post_id, timestamp in recent_posts
+    )
+
+
+def remove_follow(follower_id, following_id):
+    """
+    Removes every post of an unfollowed user from the follower's inbox.
+    """
+    FeedEntry.objects.filter(owner_id=follower_id, author_id=following_id).delete()
+
+
+def pull_authors():
+    """
+    Returns the IDs of every fan-out-on-read author. The set is small (only
+    authors above FEED_FANOUT_MAX_FOLLOWERS) and cached until an author is flagged.
+    """
+    return _cache().get_or_set(
+        PULL_AUTHORS_KEY,
+        lambda: sorted(CustomUser.objects.filter(fanout_on_read=True).values_list('pk', flat=True)),
+        timeout=settings.FOLLOW_GRAPH_TTL,
+    )
+
+
+def forget_pull_authors():
+    """
+    Drops the cached set of fan-out-on-read authors after authors were flagged.
+    """
+    _cache().delete(PULL_AUTHORS_KEY)
+
+
+def pull_author_ids(user):
+    """
+    Returns the IDs of followed users whose posts must be merged at read time.
+    """
+    authors = pull_authors()
+    if not authors:
+        return []
+    following = follow_graph.following(user.pk)
+    return [author_id for author_id in authors if contains(following, author_id)]
+
+
+def get_feed(user, query=None, date=None, before=None, limit=None):
+    """
+    Returns the feed of `user` as a list of posts, newest first.
+    Arguments are those of get_feed_ids().
+    """
+    post_ids = get_feed_ids(user, query=query, date=date, before=before, limit=limit)
+    posts = Post.objects.order_by().in_bulk(post_ids) # No ORDER BY: the page is put in feed order here
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+def get_feed_ids(user, query=None, date=None, before=None, limit=None):
+    """
+    Returns the IDs of the posts in the feed of `user`, newest first.
+
+    Inbox entries and the posts of fan-out-on-read authors are each read as
+    (timestamp, id) pairs in feed order and merged; no post rows are loaded.
+    `query` keeps posts containing every search term (content or author username),
+    `date` keeps posts from that day.
+    `before` is a (timestamp, post id) keyset position to continue after and
+    `limit` caps the number of posts returned.
+    """
+    pulled_ids = pull_author_ids(user)
+    matching_ids = get_search_backend().matching_post_ids(query) if query else None
+
+    entries = FeedEntry.objects.filter(owner=user)
+    if pulled_ids:
+        # Posts written before an author switched to fan-out on read are still
+        # in the inbox; they are served by the pull stream instead
+        entries = entries.exclude(author_id__in=pulled_ids)
+    if query:
+        entries = entries.filter(post_id__in=matching_ids)
+    if date:
+        entries = entries.filter(timestamp__date=date)
+    if before:
+        entries = entries.filter(Q(timestamp__lt=before[0]) | Q(timestamp=before[0], post_id__lt=before[1]))
+    inbox = entries.order_by('-timestamp', '-post_id').values_list('timestamp', 'post_id')
+
+    streams = [list(inbox[:limit])]
+    if pulled_ids:
+        pulled = Post.objects.filter(user_id__in=pulled_ids)
+        if query:
+            pulled = pulled.filter(id__in=matching_ids)
+        if date:
+            pulled = pulled.filter(timestamp__date=date)
+        if before:
+            pulled = pulled.filter(Q(timestamp__lt=before[0]) | Q(timestamp=before[0], id__lt=before[1]))
+        streams.append(list(pulled.order_by('-timestamp', '-id').values_list('timestamp', 'id')[:limit]))
+
+    merged = heapq.merge(*streams, reverse=True)
+    return [post_id for _, post_id in islice(merged, limit)]
@@ -0,0 +1,204 @@
+# follows/graph.py
+"""
+In-memory index of the follow graph.
+
+Every process keeps, per user, the sorted IDs of the users they follow and of
+their followers in compact `array('q')` buffers, loaded lazily from the Follow
+table (one query per direction for any number of users) and kept in an LRU
+bounded by FOLLOW_GRAPH_MAX_ENTRIES. "Who does X follow", "does X follow Y"
+and follower/following counts are then answered without SQL.
+
+FollowViewSet updates the index incrementally. Each adjacency list also has a
+version stamp in the shared cache (FOLLOW_GRAPH_CACHE) that every change
+bumps, so other processes notice the change on their next read and reload
+just that list. Changes made outside the API (admin, cascading deletes) are
+picked up once a list is older than FOLLOW_GRAPH_TTL seconds.
+"""
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from social_media_api.replicas import use_primary
+from .models import Follow
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+# Column holding the owner of a list, and the column holding its members
+_COLUMNS = {
+    FOLLOWING: ('follower_id', 'following_id'),
+    FOLLOWERS: ('following_id', 'follower_id'),
+}
+
+
+def _cache():
+    return caches[settings.FOLLOW_GRAPH_CACHE]
+
+
+def _version_key(direction, user_id):
+    return f'followgraph:v1:{direction}:{user_id}'
+
+
+def contains(ids, user_id):
+    """
+    Returns True if the sorted array `ids` holds `user_id` (binary search).
+    """
+    position = bisect_left(ids, user_id)
+    return position < len(ids) and ids[position] == user_id
+
+
+class FollowGraph:
+    """
+    Process-local adjacency lists of the follow graph, see the module docstring.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._lists = OrderedDict() # (direction, user_id) -> (ids, version, loaded_at)
+
+    def _versions(self, direction, user_ids):
+        """
+        Returns the shared version stamp of every list, creating missing stamps.
+        """
+        cache = _cache()
+        keys = {_version_key(direction, user_id): user_id for user_id in user_ids}
+        versions = {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+        for key, user_id in keys.items():
+            if user_id not in versions:
+                # A fresh, unpredictable stamp: an evicted stamp must not come back with an old value
+                cache.add(key, time.time_ns(), timeout=None)
+                versions[user_id] = cache.get(key)
+        return versions
+
+    def _load(self, direction, user_ids):
+        owner, member = _COLUMNS[direction]
+        with use_primary(): # Lists are reloaded right after a change, which a replica may not have yet
+            rows = list(Follow.objects.filter(**{f'{owner}__in': user_ids}).order_by().values_list(owner, member))
+        lists = {user_id: [] for user_id in user_ids}
+        for owner_id, member_id in rows:
+            lists[owner_id].append(member_id)
+        return {user_id: array('q', sorted(ids)) for user_id, ids in lists.items()}
+
+    def get_lists(self, direction, user_ids):
+        """
+        Returns {user_id: sorted array of IDs} for the given users. Stale or
+        missing lists are (re)loaded together with a single query.
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return {}
+        versions = self._versions(direction, user_ids)
+        oldest = time.monotonic() - settings.FOLLOW_GRAPH_TTL
+
+        lists, stale = {}, []
+        with self._lock:
+            for user_id in user_ids:
+                entry = self._lists.get((direction, user_id))
+                if entry is not None and entry[1] == versions[user_id] and entry[2] >= oldest:
+                    self._lists.move_to_end((direction, user_id))
+                    lists[user_id] = entry[0]
+                else:
+                    stale.append(user_id)
+
+        if stale:
+            loaded = self._load(direction, stale)
+            now = time.monotonic()
+            with self._lock:
+                for user_id, ids in loaded.items():
+                    self._lists[(direction, user_id)] = (ids, versions[user_id], now)
+                    self._lists.move_to_end((direction, user_id))
+                while len(self._lists) > settings.FOLLOW_GRAPH_MAX_ENTRIES:
+                    self._lists.popitem(last=False)
+            lists.update(loaded)
+        return lists
+
+    def following(self, user_id):
+        """
+        Returns the sorted IDs of the users `user_id` follows.
+        """
+        return self.get_lists(FOLLOWING, [user_id])[user_id]
+
+    def followers(self, user_id):
+        """
+        Returns the sorted IDs of the users following `user_id`.
+        """
+        return self.get_lists(FOLLOWERS, [user_id])[user_id]
+
+    def follows(self, follower_id, following_id):
+        """
+        Returns True if `follower_id` follows `following_id`.
+        """
+        return contains(self.following(follower_id), following_id)
+
+    def counts(self, user_ids):
+        """
+        Returns {user_id: {'followers': n, 'following': n}} for the given users.
+        """
+        following = self.get_lists(FOLLOWING, user_ids)
+        followers = self.get_lists(FOLLOWERS, user_ids)
+        return {
+            user_id: {'followers': len(followers[user_id]), 'following': len(following[user_id])}
+            for user_id in following
+        }
+
+    def _apply(self, direction, user_id, member_id, added):
+        """
+        Bumps the shared version of one list and patches the local copy in place
+        if it was up to date; otherwise the local copy is dropped and reloaded on next use.
+        """
+        key = (direction, user_id)
+        try:
+            version = _cache().incr(_version_key(direction, user_id))
+        except ValueError: # No stamp in the cache: nobody holds a copy validated against it
+            version = None
+        with self._lock:
+            entry = self._lists.pop(key, None)
+            if entry is None or version is None or entry[1] != version - 1:
+                return
+            ids = array('q', entry[0]) # Copy on write: readers may still iterate the old array
+            position = bisect_left(ids, member_id)
+            present = position < len(ids) and ids[position] == member_id
+            if added and not present:
+                ids.insert(position, member_id)
+            elif not added and present:
+                del ids[position]
+            self._lists[key] = (ids, version, entry[2])
+
+    def add_edge(self, follower_id, following_id):
+        """
+        Records that `follower_id` now follows `following_id`.
+        """
+        self._apply(FOLLOWING, follower_id, following_id, added=True)
+        self._apply(FOLLOWERS, following_id, follower_id, added=True)
+
+    def remove_edge(self, follower_id, following_id):
+        """
+        Records that `follower_id` no longer follows `following_id`.
+        """
+        self._apply(FOLLOWING, follower_id, following_id, added=False)
+        self._apply(FOLLOWERS, following_id, follower_id, added=False)
+
+    def forget_user(self, user_id):
+        """
+        Invalidates both lists of a (deleted) user everywhere.
+        Lists of their former neighbours converge within FOLLOW_GRAPH_TTL.
+        """
+        cache = _cache()
+        for direction in (FOLLOWING, FOLLOWERS):
+            cache.delete(_version_key(direction, user_id))
+            with self._lock:
+                self._lists.pop((direction, user_id), None)
+
+    def clear(self):
+        """
+        Drops every list held by this process.
+        """
+        with self._lock:
+            self._lists.clear()
+
+
+follow_graph = FollowGraph()
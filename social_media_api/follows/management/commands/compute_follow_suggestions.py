@@ -0,0 +1,24 @@
+# follows/management/commands/compute_follow_suggestions.py
+from django.core.management.base import BaseCommand
+
+from follows.suggestions import compute_suggestions
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the friend-of-friend "who to follow" suggestions of every user.
+    Meant to run periodically (e.g. nightly from cron).
+    """
+    help = "Ranks follow suggestions by mutual follows and stores them in FollowSuggestion."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000, help="Users ranked per sparse matrix product.")
+        parser.add_argument('--limit', type=int, default=20, help="Suggestions kept per user.")
+
+    def handle(self, *args, **options):
+        total = compute_suggestions(
+            chunk_size=options['chunk_size'],
+            limit=options['limit'],
+            stdout=self.stdout if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(f"Stored {total} follow suggestions."))
@@ -0,0 +1,30 @@
+# follows/management/commands/rebuild_feeds.py
+from django.core.management.base import BaseCommand
+
+from follows.feed import backfill_follow
+from follows.models import Follow, FeedEntry
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the materialized feed inboxes from the Follow table.
+    Run once after deploying feed inboxes, or to repair inboxes that drifted.
+    """
+    help = "Rebuilds FeedEntry inboxes by backfilling every follow relationship."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only rebuild the feed of this user ID.")
+
+    def handle(self, *args, **options):
+        follows = Follow.objects.select_related('following').order_by('id')
+        entries = FeedEntry.objects.all()
+        if options['user']:
+            follows = follows.filter(follower_id=options['user'])
+            entries = entries.filter(owner_id=options['user'])
+
+        entries.delete()
+        total = 0
+        for follow in follows.iterator(chunk_size=1000):
+            backfill_follow(follow)
+            total += 1
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt feeds from {total} follow relationships."))
@@ -2,6 +2,7 @@ from django.db import models
 # follows/models.py
 from django.db import models
 from users.models import CustomUser # Import your custom user model
+from posts.models import Post
 
 class Follow(models.Model):
     """
@@ -22,4 +23,50 @@ class Follow(models.Model):
         return f"{self.follower.username} follows {self.following.username}"
 
 
+class FeedEntry(models.Model):
+    """
+    A post delivered to a user's home feed inbox (fan-out on write).
+    'timestamp' is copied from the post so the feed can be read with a single
+    range scan over (owner, timestamp, post) without touching the Post table.
+    """
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='feed_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='feed_entries')
+    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+') # Lets unfollow drop entries without a join
+    timestamp = models.DateTimeField()
+
+    class Meta:
+        unique_together = ('owner', 'post')
+        ordering = ['-timestamp', '-post']
+        indexes = [
+            models.Index(fields=['owner', '-timestamp', '-post'], name='feedentry_owner_ts_idx'),
+            models.Index(fields=['owner', 'author'], name='feedentry_owner_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"Post {self.post_id} in feed of user {self.owner_id}"
+
+
+class FollowSuggestion(models.Model):
+    """
+    A "who to follow" suggestion computed by the compute_follow_suggestions job.
+    'mutual_count' is the number of users the owner follows who follow 'suggested'.
+    """
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    mutual_count = models.PositiveIntegerField()
+    rank = models.PositiveSmallIntegerField() # 0 is the best suggestion
+    computed_at = models.DateTimeField() # Start of the job run that produced this row
+
+    class Meta:
+        unique_together = ('user', 'suggested')
+        ordering = ['user', 'rank']
+        indexes = [
+            models.Index(fields=['user', 'rank'], name='suggestion_user_rank_idx'),
+            models.Index(fields=['computed_at'], name='suggestion_computed_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Suggest user {self.suggested_id} to user {self.user_id}"
+
+
 # Create your models here.
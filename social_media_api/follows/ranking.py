@@ -0,0 +1,163 @@
+# follows/ranking.py
+"""
+Engagement-ranked home feed (GET /api/follows/feed/?ranking=top).
+
+The candidates are the reader's FEED_RANKING_CANDIDATES most recent feed posts
+(read like the chronological feed, so ranking never touches more than a
+bounded set), scored in one vectorized numpy pass:
+
+    score = decay * (1 + log1p(velocity)) * (1 + AFFINITY_WEIGHT * log1p(affinity))
+
+- decay halves every FEED_RANKING_HALF_LIFE hours since the post was written;
+- velocity is the post's likes + COMMENT_WEIGHT * comments per hour of age;
+- affinity is how often the reader liked or commented on the author's posts.
+
+Ties are broken by post ID, so a ranking is deterministic. The ranking of the
+first page is kept for FEED_RANKING_SNAPSHOT_TTL seconds under the time it was
+computed at (carried by the cursor), and later pages are slices of that same
+snapshot: no post is repeated or skipped while likes keep changing scores.
+If the snapshot is gone, the ranking is recomputed as of the same time.
+"""
+import hashlib
+import sys
+from collections import Counter
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count
+from django.utils import timezone
+from rest_framework.exceptions import NotFound
+
+from posts.models import Comment, Like, Post
+from social_media_api.pagination import KeysetPagination
+from .feed import get_feed_ids
+
+COMMENT_WEIGHT = 2.0 # A comment counts as much as two likes
+AFFINITY_WEIGHT = 1.0
+
+
+def _cache():
+    return caches[settings.FOLLOW_GRAPH_CACHE]
+
+
+def author_affinity(user_id):
+    """
+    Returns {author_id: number of the reader's likes and comments on their posts}.
+    Cached for FEED_RANKING_AFFINITY_TTL seconds: it moves slowly.
+    """
+    key = f'feed:affinity:v1:{user_id}'
+    affinity = _cache().get(key)
+    if affinity is None:
+        counts = Counter()
+        for model in (Like, Comment):
+            rows = (
+                model.objects.filter(user_id=user_id).order_by()
+                .values('post__user_id').annotate(interactions=Count('pk'))
+                .values_list('post__user_id', 'interactions')
+            )
+            counts.update(dict(rows))
+        counts.pop(user_id, None) # Interactions with one's own posts say nothing
+        affinity = dict(counts)
+        _cache().set(key, affinity, settings.FEED_RANKING_AFFINITY_TTL)
+    return affinity
+
+
+def score_posts(ages, likes, comments, affinity):
+    """
+    Scores posts from numpy arrays of their age in hours, like and comment
+    counts, and the reader's affinity with their author.
+    """
+    decay = np.exp2(-ages / settings.FEED_RANKING_HALF_LIFE)
+    velocity = (likes + COMMENT_WEIGHT * comments) / (ages + 1.0)
+    return decay * (1.0 + np.log1p(velocity)) * (1.0 + AFFINITY_WEIGHT * np.log1p(affinity))
+
+
+def rank_candidates(candidates, affinity, as_of):
+    """
+    Returns the IDs of `candidates` ((id, author_id, timestamp, likes_count,
+    comments_count) rows) from best to worst score as of `as_of`.
+    """
+    if not candidates:
+        return []
+    ids, authors, timestamps, likes, comments = zip(*candidates)
+    ids = np.array(ids, dtype=np.int64)
+    seconds = np.array([timestamp.timestamp() for timestamp in timestamps])
+    ages = np.maximum(as_of.timestamp() - seconds, 0.0) / 3600.0
+    scores = score_posts(
+        ages,
+        np.array(likes, dtype=np.float64),
+        np.array(comments, dtype=np.float64),
+        np.array([affinity.get(author_id, 0) for author_id in authors], dtype=np.float64),
+    )
+    order = np.lexsort((-ids, -scores)) # Best score first, newest post first among ties
+    return ids[order].tolist()
+
+
+def compute_ranking(user, as_of, query=None, date=None):
+    """
+    Ranks the reader's most recent feed posts written up to `as_of`. Returns post IDs, best first.
+    """
+    candidate_ids = get_feed_ids(
+        user, query=query, date=date, before=(as_of, sys.maxsize), limit=settings.FEED_RANKING_CANDIDATES,
+    )
+    candidates = list(
+        Post.objects.filter(pk__in=candidate_ids).order_by()
+        .values_list('pk', 'user_id', 'timestamp', 'likes_count', 'comments_count')
+    )
+    return rank_candidates(candidates, author_affinity(user.pk), as_of)
+
+
+def get_ranking(user, as_of, query=None, date=None):
+    """
+    Returns the snapshot of the reader's ranking as of `as_of`, computing it on first use.
+    """
+    filters = hashlib.sha256(repr((query, date)).encode()).hexdigest()[:16]
+    key = f'feed:ranked:v1:{user.pk}:{as_of.isoformat()}:{filters}'
+    ranking = _cache().get(key)
+    if ranking is None:
+        ranking = compute_ranking(user, as_of, query=query, date=date)
+        _cache().set(key, ranking, settings.FEED_RANKING_SNAPSHOT_TTL)
+    return ranking
+
+
+def get_ranked_feed_ids(user, query=None, date=None, before=None, limit=None):
+    """
+    Returns the IDs of up to `limit` posts of the ranked feed of `user`.
+    `before` is the (as_of, offset) position of a RankedFeedPagination cursor;
+    other arguments are those of follows.feed.get_feed_ids().
+    """
+    as_of, offset = before or (timezone.now(), 0)
+    ranking = get_ranking(user, as_of, query=query, date=date)
+    return ranking[offset:offset + limit if limit is not None else None]
+
+
+def get_ranked_feed(user, query=None, date=None, before=None, limit=None):
+    """
+    Returns the posts of get_ranked_feed_ids(), in ranking order.
+    """
+    post_ids = get_ranked_feed_ids(user, query=query, date=date, before=before, limit=limit)
+    posts = Post.objects.order_by().in_bulk(post_ids)
+    return [posts[post_id] for post_id in post_ids if post_id in posts]
+
+
+class RankedFeedPagination(KeysetPagination):
+    """
+    Cursor pagination over a ranking snapshot: the cursor holds the time the
+    ranking was computed at and the offset of the next page in it.
+    """
+    def decode_cursor(self, request):
+        """
+        Returns the (as_of, offset) position of the request's cursor; the first page starts a new ranking now.
+        """
+        self.position = super().decode_cursor(request) or (timezone.now(), 0)
+        if self.position[1] < 0:
+            raise NotFound(self.invalid_cursor_message)
+        return self.position
+
+    def paginate_rows(self, rows, request):
+        page = super().paginate_rows(rows, request)
+        if self.next_position is not None:
+            as_of, offset = self.position
+            self.next_position = (as_of, offset + len(page))
+        return page
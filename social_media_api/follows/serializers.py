@@ -1,7 +1,8 @@
 # follows/serializers.py
 from rest_framework import serializers
 from .models import Follow
-from users.serializers import UserPublicSerializer # To display public user info
+from .graph import follow_graph # Adjacency lists of the follow graph
+from users.cards import UserCardField, UserCardListSerializer, UserCardSerializerMixin # Cached public user info
 from rest_framework import serializers
 from .models import Follow
 from users.models import CustomUser
@@ -10,12 +11,12 @@ class FollowSerializer(serializers.ModelSerializer):
         model = Follow
         fields = '__all__'
 
-class FollowSerializer(serializers.ModelSerializer):
+class FollowSerializer(UserCardSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for creating and viewing Follow relationships.
     """
-    follower = UserPublicSerializer(read_only=True) # Display follower's public info
-    following = UserPublicSerializer(read_only=True) # Display following's public info
+    follower = UserCardField(source='follower_id') # Display follower's public info
+    following = UserCardField(source='following_id') # Display following's public info
     following_id = serializers.PrimaryKeyRelatedField(
         queryset=CustomUser.objects.all(), write_only=True, source='following'
     ) # For writing (creating follow), user provides 'following_id'
@@ -23,5 +24,18 @@ class FollowSerializer(serializers.ModelSerializer):
     class Meta:
         model = Follow
         fields = ['id', 'follower', 'following', 'following_id', 'created_at']
+        list_serializer_class = UserCardListSerializer
         read_only_fields = ['id', 'follower', 'created_at'] # Follower and created_at are set by the system
 
+    def validate(self, attrs):
+        """
+        Prevents self-following and duplicate follows, checked against the in-memory follow graph.
+        """
+        follower = self.context['request'].user
+        following = attrs['following']
+        if follower.pk == following.pk:
+            raise serializers.ValidationError("You cannot follow yourself.")
+        if follow_graph.follows(follower.pk, following.pk):
+            raise serializers.ValidationError("You are already following this user.")
+        return attrs
+
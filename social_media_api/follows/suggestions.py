@@ -0,0 +1,102 @@
+# follows/suggestions.py
+"""
+Friend-of-friend "who to follow" suggestions, computed as a batch job.
+
+The Follow table is loaded into a sparse adjacency matrix A (A[i, j] = 1 when
+user i follows user j). For a block of rows, the sparse product A[rows] @ A
+counts, for every candidate j, how many of the users i follows also follow j
+("mutual follows"). Candidates i already follows and i themself are masked out,
+and the best `limit` candidates of every row are kept with one vectorized sort.
+
+Only one block of rows is multiplied at a time, so memory is bounded by the
+edge list (16 bytes per edge) plus one block of products, whatever the number
+of users. Results replace the user's previous FollowSuggestion rows.
+"""
+from array import array
+
+import numpy as np
+from scipy import sparse
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Follow, FollowSuggestion
+
+EDGE_BATCH_SIZE = 100_000
+
+
+def load_adjacency(batch_size=EDGE_BATCH_SIZE):
+    """
+    Reads every Follow edge. Returns (user_ids, A): the sorted user IDs that
+    appear in the graph and the CSR adjacency matrix indexed by position in user_ids.
+    """
+    followers, followings = array('q'), array('q')
+    edges = Follow.objects.order_by().values_list('follower_id', 'following_id')
+    for follower_id, following_id in edges.iterator(chunk_size=batch_size):
+        followers.append(follower_id)
+        followings.append(following_id)
+
+    followers = np.frombuffer(followers, dtype=np.int64)
+    followings = np.frombuffer(followings, dtype=np.int64)
+    user_ids = np.unique(np.concatenate([followers, followings]))
+    rows = np.searchsorted(user_ids, followers)
+    columns = np.searchsorted(user_ids, followings)
+    size = len(user_ids)
+    adjacency = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=(size, size)
+    )
+    return user_ids, adjacency
+
+
+def rank_block(adjacency, start, stop, limit):
+    """
+    Returns (rows, columns, scores, ranks) of the best `limit` suggestions of
+    users start..stop-1 (matrix positions), best first within each row.
+    """
+    block = adjacency[start:stop]
+    scores = (block @ adjacency).tocsr()
+
+    # Mask out users already followed and the user themself
+    own = sparse.csr_matrix(
+        (np.ones(stop - start, dtype=np.int32), (np.arange(stop - start), np.arange(start, stop))),
+        shape=scores.shape,
+    )
+    scores = scores - scores.multiply((block + own) > 0)
+    scores.eliminate_zeros()
+
+    rows = np.repeat(np.arange(stop - start), np.diff(scores.indptr))
+    # Highest score first; ties go to the lower user ID so results are stable
+    order = np.lexsort((scores.indices, -scores.data, rows))
+    rows, columns, values = rows[order], scores.indices[order], scores.data[order]
+    ranks = np.arange(len(order)) - scores.indptr[rows]
+    keep = ranks < limit
+    return rows[keep] + start, columns[keep], values[keep], ranks[keep]
+
+
+def compute_suggestions(chunk_size=1000, limit=20, stdout=None):
+    """
+    Recomputes the suggestions of every user, `chunk_size` users at a time.
+    Returns the number of suggestions stored.
+    """
+    started_at = timezone.now()
+    user_ids, adjacency = load_adjacency()
+    total = 0
+    for start in range(0, len(user_ids), chunk_size):
+        stop = min(start + chunk_size, len(user_ids))
+        rows, columns, scores, ranks = rank_block(adjacency, start, stop, limit)
+        suggestions = [
+            FollowSuggestion(
+                user_id=int(user_ids[row]), suggested_id=int(user_ids[column]),
+                mutual_count=int(score), rank=int(rank), computed_at=started_at,
+            )
+            for row, column, score, rank in zip(rows, columns, scores, ranks)
+        ]
+        with transaction.atomic():
+            FollowSuggestion.objects.filter(user_id__in=user_ids[start:stop].tolist()).delete()
+            FollowSuggestion.objects.bulk_create(suggestions, batch_size=1000)
+        total += len(suggestions)
+        if stdout is not None:
+            stdout.write(f"Users {stop}/{len(user_ids)}: {total} suggestions")
+
+    # Users who left the graph since the last run keep no stale suggestions
+    FollowSuggestion.objects.filter(computed_at__lt=started_at).delete()
+    return total
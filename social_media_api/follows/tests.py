@@ -1,3 +1,323 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from posts.models import Post
+from social_media_api.testing import QueryBudgetTestCase, async_read_views
+from users.models import CustomUser
+from . import views
+from .graph import FollowGraph, follow_graph
+from .models import Follow, FeedEntry, FollowSuggestion
+from .ranking import rank_candidates
+from .suggestions import compute_suggestions
+
+
+class FollowRouteQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Every route in follows/urls.py must stay within a fixed number of SQL queries.
+    """
+    def test_feed(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/follows/feed/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_feed_not_modified(self):
+        etag = self.client.get('/api/follows/feed/')['ETag']
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/follows/feed/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        self.authenticate(self.users[1])
+        self.client.post('/api/posts/', {'content': 'Something new'})
+        self.authenticate(self.user)
+        response = self.client.get('/api/follows/feed/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['content'], 'Something new')
+
+    def test_feed_post_deleted_after_the_version_check(self):
+        read_versions = views.feed_versions
+
+        def feed_versions(post_ids):
+            versions = read_versions(post_ids)
+            Post.objects.filter(pk=versions[0][0]).delete()
+            return versions
+
+        first = self.client.get('/api/follows/feed/').data['results'][0]['id']
+        with mock.patch.object(views, 'feed_versions', feed_versions):
+            response = self.client.get('/api/follows/feed/', HTTP_IF_NONE_MATCH='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(first, [post['id'] for post in response.data['results']])
+
+    def test_feed_has_no_last_modified(self):
+        response = self.client.get('/api/follows/feed/')
+        self.assertNotIn('Last-Modified', response)
+        # A date alone can never prove a feed page current
+        response = self.client.get('/api/follows/feed/', HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+        self.assertEqual(response.status_code, 200)
+
+    def test_feed_with_engagement(self):
+        with self.assertQueryBudget(6):
+            response = self.client.get('/api/follows/feed/?include=engagement')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('likers', response.data['results'][0])
+
+    def test_feed_next_page(self):
+        next_url = self.client.get('/api/follows/feed/').data['next']
+        with self.assertQueryBudget(3):
+            response = self.client.get(next_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_list(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/follows/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_create(self):
+        with self.assertQueryBudget(8):
+            response = self.client.post('/api/follows/', {'following_id': self.users[4].pk})
+        self.assertEqual(response.status_code, 201)
+
+    def test_destroy(self):
+        follow = Follow.objects.filter(follower=self.user).first()
+        with self.assertQueryBudget(4):
+            response = self.client.delete(f'/api/follows/{follow.pk}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_following(self):
+        with self.assertQueryBudget(1):
+            response = self.client.get(f'/api/follows/following/{self.user.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_followers(self):
+        with self.assertQueryBudget(1):
+            response = self.client.get(f'/api/follows/followers/{self.user.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_suggestions(self):
+        compute_suggestions()
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/follows/suggestions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 2)
+
+
+class FollowGraphTests(QueryBudgetTestCase):
+    """
+    The in-memory follow graph follows the API and stays coherent across processes.
+    """
+    def stats(self, user):
+        return self.client.get(f'/api/users/{user.pk}/').data['stats']
+
+    def test_follow_and_unfollow_update_the_graph(self):
+        target = self.users[4]
+        before = self.stats(target)
+
+        response = self.client.post('/api/follows/', {'following_id': target.pk})
+        self.assertTrue(follow_graph.follows(self.user.pk, target.pk))
+        self.assertEqual(self.stats(target)['followers'], before['followers'] + 1)
+        following = self.client.get(f'/api/follows/following/{self.user.pk}/').data
+        self.assertIn(target.pk, [card['id'] for card in following['results']])
+
+        self.client.delete(f"/api/follows/{response.data['id']}/")
+        self.assertFalse(follow_graph.follows(self.user.pk, target.pk))
+        self.assertEqual(self.stats(target), before)
+
+    def test_duplicate_and_self_follows_are_rejected(self):
+        followed = Follow.objects.filter(follower=self.user).first().following_id
+        self.assertEqual(self.client.post('/api/follows/', {'following_id': followed}).status_code, 400)
+        self.assertEqual(self.client.post('/api/follows/', {'following_id': self.user.pk}).status_code, 400)
+
+    def test_duplicate_missed_by_a_stale_graph_is_rejected(self):
+        target = self.users[4]
+        self.assertFalse(follow_graph.follows(self.user.pk, target.pk)) # Loaded, then bypassed below
+        Follow.objects.create(follower=self.user, following=target)
+        response = self.client.post('/api/follows/', {'following_id': target.pk})
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(follow_graph.follows(self.user.pk, target.pk))
+
+    def test_other_processes_see_changes(self):
+        other_process = FollowGraph() # Shares the cache, not the adjacency lists
+        target = self.users[4]
+        self.assertFalse(other_process.follows(self.user.pk, target.pk))
+
+        self.client.post('/api/follows/', {'following_id': target.pk})
+        self.assertTrue(other_process.follows(self.user.pk, target.pk))
+        self.assertIn(self.user.pk, other_process.followers(target.pk))
+
+    def test_stats_match_the_database(self):
+        users = self.client.get('/api/users/').data['results']
+        for user in users:
+            self.assertEqual(user['stats'], {
+                'followers': Follow.objects.filter(following_id=user['id']).count(),
+                'following': Follow.objects.filter(follower_id=user['id']).count(),
+            })
+
+
+class FollowSuggestionTests(QueryBudgetTestCase):
+    """
+    Friend-of-friend suggestions are ranked by mutual follows and served by /api/follows/suggestions/.
+    Every seeded user follows the next three, so user0 (following 1, 2, 3) reaches
+    user4 through 1, 2 and 3, and user5 through 2 and 3.
+    """
+    def setUp(self):
+        super().setUp()
+        compute_suggestions(chunk_size=4, limit=5) # Several chunks over six users
+
+    def suggestions(self):
+        return [
+            (item['user']['id'], item['mutual_follows'])
+            for item in self.client.get('/api/follows/suggestions/').data['results']
+        ]
+
+    def test_ranked_by_mutual_follows(self):
+        self.assertEqual(self.suggestions(), [(self.users[4].pk, 3), (self.users[5].pk, 2)])
+        self.assertEqual(FollowSuggestion.objects.count(), 2 * len(self.users))
+
+    def test_followed_users_are_skipped(self):
+        self.client.post('/api/follows/', {'following_id': self.users[4].pk})
+        self.assertEqual(self.suggestions(), [(self.users[5].pk, 2)])
+
+    def test_page_size_is_clamped(self):
+        for page_size, expected in [('-5', 1), ('abc', 2)]:
+            response = self.client.get(f'/api/follows/suggestions/?page_size={page_size}')
+            self.assertEqual((response.status_code, len(response.data['results'])), (200, expected))
+
+    def test_rerun_replaces_previous_suggestions(self):
+        Follow.objects.filter(follower__in=self.users[1:]).delete()
+        compute_suggestions()
+        self.assertFalse(FollowSuggestion.objects.exists())
+
+
+class FeedTests(QueryBudgetTestCase):
+    """
+    The materialized feed stays in sync with follows and new posts.
+    """
+    def test_new_post_is_fanned_out_to_followers(self):
+        author = self.users[1]
+        self.authenticate(author)
+        post_id = self.client.post('/api/posts/', {'content': 'Fan me out'}).data['id']
+
+        self.authenticate(self.user)
+        feed = self.client.get('/api/follows/feed/').data['results']
+        self.assertEqual(feed[0]['id'], post_id)
+
+    def test_unfollow_removes_posts_from_feed(self):
+        follow = Follow.objects.get(follower=self.user, following=self.users[1])
+        self.client.delete(f'/api/follows/{follow.pk}/')
+        self.assertFalse(FeedEntry.objects.filter(owner=self.user, author=self.users[1]).exists())
+
+    @override_settings(FEED_FANOUT_MAX_FOLLOWERS=0)
+    def test_high_fanout_author_is_merged_at_read_time(self):
+        author = self.users[1]
+        self.authenticate(author)
+        post_id = self.client.post('/api/posts/', {'content': 'Too popular to fan out'}).data['id']
+
+        self.assertTrue(CustomUser.objects.get(pk=author.pk).fanout_on_read)
+        self.assertFalse(FeedEntry.objects.filter(post_id=post_id).exists())
+        self.authenticate(self.user)
+        feed = self.client.get('/api/follows/feed/').data['results']
+        self.assertEqual(feed[0]['id'], post_id)
+
+    def test_pages_do_not_overlap(self):
+        seen = []
+        url = '/api/follows/feed/?page_size=7'
+        while url:
+            data = self.client.get(url).data
+            seen.extend(post['id'] for post in data['results'])
+            url = data['next']
+        followed = Follow.objects.filter(follower=self.user).values('following')
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(len(seen), Post.objects.filter(user__in=followed).count())
+
+
+class RankedFeedTests(QueryBudgetTestCase):
+    """
+    ?ranking=top ranks the recent feed by engagement, with stable pages.
+    """
+    def feed_ids(self, url):
+        seen = []
+        while url:
+            data = self.client.get(url).data
+            seen.extend(post['id'] for post in data['results'])
+            url = data['next']
+        return seen
+
+    def test_engaged_post_ranks_first(self):
+        latest = self.feed_ids('/api/follows/feed/')
+        Post.objects.filter(pk=latest[-1]).update(likes_count=500, comments_count=100)
+        top = self.client.get('/api/follows/feed/?ranking=top').data['results']
+        self.assertEqual(top[0]['id'], latest[-1])
+
+    def test_scores_decay_with_age_and_grow_with_affinity(self):
+        now = timezone.now()
+        candidates = [
+            (1, 10, now - timedelta(hours=48), 20, 5), # Popular but two days old
+            (2, 11, now - timedelta(hours=1), 5, 1),
+            (3, 12, now - timedelta(hours=1), 5, 1), # Same, by an author the reader interacts with
+            (4, 13, now - timedelta(hours=1), 5, 1),
+        ]
+        self.assertEqual(rank_candidates(candidates, {12: 10}, now), [3, 4, 2, 1])
+        self.assertEqual(rank_candidates([], {}, now), [])
+
+    def test_pages_are_stable_while_scores_change(self):
+        first = self.client.get('/api/follows/feed/?ranking=top&page_size=7').data
+        # Engagement moving between page loads must neither repeat nor skip posts
+        Post.objects.filter(pk__in=[post['id'] for post in first['results']]).update(likes_count=0)
+        seen = [post['id'] for post in first['results']] + self.feed_ids(first['next'])
+        followed = Follow.objects.filter(follower=self.user).values('following')
+        self.assertEqual(len(seen), len(set(seen)))
+        self.assertEqual(set(seen), set(Post.objects.filter(user__in=followed).values_list('pk', flat=True)))
+
+    def test_candidates_are_bounded(self):
+        with self.settings(FEED_RANKING_CANDIDATES=5):
+            self.assertEqual(len(self.feed_ids('/api/follows/feed/?ranking=top')), 5)
+
+    def test_query_budget(self):
+        with self.assertQueryBudget(6):
+            data = self.client.get('/api/follows/feed/?ranking=top').data
+        with self.assertQueryBudget(2): # Next pages slice the cached ranking
+            self.client.get(data['next'])
+
+    def test_invalid_ranking(self):
+        response = self.client.get('/api/follows/feed/?ranking=hot')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ranking', response.data)
+
+
+@async_read_views
+class AsyncFeedTests(QueryBudgetTestCase):
+    """
+    The async feed view returns exactly what FeedView returns.
+    """
+    def test_feed(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/follows/feed/')
+        self.assertEqual(len(response.json()['results']), 10)
+        self.assertMatchesSync('/api/follows/feed/')
+        self.assertMatchesSync(response.json()['next'])
+
+    def test_feed_with_engagement(self):
+        with self.assertQueryBudget(6):
+            response = self.client.get('/api/follows/feed/?include=engagement&page_size=5')
+        self.assertIn('likers', response.json()['results'][0])
+        self.assertMatchesSync('/api/follows/feed/?include=engagement&page_size=5')
+
+    def test_ranked_feed(self):
+        next_url = self.client.get('/api/follows/feed/?ranking=top&page_size=5').json()['next']
+        self.assertMatchesSync(next_url) # Same snapshot, same page
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/follows/feed/')['ETag']
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/follows/feed/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_requires_authentication(self):
+        self.client.credentials()
+        response = self.assertMatchesSync('/api/follows/feed/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
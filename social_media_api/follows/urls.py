@@ -1,7 +1,10 @@
 # follows/urls.py
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import FollowViewSet, FeedView
+from .views import FollowViewSet, FeedView, ConnectionsView, SuggestionsView
+from .graph import FOLLOWING, FOLLOWERS
+from .async_views import feed
+from social_media_api.asyncapi import read_view
 
 router = DefaultRouter()
 router.register(r'follows', FollowViewSet)
@@ -14,8 +17,15 @@ router.register(r'', FollowViewSet, basename='follows')
 urlpatterns = [
     # Specific path for the feed
     path('feed/', FeedView.as_view(), name='feed'),
+    path('suggestions/', SuggestionsView.as_view(), name='follow-suggestions'),
+    path('following/<int:user_id>/', ConnectionsView.as_view(direction=FOLLOWING), name='follows-following'),
+    path('followers/<int:user_id>/', ConnectionsView.as_view(direction=FOLLOWERS), name='follows-followers'),
 ]
 
 # Add the router URLs (for follows creation/deletion)
 urlpatterns += router.urls
 
+# Async read views, mounted in front of the routes above by the ASGI application (social_media_api/asgi_urls.py)
+async_urlpatterns = [
+    path('feed/', read_view(feed, FeedView.as_view())),
+]
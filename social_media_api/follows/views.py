@@ -3,15 +3,22 @@ from django.shortcuts import render
 from rest_framework import viewsets, mixins, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
-from rest_framework.exceptions import ValidationError # For custom validation errors
+from rest_framework.exceptions import ValidationError, NotFound # For custom validation errors
+from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.generics import ListAPIView # For the feed
-from django.db.models import Q # Import Q for feed filtering (optional stretch goal)
-from .models import Follow
+from django.db import IntegrityError, transaction
+from .models import Follow, FollowSuggestion
 from users.models import CustomUser # Import CustomUser to filter users for feed
+from users.cards import get_cards, render_card, card_versions # Cached public user cards
 from posts.models import Post # Import Post to get posts for the feed
 from posts.serializers import PostSerializer # To serialize posts for the feed
-from notifications.models import Notification # NEW: Import Notification model
+from notifications.outbox import enqueue as enqueue_notification # Notifications are delivered by the outbox worker
 from .serializers import FollowSerializer  
+from .feed import get_feed, get_feed_ids, backfill_follow, remove_follow
+from .ranking import get_ranked_feed, get_ranked_feed_ids, RankedFeedPagination # ?ranking=top
+from .graph import contains, follow_graph # In-memory adjacency lists of the follow graph
+from social_media_api.pagination import KeysetPagination # Cursor pagination over (timestamp, id)
+from social_media_api.conditional import is_conditional, make_etag, not_modified, add_validators # ETag / Last-Modified
 # ViewSet for Follow operations (Create/Destroy)
 class FollowViewSet(
     mixins.CreateModelMixin, # Allows POST (create)
@@ -25,7 +32,7 @@ class FollowViewSet(
     - Destroy (DELETE /api/follows/<id>/): Authenticated user unfollows a relationship they initiated.
     - List (GET /api/follows/): Authenticated user can see their own followings.
     """
-    queryset = Follow.objects.all()
+    queryset = Follow.objects.select_related('follower', 'following')
     serializer_class = FollowSerializer
     permission_classes = [IsAuthenticated] # Requires authentication for all follow actions
     lookup_field = 'pk' # Use primary key for lookup (e.g., to delete a specific follow record)
@@ -39,25 +46,25 @@ class FollowViewSet(
     def perform_create(self, serializer):
         """
         Sets the follower to the current authenticated user.
-        Prevents self-following and duplicate follows.
+        Self-following and duplicate follows are rejected by FollowSerializer; a duplicate
+        the follow graph did not know of yet is caught by the unique constraint.
         """
         following_user = serializer.validated_data.get('following')
-        if self.request.user == following_user:
-            raise ValidationError("You cannot follow yourself.")
-
-        # Check for existing follow to prevent duplicates before unique_together handles it
-        if Follow.objects.filter(follower=self.request.user, following=following_user).exists():
-            raise ValidationError("You are already following this user.")
-
-        follow_instance = serializer.save(follower=self.request.user) # Set the follower to the current user
-
-        # NEW: Create a notification for the followed user
-        Notification.objects.create(
-            recipient=following_user,
-            sender=self.request.user,
-            type='follow',
-            message=f"{self.request.user.username} started following you."
-        )
+        try:
+            with transaction.atomic():
+                follow_instance = serializer.save(follower=self.request.user) # Set the follower to the current user
+                # Queue a notification for the followed user in the same transaction
+                enqueue_notification(
+                    recipient=following_user,
+                    sender=self.request.user,
+                    type='follow',
+                    message=f"{self.request.user.username} started following you."
+                )
+        except IntegrityError:
+            follow_graph.add_edge(self.request.user.pk, following_user.pk) # The graph was stale
+            raise ValidationError({'non_field_errors': ["You are already following this user."]})
+        follow_graph.add_edge(follow_instance.follower_id, follow_instance.following_id)
+        backfill_follow(follow_instance) # Copy the followed user's recent posts into the follower's feed
 
         return follow_instance
 
@@ -69,54 +76,194 @@ class FollowViewSet(
         follower_username = instance.follower.username
         following_username = instance.following.username
         instance.delete()
+        follow_graph.remove_edge(instance.follower_id, instance.following_id)
+        remove_follow(instance.follower_id, instance.following_id) # Drop their posts from the follower's feed
         return Response(
             {"message": f"{follower_username} unfollowed {following_username} successfully."},
             status=status.HTTP_200_OK
         )
 
 
+def feed_filters(request):
+    """
+    Returns the feed filters of a request: `q` (search terms) and `date` (YYYY-MM-DD).
+    """
+    # Optional: Implement filtering by date or search by keyword (Stretch Goal)
+    query = request.GET.get('q')
+    date_param = request.GET.get('date')
+
+    target_date = None
+    if date_param:
+        try:
+            # Assuming date_param is in 'YYYY-MM-DD' format
+            from datetime import datetime
+            target_date = datetime.strptime(date_param, '%Y-%m-%d').date()
+        except ValueError:
+            # Handle invalid date format if needed, perhaps log or return a specific error
+            pass # For now, just ignore if date format is bad
+
+    return {'query': query, 'date': target_date}
+
+
+# Feed orderings (?ranking=): each reads posts and post IDs with the same arguments
+FEED_READERS = {
+    'latest': (get_feed, get_feed_ids),
+    'top': (get_ranked_feed, get_ranked_feed_ids),
+}
+
+
+def feed_ranking(request):
+    """
+    Returns the feed ordering of a request: `ranking` is 'latest' (default, newest first) or 'top' (engagement-ranked).
+    """
+    ranking = request.GET.get('ranking') or 'latest'
+    if ranking not in FEED_READERS:
+        raise ValidationError({'ranking': f"Must be one of: {', '.join(FEED_READERS)}."})
+    return ranking
+
+
+def feed_paginator(request):
+    """
+    Returns the paginator of a feed request's ordering.
+    """
+    return RankedFeedPagination() if feed_ranking(request) == 'top' else KeysetPagination()
+
+
+def feed_versions(post_ids):
+    """
+    Returns the (id, changed_at, user_id) of the given posts, in the given order.
+    """
+    versions = Post.objects.filter(pk__in=post_ids).values_list('pk', 'changed_at', 'user_id')
+    versions = {post_id: (changed_at, user_id) for post_id, changed_at, user_id in versions}
+    return [(post_id,) + versions[post_id] for post_id in post_ids if post_id in versions]
+
+
+def feed_validators(request, versions):
+    """
+    Returns the (ETag, Last-Modified) of a feed page from its posts' (id, changed_at, user_id).
+    There is no Last-Modified: posts leave the feed (unfollows, deletes) and ranked
+    pages reorder without any post's changed_at moving forward, so only the ETag,
+    which covers the page's post IDs in order, tells a current page from a stale one.
+    """
+    etag = make_etag(
+        'feed', versions, card_versions(user_id for _, _, user_id in versions),
+        request.user.pk, request.get_full_path(),
+    )
+    return etag, None
+
+
 class FeedView(ListAPIView):
     """
     API endpoint for viewing a personalized feed of posts from followed users.
     Requires authentication.
-    Posts are ordered in reverse chronological order.
+    Posts are ordered in reverse chronological order, or by engagement with `?ranking=top`
+    (see follows/ranking.py), and paginated with an opaque cursor.
     """
     serializer_class = PostSerializer
     permission_classes = [IsAuthenticated]
-    pagination_class = None # Use default pagination from settings.py or define custom
+    pagination_class = KeysetPagination
 
-    def get_queryset(self):
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            self._paginator = feed_paginator(self.request)
+        return self._paginator
+
+    def list(self, request, *args, **kwargs):
+        """
+        Reads one page of the feed straight from the feed inbox.
+        One extra post is fetched to know whether there is a next page.
+        Conditional requests are answered with 304 Not Modified when none of the
+        page's posts (or their authors' cards) changed; that check only reads post IDs
+        and change timestamps.
+        """
+        read_posts, read_ids = FEED_READERS[feed_ranking(request)]
+        paginator = self.paginator
+        before = paginator.decode_cursor(request)
+        limit = paginator.get_page_size(request) + 1
+        if is_conditional(request):
+            post_ids = self.get_feed_page(read_ids, before=before, limit=limit)
+            versions = feed_versions(post_ids)
+            response = not_modified(request, *feed_validators(request, versions))
+            if response is not None:
+                return response
+            posts = Post.objects.order_by().in_bulk([post_id for post_id, _, _ in versions])
+            posts = [posts[post_id] for post_id, _, _ in versions if post_id in posts] # Unless deleted since
+            versions = [(post.pk, post.changed_at, post.user_id) for post in posts]
+        else:
+            posts = self.get_feed_page(read_posts, before=before, limit=limit)
+            versions = [(post.pk, post.changed_at, post.user_id) for post in posts]
+
+        page = paginator.paginate_rows(posts, request)
+        serializer = self.get_serializer(page, many=True)
+        response = paginator.get_paginated_response(serializer.data)
+        return add_validators(response, *feed_validators(request, versions))
+
+    def get_feed_page(self, read, before=None, limit=None):
         """
         Retrieves posts from users the current user is following,
         ordered by timestamp (most recent first).
+        Posts are read from the user's materialized feed inbox (see follows/feed.py)
+        by `read`, either get_feed (posts) or get_feed_ids (post IDs), or their
+        ranked counterparts of follows/ranking.py.
         """
-        user = self.request.user
-        # Get IDs of users that the current user is following
-        followed_users_ids = user.following_relationships.values_list('following__id', flat=True)
-
-        # Filter posts where the author's ID is in the list of followed users' IDs
-        # and order by timestamp
-        queryset = Post.objects.filter(user__id__in=followed_users_ids).order_by('-timestamp')
-
-        # Optional: Implement filtering by date or search by keyword (Stretch Goal)
-        query = self.request.GET.get('q')
-        date_param = self.request.GET.get('date')
-
-        if query:
-            queryset = queryset.filter(
-                Q(content__icontains=query) | Q(user__username__icontains=query)
-            ).distinct() # Use distinct to avoid duplicate posts if they match multiple criteria
-
-        if date_param:
-            try:
-                # Assuming date_param is in 'YYYY-MM-DD' format
-                from datetime import datetime
-                target_date = datetime.strptime(date_param, '%Y-%m-%d').date()
-                queryset = queryset.filter(timestamp__date=target_date)
-            except ValueError:
-                # Handle invalid date format if needed, perhaps log or return a specific error
-                pass # For now, just ignore if date format is bad
-
-        return queryset
+        return read(self.request.user, before=before, limit=limit, **feed_filters(self.request))
+
+
+class ConnectionPagination(LimitOffsetPagination):
+    max_limit = 100
+
+
+class ConnectionsView(ListAPIView):
+    """
+    API endpoints listing who a user follows and who follows them, as public user cards:
+    - Following (GET /api/follows/following/<user_id>/)
+    - Followers (GET /api/follows/followers/<user_id>/)
+    Answered from the in-memory follow graph, ordered by user ID and paginated with ?limit=&offset=.
+    """
+    permission_classes = [IsAuthenticated]
+    pagination_class = ConnectionPagination
+    direction = None # FOLLOWING or FOLLOWERS, set in urls.py
+
+    def list(self, request, user_id):
+        if not get_cards([user_id]): # Cards are cached, so this is usually free
+            raise NotFound("User not found.")
+        user_ids = follow_graph.get_lists(self.direction, [user_id])[user_id]
+        page = self.paginate_queryset(user_ids)
+        context = {'request': request, 'user_cards': get_cards(page)} # One multi-get for the page
+        return self.get_paginated_response([render_card(member_id, context) for member_id in page])
 
 # Create your views here.
+
+
+class SuggestionsView(ListAPIView):
+    """
+    API endpoint for "who to follow" suggestions (GET /api/follows/suggestions/).
+    Returns up to `page_size` (default 20, at most 100) users ranked by the number of
+    people the caller follows who follow them. Suggestions are precomputed by the
+    compute_follow_suggestions job; users followed since then are skipped.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def list(self, request):
+        try:
+            limit = max(1, min(int(request.query_params.get('page_size', 20)), 100))
+        except ValueError:
+            limit = 20
+        following = follow_graph.following(request.user.pk)
+        rows = [
+            (suggested_id, mutual_count)
+            for suggested_id, mutual_count in (
+                FollowSuggestion.objects.filter(user=request.user)
+                .order_by('rank')
+                .values_list('suggested_id', 'mutual_count')[:limit]
+            )
+            if not contains(following, suggested_id)
+        ]
+        context = {'request': request, 'user_cards': get_cards(suggested_id for suggested_id, _ in rows)}
+        results = [
+            {"user": render_card(suggested_id, context), "mutual_follows": mutual_count}
+            for suggested_id, mutual_count in rows
+            if suggested_id in context['user_cards'] # Skip users deleted since the job ran
+        ]
+        return Response({"results": results}, status=status.HTTP_200_OK)
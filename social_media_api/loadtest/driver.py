@@ -0,0 +1,188 @@
+# loadtest/driver.py
+"""
+Closed-loop HTTP load driver.
+
+`concurrency` worker threads each keep a connection to the server and send
+requests back to back. Every request picks a route from the weighted request
+mix and a random synthetic user (API token). Latencies are recorded per route
+and summarized as throughput and p50/p95/p99, in a JSON-serializable report
+that can be compared with the report of another run (e.g. another commit).
+"""
+import http.client
+import math
+import random
+import threading
+import time
+from itertools import count
+from urllib.parse import urlsplit
+
+# Route name -> (method, path); {post_id} is replaced with a random existing post
+ROUTES = {
+    'feed': ('GET', '/api/follows/feed/'),
+    'posts': ('GET', '/api/posts/'),
+    'like': ('POST', '/api/posts/{post_id}/like/'),
+    'unlike': ('POST', '/api/posts/{post_id}/unlike/'),
+    'notifications': ('GET', '/api/notifications/'),
+}
+DEFAULT_MIX = {'feed': 40, 'posts': 20, 'like': 12, 'unlike': 3, 'notifications': 25}
+PERCENTILES = (50, 95, 99)
+
+
+def parse_mix(text):
+    """
+    Parses a request mix like "feed=40,posts=20,like=15" into {route: weight}.
+    """
+    mix = {}
+    for item in text.split(','):
+        route, _, weight = item.partition('=')
+        route = route.strip()
+        if route not in ROUTES:
+            raise ValueError(f"Unknown route '{route}' (expected one of {', '.join(ROUTES)}).")
+        mix[route] = float(weight)
+    if not any(weight > 0 for weight in mix.values()):
+        raise ValueError("The request mix needs at least one route with a positive weight.")
+    return mix
+
+
+def percentile(ordered, q):
+    """
+    Returns the q-th percentile of an ascending list, interpolating linearly
+    between the closest ranks (numpy's default method).
+    """
+    if not ordered:
+        return None
+    position = (len(ordered) - 1) * q / 100
+    lower, upper = math.floor(position), math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+def summarize(samples, elapsed):
+    """
+    Summarizes (status, seconds) samples: request and error counts, throughput
+    in requests per second and latency percentiles in milliseconds.
+    """
+    latencies = sorted(seconds * 1000 for _, seconds in samples)
+    statuses = {}
+    for status, _ in samples:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    errors = sum(1 for status, _ in samples if status is None or status >= 400)
+    summary = {
+        'requests': len(samples),
+        'errors': errors,
+        'statuses': statuses,
+        'throughput_rps': round(len(samples) / elapsed, 2) if elapsed else None,
+        'latency_ms': {f'p{q}': _round(percentile(latencies, q)) for q in PERCENTILES},
+    }
+    summary['latency_ms']['mean'] = _round(sum(latencies) / len(latencies)) if latencies else None
+    summary['latency_ms']['max'] = _round(latencies[-1]) if latencies else None
+    return summary
+
+
+def _round(value):
+    return round(value, 2) if value is not None else None
+
+
+class LoadDriver:
+    """
+    Replays the request mix against `base_url` as the users owning `tokens`.
+    `post_ids` are the posts the like / unlike routes pick from.
+    """
+    def __init__(self, base_url, tokens, post_ids, mix=None, concurrency=8, timeout=30, seed=None):
+        if not tokens:
+            raise ValueError("The load driver needs at least one API token.")
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.path_prefix = parts.path.rstrip('/')
+        self.tokens = list(tokens)
+        self.post_ids = list(post_ids)
+        self.mix = dict(mix or DEFAULT_MIX)
+        if not self.post_ids:
+            self.mix = {route: weight for route, weight in self.mix.items() if '{post_id}' not in ROUTES[route][1]}
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.seed = seed
+
+    def run(self, duration=None, requests=None):
+        """
+        Sends requests until `duration` seconds have passed or `requests` requests
+        were sent (whichever is given), and returns the report.
+        """
+        if duration is None and requests is None:
+            raise ValueError("Give a duration or a number of requests.")
+        deadline = time.perf_counter() + duration if duration is not None else None
+        issued = count(1) # next() is atomic, so workers can share it without a lock
+        samples = [[] for _ in range(self.concurrency)]
+
+        def keep_going():
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+            return requests is None or next(issued) <= requests
+
+        started = time.perf_counter()
+        workers = [
+            threading.Thread(target=self._work, args=(worker, keep_going, samples[worker]), daemon=True)
+            for worker in range(self.concurrency)
+        ]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        all_samples = [sample for worker_samples in samples for sample in worker_samples]
+        routes = {
+            route: summarize([(status, seconds) for name, status, seconds in all_samples if name == route], elapsed)
+            for route in self.mix
+        }
+        return {
+            'concurrency': self.concurrency,
+            'mix': self.mix,
+            'users': len(self.tokens),
+            'elapsed_s': round(elapsed, 3),
+            'total': summarize([(status, seconds) for _, status, seconds in all_samples], elapsed),
+            'routes': routes,
+        }
+
+    def _work(self, worker, keep_going, samples):
+        seed = None if self.seed is None else self.seed + worker
+        rng = random.Random(seed)
+        routes, weights = list(self.mix), list(self.mix.values())
+        connection = self.connection_class(self.netloc, timeout=self.timeout)
+        try:
+            while keep_going():
+                route = rng.choices(routes, weights)[0]
+                method, path = ROUTES[route]
+                if '{post_id}' in path:
+                    path = path.format(post_id=rng.choice(self.post_ids))
+                headers = {'Authorization': f'Token {rng.choice(self.tokens)}'}
+
+                started = time.perf_counter()
+                try:
+                    connection.request(method, self.path_prefix + path, headers=headers)
+                    response = connection.getresponse()
+                    response.read() # The body must be consumed before the connection can be reused
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    status = None
+                    connection.close() # Reconnects on the next request
+                samples.append((route, status, time.perf_counter() - started))
+        finally:
+            connection.close()
+
+
+def compare(baseline, current):
+    """
+    Returns one row per route present in both reports: (route, metric, baseline, current, change in %).
+    Latency metrics are compared at every percentile, throughput as requests per second.
+    """
+    rows = []
+    for route in ['total'] + sorted(set(baseline['routes']) & set(current['routes'])):
+        before = baseline['total'] if route == 'total' else baseline['routes'][route]
+        after = current['total'] if route == 'total' else current['routes'][route]
+        pairs = [('throughput_rps', before['throughput_rps'], after['throughput_rps'])]
+        pairs += [(f'p{q}_ms', before['latency_ms'][f'p{q}'], after['latency_ms'][f'p{q}']) for q in PERCENTILES]
+        for metric, old, new in pairs:
+            change = round((new - old) / old * 100, 1) if old and new is not None else None
+            rows.append((route, metric, old, new, change))
+    return rows
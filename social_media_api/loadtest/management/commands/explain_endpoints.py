@@ -0,0 +1,66 @@
+# loadtest/management/commands/explain_endpoints.py
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from follows.models import Follow
+from posts.models import Comment, Post
+from social_media_api.queryplans import HOT_ENDPOINTS, endpoint_plans, format_plan
+from users.models import CustomUser
+
+
+class Command(BaseCommand):
+    """
+    Runs EXPLAIN on every statement of the hot endpoints against the configured
+    database (e.g. loaded by generate_social_data, where the planner sees
+    realistic table sizes) and fails when a plan falls back to a full table
+    scan or a sort outside an index. The requests are made in-process as one
+    user, inside a transaction that is rolled back.
+    """
+    help = "Checks the query plans of the hot endpoints for full scans and sorts outside an index."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Send the requests as this user ID (default: the most active follower).")
+
+    def handle(self, *args, **options):
+        users = CustomUser.objects.filter(is_active=True)
+        if options['user']:
+            user = users.filter(pk=options['user']).first()
+        else:
+            user = users.annotate(follows=Count('following_relationships')).order_by('-follows', 'pk').first()
+        other_id = (
+            Follow.objects.filter(follower=user, following__posts__isnull=False)
+            .values_list('following_id', flat=True).first()
+        )
+        if other_id is None:
+            raise CommandError("No user who follows someone with posts; generate data with generate_social_data first.")
+        post_id = Post.objects.filter(user_id=other_id).order_by('-timestamp', '-id').values_list('pk', flat=True).first()
+        ids = {
+            'user': user.pk,
+            'other': other_id,
+            'post': post_id,
+            'comment': (
+                Comment.objects.filter(post_id=post_id, thread__isnull=True).values_list('pk', flat=True).first()
+                or Comment.objects.filter(thread__isnull=True).values_list('pk', flat=True).first()
+            ),
+        }
+
+        hosts = [host for host in settings.ALLOWED_HOSTS if host != '*' and not host.startswith('.')]
+        client = APIClient(HTTP_HOST=hosts[0] if hosts else 'localhost')
+        failures = 0
+        with transaction.atomic():
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            for method, url, alias, sql, params, problems in endpoint_plans(client, ids):
+                failures += bool(problems)
+                if problems or options['verbosity'] > 1:
+                    self.stdout.write(f"{method.upper()} {url}: {', '.join(problems) or 'OK'}\n  {sql}")
+                    self.stdout.write('  ' + format_plan(alias, sql, params).replace('\n', '\n  '))
+            transaction.set_rollback(True) # Likes and tokens created by the requests are not kept
+
+        if failures:
+            raise CommandError(f"{failures} queries of the hot endpoints are not served by an index.")
+        self.stdout.write(self.style.SUCCESS(f"All queries of {len(HOT_ENDPOINTS)} hot endpoints are served by indexes."))
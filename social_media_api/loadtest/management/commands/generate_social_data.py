@@ -0,0 +1,44 @@
+# loadtest/management/commands/generate_social_data.py
+from django.core.management.base import BaseCommand
+
+from loadtest.synthetic import generate_social_graph
+
+
+class Command(BaseCommand):
+    """
+    Bulk-generates a synthetic social graph (users with API tokens, power-law
+    follows, posts, likes, comments and notifications) for local load testing.
+    Existing data is kept; generated usernames start with --prefix.
+    """
+    help = "Generates a synthetic social graph for load testing."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000, help="Users to create.")
+        parser.add_argument('--follows-per-user', type=int, default=50, help="Average number of users each user follows.")
+        parser.add_argument('--posts-per-user', type=int, default=10, help="Average number of posts per user.")
+        parser.add_argument('--likes-per-post', type=float, default=5, help="Average likes on a post of an average author.")
+        parser.add_argument('--comments-per-post', type=float, default=1, help="Average comments on a post of an average author.")
+        parser.add_argument('--exponent', type=float, default=1.1, help="Zipf exponent of the follower distribution.")
+        parser.add_argument('--days', type=int, default=30, help="Posts are spread over this many past days.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows inserted per query.")
+        parser.add_argument('--seed', type=int, help="Random seed, for reproducible graphs.")
+        parser.add_argument('--prefix', default='load', help="Prefix of the generated usernames.")
+        parser.add_argument('--password', default='Str0ng-pass!', help="Password of every generated user.")
+
+    def handle(self, *args, **options):
+        created = generate_social_graph(
+            users=options['users'],
+            follows_per_user=options['follows_per_user'],
+            posts_per_user=options['posts_per_user'],
+            likes_per_post=options['likes_per_post'],
+            comments_per_post=options['comments_per_post'],
+            exponent=options['exponent'],
+            days=options['days'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            prefix=options['prefix'],
+            password=options['password'],
+            log=self.stdout.write,
+        )
+        summary = ', '.join(f"{total} {kind}" for kind, total in created.items())
+        self.stdout.write(self.style.SUCCESS(f"Generated {summary}."))
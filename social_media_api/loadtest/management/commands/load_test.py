@@ -0,0 +1,109 @@
+# loadtest/management/commands/load_test.py
+import json
+import os
+import subprocess
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from loadtest.driver import DEFAULT_MIX, LoadDriver, compare, parse_mix
+from posts.models import Post
+
+
+def current_commit():
+    """
+    Returns the git commit the code under test was built from, or None outside a checkout.
+    """
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """
+    Replays a realistic request mix (feed, post list, likes, notifications)
+    against a running server as randomly chosen synthetic users, and reports
+    throughput and p50/p95/p99 latency per route. The report is stored as JSON
+    so runs can be compared between commits with --compare.
+    Generate the users first with generate_social_data.
+    """
+    help = "Load-tests a running server and reports latency percentiles per route."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', default='http://127.0.0.1:8000', help="Server to load.")
+        parser.add_argument('--concurrency', type=int, default=8, help="Concurrent clients.")
+        parser.add_argument('--duration', type=float, default=30, help="Seconds to run for.")
+        parser.add_argument('--requests', type=int, help="Stop after this many requests instead of after --duration.")
+        parser.add_argument(
+            '--mix', default=','.join(f'{route}={weight}' for route, weight in DEFAULT_MIX.items()),
+            help="Weighted request mix, e.g. feed=40,posts=20,like=15,notifications=25.",
+        )
+        parser.add_argument('--users', type=int, default=500, help="Synthetic users to send requests as.")
+        parser.add_argument('--prefix', default='load', help="Only act as users whose username starts with this.")
+        parser.add_argument('--posts', type=int, default=5000, help="Posts the like routes pick from.")
+        parser.add_argument('--seed', type=int, help="Random seed of the request sequence.")
+        parser.add_argument('--output', help="Report file (default: load-results/<time>-<commit>.json).")
+        parser.add_argument('--compare', help="Earlier report to compare this run with.")
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options['mix'])
+        except ValueError as exc:
+            raise CommandError(exc)
+
+        tokens = list(
+            Token.objects.filter(user__username__startswith=options['prefix'])
+            .order_by('?').values_list('key', flat=True)[:options['users']]
+        )
+        if not tokens:
+            raise CommandError(f"No users named '{options['prefix']}...' have a token; run generate_social_data first.")
+        post_ids = list(Post.objects.order_by('?').values_list('id', flat=True)[:options['posts']])
+
+        started_at = timezone.now()
+        driver = LoadDriver(
+            options['base_url'], tokens, post_ids, mix=mix, concurrency=options['concurrency'], seed=options['seed'],
+        )
+        if options['requests']:
+            report = driver.run(requests=options['requests'])
+        else:
+            report = driver.run(duration=options['duration'])
+        commit = current_commit()
+        report = {'started_at': started_at.isoformat(), 'commit': commit, 'base_url': options['base_url'], **report}
+
+        self.write_report(report)
+        output = options['output'] or os.path.join(
+            'load-results', f"{started_at:%Y%m%d-%H%M%S}-{(commit or 'unknown')[:8]}.json",
+        )
+        os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+        with open(output, 'w') as report_file:
+            json.dump(report, report_file, indent=2)
+        self.stdout.write(self.style.SUCCESS(f"Report written to {output}."))
+
+        if options['compare']:
+            with open(options['compare']) as baseline_file:
+                baseline = json.load(baseline_file)
+            self.write_comparison(baseline, report)
+
+    def write_report(self, report):
+        self.stdout.write(f"{'route':<15}{'requests':>10}{'errors':>8}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for route, summary in list(report['routes'].items()) + [('total', report['total'])]:
+            latency = summary['latency_ms']
+            self.stdout.write(
+                f"{route:<15}{summary['requests']:>10}{summary['errors']:>8}{summary['throughput_rps']:>10}"
+                f"{_ms(latency['p50']):>10}{_ms(latency['p95']):>10}{_ms(latency['p99']):>10}"
+            )
+
+    def write_comparison(self, baseline, report):
+        self.stdout.write(f"\nCompared with {baseline.get('commit') or 'baseline'} ({baseline.get('started_at')}):")
+        for route, metric, old, new, change in compare(baseline, report):
+            change = f"{change:+.1f}%" if change is not None else '-'
+            self.stdout.write(f"{route:<15}{metric:<16}{_ms(old):>10} -> {_ms(new):<10}{change:>8}")
+
+
+def _ms(value):
+    return '-' if value is None else f"{value:.1f}"
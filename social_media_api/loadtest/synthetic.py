@@ -0,0 +1,266 @@
+# loadtest/synthetic.py
+"""
+Bulk generation of a synthetic social graph for local load testing.
+
+Follows have a power-law (Zipf) in-degree like real networks: a handful of
+accounts are followed by a large share of users, most by only a few. Posts of
+popular authors also get proportionally more likes and comments. Rows are
+written with bulk_create in batches, bypassing the API, so the derived data
+(feed inboxes, counters, search index, unread counts) is built at the end for
+the generated rows only.
+"""
+import secrets
+from datetime import timedelta
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from follows.feed import forget_pull_authors
+from follows.graph import follow_graph
+from follows.models import Follow, FeedEntry
+from notifications.models import Notification
+from notifications.unread import recount_unread
+from posts.counters import recount_counters
+from posts.models import Post, Like, Comment
+from posts.search import get_search_backend
+from users.models import CustomUser
+
+WORDS = (
+    'today', 'shipping', 'a', 'new', 'release', 'of', 'the', 'api', 'coffee', 'weekend', 'deploy',
+    'finally', 'fixed', 'that', 'bug', 'reading', 'about', 'databases', 'caching', 'queries', 'team',
+    'launch', 'great', 'talk', 'on', 'performance', 'learning', 'something', 'every', 'day', 'travel',
+    '#django', '#python', '#webdev', '#databases', '#opensource', '#coffee', '#travel', '#music',
+)
+
+
+def popularity(count, exponent):
+    """
+    Returns the cumulative Zipf distribution over `count` ranks (rank 0 is the most popular).
+    """
+    weights = 1.0 / np.arange(1, count + 1) ** exponent
+    cumulative = np.cumsum(weights)
+    return cumulative / cumulative[-1]
+
+
+def _text(rng, min_words, max_words):
+    return ' '.join(rng.choice(WORDS, size=rng.integers(min_words, max_words + 1)))
+
+
+def _batches(items, batch_size):
+    for start in range(0, len(items), batch_size):
+        yield items[start:start + batch_size]
+
+
+def create_users(count, prefix, password, batch_size):
+    """
+    Creates `count` users with API tokens and returns their IDs in creation order.
+    """
+    run = secrets.token_hex(3) # Keeps usernames unique across runs
+    hashed = make_password(password) # Hashing is deliberately slow: do it once for everyone
+    user_ids = []
+    for names in _batches([f'{prefix}{run}_{n}' for n in range(count)], batch_size):
+        CustomUser.objects.bulk_create(
+            CustomUser(username=name, email=f'{name}@example.com', password=hashed) for name in names
+        )
+        # bulk_create does not return primary keys on MySQL
+        batch_ids = list(CustomUser.objects.filter(username__in=names).order_by('id').values_list('id', flat=True))
+        Token.objects.bulk_create(Token(user_id=user_id, key=Token.generate_key()) for user_id in batch_ids)
+        user_ids.extend(batch_ids)
+    return np.array(user_ids)
+
+
+def create_follows(rng, user_ids, usernames, follows_per_user, exponent, batch_size):
+    """
+    Creates follows with a Poisson out-degree around `follows_per_user` and a
+    Zipf in-degree, plus a follow notification for each.
+    Returns the (follower, followed) user index pairs.
+    """
+    count = len(user_ids)
+    cumulative = popularity(count, exponent)
+    ranking = rng.permutation(count) # ranking[rank] is the index of the user with that popularity rank
+    degrees = np.minimum(rng.poisson(follows_per_user, size=count), count - 1)
+    pairs = []
+
+    follows, notifications = [], []
+    for follower, degree in enumerate(degrees):
+        # Oversample, then keep the first `degree` distinct users other than the follower
+        drawn = ranking[np.searchsorted(cumulative, rng.random(degree * 2), side='right')]
+        _, first = np.unique(drawn, return_index=True)
+        targets = drawn[np.sort(first)]
+        targets = targets[targets != follower][:degree]
+        pairs.extend((follower, target) for target in targets)
+
+        follower_id = int(user_ids[follower])
+        for target in targets:
+            follows.append(Follow(follower_id=follower_id, following_id=int(user_ids[target])))
+            notifications.append(Notification(
+                recipient_id=int(user_ids[target]), sender_id=follower_id, type='follow',
+                message=f"{usernames[follower_id]} started following you.",
+            ))
+        if len(follows) >= batch_size or follower == count - 1:
+            Follow.objects.bulk_create(follows, batch_size=batch_size)
+            Notification.objects.bulk_create(notifications, batch_size=batch_size)
+            follows, notifications = [], []
+    return np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+
+def create_posts(rng, user_ids, posts_per_user, days, batch_size):
+    """
+    Creates a Poisson number of posts around `posts_per_user` for every user,
+    spread over the last `days` days. Returns (post IDs, author indexes, timestamps).
+    """
+    now = timezone.now()
+    counts = rng.poisson(posts_per_user, size=len(user_ids))
+    users_per_batch = max(1, batch_size // max(1, posts_per_user))
+    post_ids, authors, timestamps = [], [], []
+    index_of = {int(user_id): index for index, user_id in enumerate(user_ids)}
+    for batch in _batches(np.arange(len(user_ids)), users_per_batch):
+        batch_user_ids = [int(user_ids[index]) for index in batch]
+        Post.objects.bulk_create(
+            [
+                Post(user_id=int(user_ids[index]), content=_text(rng, 4, 30))
+                for index in batch for _ in range(counts[index])
+            ],
+            batch_size=batch_size,
+        )
+        # auto_now_add overwrote the timestamps: backdate the new posts afterwards
+        created = list(Post.objects.filter(user_id__in=batch_user_ids).order_by('id').values_list('id', 'user_id'))
+        backdated = [now - timedelta(seconds=float(age)) for age in rng.random(len(created)) * days * 86400]
+        Post.objects.bulk_update(
+            [Post(id=post_id, timestamp=timestamp) for (post_id, _), timestamp in zip(created, backdated)],
+            ['timestamp'], batch_size=batch_size,
+        )
+        post_ids.extend(post_id for post_id, _ in created)
+        authors.extend(index_of[user_id] for _, user_id in created)
+        timestamps.extend(backdated)
+    return np.array(post_ids, dtype=np.int64), np.array(authors, dtype=np.int64), timestamps
+
+
+def create_engagement(rng, user_ids, usernames, post_ids, authors, followers, likes_per_post, comments_per_post, batch_size):
+    """
+    Creates likes and comments (with their notifications) on every post. Posts
+    of authors with more followers get proportionally more engagement.
+    Returns (likes, comments) created.
+    """
+    count = len(user_ids)
+    reach = followers[authors] / max(followers.mean(), 1e-9) # 1.0 for an author with an average audience
+    like_counts = np.minimum(rng.poisson(likes_per_post * reach), count - 1)
+    comment_counts = rng.poisson(comments_per_post * reach)
+
+    total_likes = total_comments = 0
+    for batch in _batches(np.arange(len(post_ids)), batch_size):
+        likes, comments, notifications = [], [], []
+        for index in batch:
+            post_id, author = int(post_ids[index]), int(user_ids[authors[index]])
+            likers = {int(user_ids[liker]) for liker in rng.integers(0, count, size=like_counts[index])}
+            likers.discard(author)
+            for liker in likers:
+                likes.append(Like(user_id=liker, post_id=post_id))
+                notifications.append(Notification(
+                    recipient_id=author, sender_id=liker, post_id=post_id, type='like',
+                    message=f"{usernames[liker]} liked your post.",
+                ))
+            for commenter in rng.integers(0, count, size=comment_counts[index]):
+                commenter = int(user_ids[commenter])
+                comments.append(Comment(user_id=commenter, post_id=post_id, content=_text(rng, 2, 15)))
+                if commenter != author:
+                    notifications.append(Notification(
+                        recipient_id=author, sender_id=commenter, post_id=post_id, type='comment',
+                        message=f"{usernames[commenter]} commented on your post.",
+                    ))
+        Like.objects.bulk_create(likes, batch_size=batch_size, ignore_conflicts=True)
+        Comment.objects.bulk_create(comments, batch_size=batch_size)
+        Notification.objects.bulk_create(notifications, batch_size=batch_size)
+        total_likes += len(likes)
+        total_comments += len(comments)
+    return total_likes, total_comments
+
+
+def create_feed_entries(user_ids, follows, post_ids, authors, timestamps, pull, batch_size):
+    """
+    Fills the feed inbox of every follower with the most recent posts of the
+    users they follow, like backfill_follow() does for a new follow. Authors
+    in `pull` (fan-out on read) are skipped. Returns the number of entries created.
+    """
+    recent = {}
+    for index in sorted(range(len(post_ids)), key=lambda index: (timestamps[index], post_ids[index]), reverse=True):
+        posts = recent.setdefault(authors[index], [])
+        if len(posts) < settings.FEED_BACKFILL_POSTS:
+            posts.append(index)
+
+    entries, total = [], 0
+    for follower, followed in follows:
+        if followed in pull:
+            continue
+        entries.extend(
+            FeedEntry(
+                owner_id=int(user_ids[follower]), post_id=int(post_ids[index]),
+                author_id=int(user_ids[followed]), timestamp=timestamps[index],
+            )
+            for index in recent.get(followed, ())
+        )
+        if len(entries) >= batch_size:
+            FeedEntry.objects.bulk_create(entries, batch_size=batch_size)
+            total += len(entries)
+            entries = []
+    FeedEntry.objects.bulk_create(entries, batch_size=batch_size)
+    return total + len(entries)
+
+
+def build_derived_data(user_ids, follows, post_ids, authors, timestamps, batch_size):
+    """
+    Builds everything the API maintains incrementally for the generated rows:
+    feed inboxes, post counters, unread counts and the search index.
+    """
+    # Authors this popular would have been switched to fan-out on read by fan_out_post()
+    followers = np.bincount(follows[:, 1], minlength=len(user_ids))
+    pull = {index for index in range(len(user_ids)) if followers[index] > settings.FEED_FANOUT_MAX_FOLLOWERS}
+    CustomUser.objects.filter(pk__in=[int(user_ids[index]) for index in pull]).update(fanout_on_read=True)
+    forget_pull_authors()
+    follow_graph.clear()
+    create_feed_entries(user_ids, follows, post_ids, authors, timestamps, pull, batch_size)
+
+    for batch in _batches([int(user_id) for user_id in user_ids], batch_size):
+        recount_counters(Post.objects.filter(user_id__in=batch))
+        for user_id in batch:
+            recount_unread(user_id)
+
+    backend = get_search_backend()
+    for batch in _batches(post_ids.tolist(), batch_size):
+        backend.index_posts(Post.objects.filter(pk__in=batch).order_by('id'))
+
+
+def generate_social_graph(
+    users=1000, follows_per_user=50, posts_per_user=10, likes_per_post=5, comments_per_post=1,
+    exponent=1.1, days=30, batch_size=1000, seed=None, prefix='load', password='Str0ng-pass!', log=None,
+):
+    """
+    Generates a synthetic social graph next to the existing data and returns
+    the number of rows created per kind. `exponent` is the Zipf exponent of
+    the follower distribution; `log` is called with a progress message after each phase.
+    """
+    log = log or (lambda message: None)
+    rng = np.random.default_rng(seed)
+
+    user_ids = create_users(users, prefix, password, batch_size)
+    usernames = dict(CustomUser.objects.filter(pk__in=user_ids.tolist()).values_list('id', 'username'))
+    log(f"Created {len(user_ids)} users.")
+    follows = create_follows(rng, user_ids, usernames, follows_per_user, exponent, batch_size)
+    followers = np.bincount(follows[:, 1], minlength=len(user_ids))
+    log(f"Created {len(follows)} follows (most followed user: {int(followers.max())} followers).")
+    post_ids, authors, timestamps = create_posts(rng, user_ids, posts_per_user, days, batch_size)
+    log(f"Created {len(post_ids)} posts.")
+    likes, comments = create_engagement(
+        rng, user_ids, usernames, post_ids, authors, followers, likes_per_post, comments_per_post, batch_size,
+    )
+    log(f"Created {likes} likes and {comments} comments.")
+    build_derived_data(user_ids, follows, post_ids, authors, timestamps, batch_size)
+    log("Built feed inboxes, counters, unread counts and the search index.")
+
+    return {
+        'users': len(user_ids), 'follows': len(follows), 'posts': len(post_ids),
+        'likes': likes, 'comments': comments,
+    }
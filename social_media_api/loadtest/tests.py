@@ -0,0 +1,89 @@
+from django.db.models import Count, F
+from django.test import LiveServerTestCase, TestCase
+from rest_framework.authtoken.models import Token
+
+from follows.models import Follow, FeedEntry
+from notifications.models import Notification, NotificationState
+from posts.models import Post, Like, Comment
+from users.models import CustomUser
+from .driver import LoadDriver, compare, parse_mix, percentile, summarize
+from .synthetic import generate_social_graph
+
+
+class SyntheticGraphTests(TestCase):
+    """
+    The generator writes a consistent, skewed social graph.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.created = generate_social_graph(
+            users=60, follows_per_user=8, posts_per_user=3, likes_per_post=2, comments_per_post=1,
+            batch_size=25, seed=7,
+        )
+
+    def test_rows_are_created(self):
+        self.assertEqual(CustomUser.objects.filter(username__startswith='load').count(), 60)
+        self.assertEqual(Token.objects.count(), 60)
+        self.assertEqual(Follow.objects.count(), self.created['follows'])
+        self.assertEqual(Post.objects.count(), self.created['posts'])
+        self.assertEqual(Like.objects.count(), self.created['likes'])
+        self.assertEqual(Comment.objects.count(), self.created['comments'])
+        self.assertFalse(Follow.objects.filter(follower=F('following')).exists())
+
+    def test_followers_follow_a_power_law(self):
+        followers = sorted(
+            CustomUser.objects.annotate(total=Count('follower_relationships')).values_list('total', flat=True),
+            reverse=True,
+        )
+        self.assertGreater(followers[0], 4 * followers[len(followers) // 2])
+
+    def test_derived_data_is_rebuilt(self):
+        post = Post.objects.order_by('-likes_count').first()
+        self.assertEqual(post.likes_count, post.likes.count())
+        self.assertTrue(FeedEntry.objects.exists())
+        state = NotificationState.objects.order_by('-unread_count').first()
+        self.assertEqual(state.unread_count, Notification.objects.filter(recipient_id=state.user_id).count())
+
+
+
+class ReportTests(TestCase):
+    def test_percentiles_interpolate(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50.5)
+        self.assertAlmostEqual(percentile(values, 99), 99.01)
+        self.assertIsNone(percentile([], 50))
+
+    def test_summary_and_comparison(self):
+        summary = summarize([(200, 0.010), (200, 0.020), (500, 0.030), (None, 0.040)], elapsed=2)
+        self.assertEqual((summary['requests'], summary['errors'], summary['throughput_rps']), (4, 2, 2.0))
+        self.assertEqual(summary['statuses'], {'200': 2, '500': 1, 'None': 1})
+        self.assertEqual(summary['latency_ms']['p50'], 25.0)
+
+        baseline = {'total': summary, 'routes': {'feed': summary}}
+        faster = summarize([(200, 0.005)] * 4, elapsed=1)
+        rows = compare(baseline, {'total': faster, 'routes': {'feed': faster}})
+        self.assertIn(('feed', 'p50_ms', 25.0, 5.0, -80.0), rows)
+
+    def test_mix_must_name_known_routes(self):
+        self.assertEqual(parse_mix('feed=3,like=1'), {'feed': 3.0, 'like': 1.0})
+        with self.assertRaises(ValueError):
+            parse_mix('feed=3,timeline=1')
+
+
+class LoadDriverTests(LiveServerTestCase):
+    """
+    The driver runs the request mix against a real server.
+    """
+    def test_run(self):
+        generate_social_graph(users=12, follows_per_user=4, posts_per_user=2, batch_size=10, seed=3)
+        tokens = Token.objects.values_list('key', flat=True)
+        post_ids = Post.objects.values_list('id', flat=True)
+
+        # One client at a time: the test server's threads share a single in-memory SQLite connection
+        report = LoadDriver(self.live_server_url, tokens, post_ids, concurrency=1, seed=1).run(requests=40)
+        self.assertEqual(report['total']['requests'], 40)
+        self.assertEqual(report['total']['errors'], 0)
+        self.assertEqual(sum(route['requests'] for route in report['routes'].values()), 40)
+        latency = report['total']['latency_ms']
+        self.assertLessEqual(latency['p50'], latency['p95'])
+        self.assertLessEqual(latency['p95'], latency['p99'])
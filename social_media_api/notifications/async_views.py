@@ -0,0 +1,179 @@
+# notifications/async_views.py
+"""
+Async read views of the notifications app, served by the ASGI application (see social_media_api/asyncapi.py).
+"""
+import json
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.http import HttpResponse, StreamingHttpResponse
+from django.views.decorators.http import require_GET
+
+from social_media_api.asyncapi import async_api_view, json_response, release_connections, run_query, serialize
+from social_media_api.replicas import use_primary
+from .models import Notification
+from .serializers import NotificationListSerializer
+from .stream import get_broker
+from .views import NotificationPagination, list_queryset
+
+STREAM_BATCH = 100 # Notifications read per query when a stream catches up
+
+
+@async_api_view()
+async def list_notifications(request):
+    """
+    Async counterpart of NotificationViewSet.list.
+    """
+    paginator = NotificationPagination()
+    page = await paginator.apaginate_queryset(list_queryset(request.user), request)
+    data = await serialize(NotificationListSerializer(page, many=True, context={'request': request}))
+    return json_response({'next': paginator.get_next_link(), 'results': data})
+
+
+def resume_after(request):
+    """
+    Returns the notification ID a stream resumes after: the Last-Event-ID header
+    (sent by EventSource when it reconnects) or ?last_event_id=. None when absent or invalid.
+    """
+    value = request.headers.get('Last-Event-ID') or request.query_params.get('last_event_id')
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def format_event(notification):
+    """
+    Returns a serialized notification as a Server-Sent Event; its ID is the notification ID.
+    """
+    data = json.dumps(notification, separators=(',', ':'), default=str)
+    return f"id: {notification['id']}\nevent: notification\ndata: {data}\n\n"
+
+
+class StreamPosition:
+    """
+    How far a stream got in the user's notifications, in (created_at, id) order.
+
+    Notifications can commit after newer ones (a worker's batch commits after a
+    later one), so every read goes back NOTIFICATION_STREAM_OVERLAP seconds
+    before the newest notification sent, and skips those already sent since.
+    Everything up to `start`, the (created_at, id) the client already has
+    (created_at is None when only the ID is known), is never sent.
+    """
+    def __init__(self, start):
+        self.start = start
+        self.newest = start[0] # created_at of the newest notification sent, or of `start`
+        self.sent = {} # ID -> created_at of the notifications sent within the overlap
+
+    def filter(self, queryset):
+        """
+        Returns the notifications of `queryset` still to send, oldest first.
+        """
+        start_created_at, start_id = self.start
+        if start_created_at is None:
+            queryset = queryset.filter(pk__gt=start_id)
+        else:
+            queryset = queryset.filter(Q(created_at__gt=start_created_at) | Q(created_at=start_created_at, pk__gt=start_id))
+        if self.newest is not None:
+            queryset = queryset.filter(created_at__gte=self.newest - self.overlap())
+        return queryset.exclude(pk__in=list(self.sent)).order_by('created_at', 'pk')
+
+    def advance(self, created_at, pk):
+        """
+        Records that a notification was sent.
+        """
+        self.sent[pk] = created_at
+        if self.newest is None or created_at > self.newest:
+            self.newest = created_at
+            horizon = self.newest - self.overlap() # Out of the next reads' range anyway
+            self.sent = {sent_id: sent_at for sent_id, sent_at in self.sent.items() if sent_at >= horizon}
+
+    @staticmethod
+    def overlap():
+        return timedelta(seconds=settings.NOTIFICATION_STREAM_OVERLAP)
+
+
+def start_position(user, last_id):
+    """
+    Returns the StreamPosition of a stream resuming after notification `last_id`,
+    or, without one, starting after the user's newest notification.
+    """
+    notifications = Notification.objects.filter(recipient=user)
+    with use_primary():
+        if last_id is None:
+            newest = notifications.order_by('-created_at', '-pk').values_list('created_at', 'pk').first()
+            return StreamPosition(newest or (None, 0))
+        created_at = notifications.filter(pk=last_id).values_list('created_at', flat=True).first()
+    return StreamPosition((created_at, last_id)) # A deleted notification only leaves its ID to resume from
+
+
+def read_after(request, position):
+    """
+    Returns up to STREAM_BATCH of the request user's notifications not sent yet
+    at `position`, oldest first, as (serialized notification, created_at) pairs.
+    Read from the primary: the stream is woken as soon as they are committed there.
+    """
+    with use_primary():
+        notifications = list(position.filter(list_queryset(request.user))[:STREAM_BATCH])
+        data = NotificationListSerializer(notifications, many=True, context={'request': request}).data
+    return list(zip(data, [notification.created_at for notification in notifications]))
+
+
+async def notification_events(request, last_id, long_poll=False):
+    """
+    Yields the request user's new notifications as Server-Sent Events, oldest
+    first: those after `last_id` (or, without one, those created from now on),
+    then each new one as soon as the broker reports it. Every
+    NOTIFICATION_STREAM_HEARTBEAT seconds of silence, the stream looks again in
+    case a wakeup was missed, then sends a comment so proxies keep the
+    connection open. A long poll ends after the first events, or after one
+    heartbeat interval without any.
+    """
+    broker = get_broker()
+    subscription = broker.subscribe(request.user.pk) # Before reading, so nothing is missed in between
+    try:
+        position = await run_query(lambda: start_position(request.user, last_id))
+        yield f"retry: {settings.NOTIFICATION_STREAM_RETRY}\n\n"
+        timed_out = False
+        while True:
+            sent, batch = False, None
+            while batch is None or len(batch) == STREAM_BATCH:
+                batch = await run_query(lambda: read_after(request, position))
+                for notification, created_at in batch:
+                    yield format_event(notification)
+                    position.advance(created_at, notification['id'])
+                sent = sent or bool(batch)
+            if long_poll and (sent or timed_out):
+                return
+            if timed_out and not sent:
+                yield ": keep-alive\n\n"
+            timed_out = not await subscription.wait(settings.NOTIFICATION_STREAM_HEARTBEAT)
+    finally:
+        broker.unsubscribe(subscription)
+
+
+@require_GET
+@async_api_view()
+async def stream_notifications(request, long_poll=False):
+    """
+    Streams the user's new notifications as Server-Sent Events
+    (GET /api/notifications/stream/), resuming after the Last-Event-ID.
+    Events carry the same compact form as the notification list.
+
+    Between events the stream holds no database connection and, under ASGI,
+    keeps no worker thread busy. Under WSGI (`long_poll`), an endless stream
+    would hold a worker thread for good, so the response ends after the first
+    events (or a heartbeat interval without any); EventSource then reconnects
+    with the Last-Event-ID by itself.
+    """
+    await release_connections() # The stream's queries use short-lived connections of their own
+    events = notification_events(request, resume_after(request), long_poll=long_poll)
+    if long_poll:
+        response = HttpResponse(''.join([event async for event in events]))
+    else:
+        response = StreamingHttpResponse(events)
+    response['Content-Type'] = 'text/event-stream'
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no' # Don't let nginx buffer the stream
+    return response
@@ -0,0 +1,29 @@
+# notifications/management/commands/drain_notification_outbox.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from notifications.outbox import drain_all
+
+
+class Command(BaseCommand):
+    """
+    Worker that turns pending NotificationOutbox rows into Notification rows.
+    Runs once by default; use --loop to keep polling the outbox.
+    """
+    help = "Delivers pending notifications from the outbox in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Outbox rows delivered per transaction.")
+        parser.add_argument('--max-attempts', type=int, default=5, help="Failed attempts before a row is left for inspection.")
+        parser.add_argument('--loop', action='store_true', help="Keep draining until interrupted.")
+        parser.add_argument('--interval', type=float, default=1.0, help="Seconds to sleep when the outbox is empty (with --loop).")
+
+    def handle(self, *args, **options):
+        while True:
+            delivered, failed = drain_all(batch_size=options['batch_size'], max_attempts=options['max_attempts'])
+            if delivered or failed or not options['loop']:
+                self.stdout.write(f"Delivered {delivered} notifications, {failed} failed and will be retried.")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
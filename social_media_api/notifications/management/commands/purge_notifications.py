@@ -0,0 +1,35 @@
+# notifications/management/commands/purge_notifications.py
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from notifications.retention import purge_read_notifications
+
+
+class Command(BaseCommand):
+    """
+    Deletes read notifications past the retention period in bounded batches.
+    Meant to run periodically (e.g. nightly from cron); safe to interrupt and re-run.
+    """
+    help = "Deletes (and optionally archives) read notifications older than the retention period."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=settings.NOTIFICATION_RETENTION_DAYS,
+            help="Keep read notifications younger than this many days.",
+        )
+        parser.add_argument('--batch-size', type=int, default=1000, help="Notification IDs deleted per transaction.")
+        parser.add_argument('--archive', help="Append the deleted notifications to this file as JSON lines.")
+        parser.add_argument('--pause', type=float, default=0, help="Seconds to sleep between batches.")
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options['days'])
+        stdout = self.stdout if options['verbosity'] > 1 else None
+        if options['archive']:
+            with open(options['archive'], 'a', encoding='utf-8') as archive:
+                total = purge_read_notifications(cutoff, options['batch_size'], archive, options['pause'], stdout)
+        else:
+            total = purge_read_notifications(cutoff, options['batch_size'], None, options['pause'], stdout)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {total} read notifications created before {cutoff:%Y-%m-%d}."))
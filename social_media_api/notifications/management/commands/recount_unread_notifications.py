@@ -0,0 +1,26 @@
+# notifications/management/commands/recount_unread_notifications.py
+from django.core.management.base import BaseCommand
+
+from notifications.models import NotificationState
+from notifications.unread import recount_unread
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the cached unread notification counters to repair drift
+    (e.g. unread notifications removed by a cascading post delete).
+    """
+    help = "Recomputes NotificationState.unread_count for every user that has one."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, help="Only recount this user ID.")
+
+    def handle(self, *args, **options):
+        if options['user']:
+            user_ids = [options['user']]
+        else:
+            user_ids = list(NotificationState.objects.order_by('user_id').values_list('user_id', flat=True))
+
+        for user_id in user_ids:
+            recount_unread(user_id)
+        self.stdout.write(self.style.SUCCESS(f"Recounted unread notifications for {len(user_ids)} users."))
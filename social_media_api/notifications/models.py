@@ -1,6 +1,7 @@
 from django.db import models
 # notifications/models.py
 from django.db import models
+from django.utils import timezone
 from users.models import CustomUser
 from posts.models import Post, Comment # Import Post and Comment for optional links
 
@@ -25,8 +26,56 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # A user's unread (or read) notifications, newest first: unread counts, retention
+            models.Index(fields=['recipient', 'is_read', 'created_at'], name='notif_recipient_read_idx'),
+            # Keyset pagination of a user's notifications over (created_at, id)
+            models.Index(fields=['recipient', '-created_at', '-id'], name='notif_recipient_created_idx'),
+        ]
 
     def __str__(self):
         return f"Notification for {self.recipient.username} ({self.type}): {self.message[:50]}..."
 
+
+class NotificationState(models.Model):
+    """
+    Per-user notification bookkeeping, so the unread badge is a primary key lookup.
+    'unread_count' and 'read_through' are kept up to date by notifications/unread.py.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, primary_key=True, related_name='notification_state')
+    unread_count = models.PositiveIntegerField(default=0)
+    read_through = models.PositiveBigIntegerField(default=0) # Read watermark: notifications up to this ID count as read
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.unread_count} unread notifications for user {self.user_id}"
+
+
+class NotificationOutbox(models.Model):
+    """
+    A notification waiting to be delivered (transactional outbox).
+    Rows are written in the same transaction as the Follow/Like/Comment that
+    triggers them and turned into Notification rows by the
+    drain_notification_outbox worker (see notifications/outbox.py).
+    """
+    recipient = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    sender = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    comment = models.ForeignKey(Comment, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    type = models.CharField(max_length=50, choices=Notification._meta.get_field('type').choices)
+    message = models.TextField()
+    attempts = models.PositiveSmallIntegerField(default=0) # Failed delivery attempts so far
+    available_at = models.DateTimeField(default=timezone.now) # Not retried before this time
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['available_at', 'id'], name='outbox_available_idx'),
+        ]
+
+    def __str__(self):
+        return f"Pending {self.type} notification for user {self.recipient_id}"
+
 # Create your models here.
@@ -0,0 +1,115 @@
+# notifications/outbox.py
+"""
+Transactional outbox for notifications.
+
+Request handlers call `enqueue()` inside the transaction that creates the
+Follow, Like or Comment, which costs a single small INSERT. The
+drain_notification_outbox worker later calls `drain()` to turn pending rows
+into Notification rows in batches. A batch is delivered and removed from the
+outbox in one transaction, so a crash before commit simply delivers it again
+on the next run (at-least-once). Connected notification streams of the
+recipients are woken once a batch is committed (see notifications/stream.py).
+Rows that fail are retried with exponential backoff until they reach the
+maximum number of attempts.
+"""
+from datetime import timedelta
+from functools import partial
+
+from django.db import DatabaseError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Notification, NotificationOutbox
+from .stream import publish
+from .unread import increment_unread, lock_read_states
+
+DELIVERED_FIELDS = ('recipient_id', 'sender_id', 'post_id', 'comment_id', 'type', 'message')
+
+
+def enqueue(type, message, **refs):
+    """
+    Records a notification to be delivered once the surrounding transaction commits.
+    `refs` are the recipient, sender, post and comment, given as instances
+    (recipient=user) or IDs (recipient_id=user_id).
+    """
+    return NotificationOutbox.objects.create(type=type, message=message, **refs)
+
+
+def enqueue_many(notifications):
+    """
+    Records several notifications (dicts of enqueue() arguments) with one INSERT.
+    """
+    return NotificationOutbox.objects.bulk_create([NotificationOutbox(**fields) for fields in notifications])
+
+
+def _to_notification(row):
+    return Notification(**{field: getattr(row, field) for field in DELIVERED_FIELDS})
+
+
+def _retry_later(rows, error):
+    """
+    Pushes failed rows back with exponential backoff (2, 4, 8, ... seconds, capped at one hour).
+    """
+    now = timezone.now()
+    for row in rows:
+        delay = min(2 ** (row.attempts + 1), 3600)
+        NotificationOutbox.objects.filter(pk=row.pk).update(
+            attempts=F('attempts') + 1,
+            available_at=now + timedelta(seconds=delay),
+            last_error=str(error)[:1000],
+        )
+
+
+def drain(batch_size=500, max_attempts=5):
+    """
+    Delivers one batch of pending outbox rows. Returns (delivered, failed) counts.
+
+    The batch is locked with SELECT ... FOR UPDATE SKIP LOCKED so several
+    workers can drain the outbox concurrently. If the bulk insert fails, rows
+    are retried one by one so a single bad row cannot block the whole batch.
+    """
+    with transaction.atomic():
+        batch = list(
+            NotificationOutbox.objects.select_for_update(skip_locked=True)
+            .filter(available_at__lte=timezone.now(), attempts__lt=max_attempts)
+            .order_by('id')[:batch_size]
+        )
+        if not batch:
+            return 0, 0
+
+        # IDs are allocated under the recipients' read state locks, so mark_all_read()
+        # never sets a watermark above a notification that is not committed yet
+        lock_read_states({row.recipient_id for row in batch})
+        try:
+            with transaction.atomic():
+                Notification.objects.bulk_create([_to_notification(row) for row in batch])
+            delivered, failed = batch, []
+        except DatabaseError:
+            delivered, failed = [], []
+            for row in batch:
+                try:
+                    with transaction.atomic():
+                        _to_notification(row).save()
+                    delivered.append(row)
+                except DatabaseError as exc:
+                    failed.append(row)
+                    _retry_later([row], exc)
+
+        NotificationOutbox.objects.filter(pk__in=[row.pk for row in delivered]).delete()
+        increment_unread([row.recipient_id for row in delivered])
+        # Wake the recipients' notification streams once the rows are visible
+        transaction.on_commit(partial(publish, [row.recipient_id for row in delivered]))
+    return len(delivered), len(failed)
+
+
+def drain_all(batch_size=500, max_attempts=5):
+    """
+    Drains batches until no deliverable rows are left. Returns (delivered, failed) totals.
+    """
+    delivered_total = failed_total = 0
+    while True:
+        delivered, failed = drain(batch_size=batch_size, max_attempts=max_attempts)
+        delivered_total += delivered
+        failed_total += failed
+        if not delivered: # Empty outbox, or everything left is waiting for a retry
+            return delivered_total, failed_total
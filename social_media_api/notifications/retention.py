@@ -0,0 +1,63 @@
+# notifications/retention.py
+"""
+Time-based retention of read notifications.
+
+purge_read_notifications() deletes (optionally after archiving them) the
+notifications older than a cutoff that their recipient has read, either one
+by one (is_read) or in bulk (under the read watermark, see notifications/unread.py).
+Unread notifications are kept whatever their age.
+
+The table is walked in windows of `batch_size` consecutive IDs, oldest first,
+and each window is deleted in its own short transaction, so no statement
+locks more than one window of rows. IDs grow with created_at, so the walk stops
+at the first window that starts after the cutoff instead of scanning the recent rows.
+"""
+import json
+import time
+
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import Notification
+
+ARCHIVED_FIELDS = ('id', 'recipient_id', 'sender_id', 'post_id', 'comment_id', 'type', 'message', 'is_read', 'created_at')
+
+
+def expired_notifications(cutoff):
+    """
+    Returns the read notifications created before `cutoff`.
+    """
+    read = Q(is_read=True) | Q(pk__lte=F('recipient__notification_state__read_through'))
+    return Notification.objects.filter(read, created_at__lt=cutoff)
+
+
+def purge_read_notifications(cutoff, batch_size=1000, archive=None, pause=0, stdout=None):
+    """
+    Deletes the read notifications created before `cutoff`, `batch_size` IDs at a time.
+    With `archive` (a text file), each deleted notification is first written
+    to it as a line of JSON. Sleeps `pause` seconds between batches to leave
+    room to other writers. Returns the number of notifications deleted.
+    """
+    last_id, total = 0, 0
+    while True:
+        window = list(
+            Notification.objects.filter(pk__gt=last_id).order_by('pk').values_list('pk', 'created_at')[:batch_size]
+        )
+        if not window or window[0][1] >= cutoff:
+            break
+        first_id, last_id = window[0][0], window[-1][0]
+        with transaction.atomic():
+            batch = expired_notifications(cutoff).filter(pk__gte=first_id, pk__lte=last_id)
+            if archive is not None:
+                rows = list(batch.order_by('pk').values(*ARCHIVED_FIELDS))
+                for row in rows:
+                    archive.write(json.dumps(row, default=str) + '\n')
+                deleted, _ = Notification.objects.filter(pk__in=[row['id'] for row in rows]).delete()
+            else:
+                deleted, _ = batch.order_by().delete()
+        total += deleted
+        if stdout is not None:
+            stdout.write(f"Deleted {total} notifications (through ID {last_id})")
+        if pause:
+            time.sleep(pause)
+    return total
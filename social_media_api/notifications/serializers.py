@@ -1,21 +1,61 @@
 # notifications/serializers.py
 from rest_framework import serializers
 from .models import Notification
-from users.serializers import UserPublicSerializer # To display public user info
+from .unread import is_read_for_user
+from users.cards import UserCardField, UserCardListSerializer, UserCardSerializerMixin # Cached public user info
 from posts.serializers import PostSerializer, CommentSerializer # To link related objects in notifications
 
-class NotificationSerializer(serializers.ModelSerializer):
+class ReadStateMixin:
+    """
+    Reports notifications under the recipient's read watermark as read
+    (querysets annotated by notifications.unread.with_read_state).
+    """
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        data['is_read'] = is_read_for_user(instance)
+        return data
+
+
+class NotificationSerializer(ReadStateMixin, UserCardSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Notification model.
     Includes related sender, post, and comment information.
     """
-    recipient = UserPublicSerializer(read_only=True)
-    sender = UserPublicSerializer(read_only=True)
+    recipient = UserCardField(source='recipient_id')
+    sender = UserCardField(source='sender_id')
     post = PostSerializer(read_only=True) # Nested post details
     comment = CommentSerializer(read_only=True) # Nested comment details
 
     class Meta:
         model = Notification
         fields = ['id', 'recipient', 'sender', 'post', 'comment', 'type', 'message', 'is_read', 'created_at']
+        list_serializer_class = UserCardListSerializer
         read_only_fields = ['id', 'recipient', 'sender', 'post', 'comment', 'type', 'message', 'created_at']
 
+
+
+class NotificationListSerializer(ReadStateMixin, UserCardSerializerMixin, serializers.ModelSerializer):
+    """
+    Compact, read-only serializer for notification lists.
+    Related posts and comments are returned as {id, excerpt} references instead
+    of fully nested objects; the excerpts are annotated by the view's queryset.
+    """
+    sender = UserCardField(source='sender_id')
+    post = serializers.SerializerMethodField()
+    comment = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Notification
+        fields = ['id', 'sender', 'post', 'comment', 'type', 'message', 'is_read', 'created_at']
+        read_only_fields = fields
+        list_serializer_class = UserCardListSerializer
+
+    def get_post(self, obj):
+        if obj.post_id is None:
+            return None
+        return {'id': obj.post_id, 'excerpt': obj.post_excerpt}
+
+    def get_comment(self, obj):
+        if obj.comment_id is None:
+            return None
+        return {'id': obj.comment_id, 'excerpt': obj.comment_excerpt}
@@ -0,0 +1,201 @@
+# notifications/stream.py
+"""
+Brokers waking the notification streams (GET /api/notifications/stream/).
+
+A connected stream is a coroutine waiting on the asyncio.Event of its
+Subscription: under ASGI an idle stream holds neither a worker thread nor a
+database connection, so thousands of idle clients only cost memory. When new
+notifications are delivered, the broker wakes the streams of their recipients,
+which then read the new rows (see notifications/async_views.py).
+
+NOTIFICATION_BROKER selects the broker (one instance per process):
+- LocalBroker wakes streams when notifications are delivered in the same
+  process: drain() publishes its recipients once the batch is committed.
+- PollingBroker also picks up notifications delivered by the outbox worker in
+  other processes. While streams are connected, one thread per process looks
+  for new notification IDs every NOTIFICATION_STREAM_POLL_INTERVAL seconds,
+  with a single primary key range query for all connected users.
+
+Notifications can commit out of ID order (a worker's batch commits after a
+later one), so the poller reads from the highest ID it had seen
+NOTIFICATION_STREAM_OVERLAP seconds ago, not from the newest one, and skips
+the IDs it already published.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.db import DatabaseError, connection
+from django.utils.module_loading import import_string
+
+from .models import Notification
+
+POLL_BATCH = 1000 # New notifications read per poll
+
+_brokers = {}
+
+
+class Subscription:
+    """
+    A stream waiting for the notifications of `user_id`, bound to the event loop it was created on.
+    """
+    def __init__(self, user_id):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def notify(self):
+        """
+        Wakes the stream. Safe to call from any thread.
+        """
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            pass # The stream's loop is already closed
+
+    async def wait(self, timeout):
+        """
+        Returns True once woken, or False after `timeout` seconds without a notification.
+        """
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        self.event.clear() # Anything published from now on wakes the next wait()
+        return True
+
+
+class LocalBroker:
+    """
+    Wakes the streams of this process for notifications delivered in this process.
+    """
+    def __init__(self):
+        self._subscriptions = {} # User ID -> set of Subscription
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_id):
+        """
+        Registers a stream for `user_id`; must be called from the stream's event loop.
+        """
+        subscription = Subscription(user_id)
+        with self._lock:
+            self._subscriptions.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id, set())
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                self._subscriptions.pop(subscription.user_id, None)
+
+    def publish(self, user_ids):
+        """
+        Wakes the streams of the given recipients. Safe to call from any thread.
+        """
+        with self._lock:
+            woken = [
+                subscription
+                for user_id in set(user_ids)
+                for subscription in self._subscriptions.get(user_id, ())
+            ]
+        for subscription in woken:
+            subscription.notify()
+
+    def connected(self):
+        """
+        Returns the number of open streams in this process.
+        """
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class PollingBroker(LocalBroker):
+    """
+    LocalBroker that also polls the Notification table for rows delivered by other processes.
+    """
+    def __init__(self):
+        super().__init__()
+        self._poller = None
+        self._watermark = None # Highest notification ID already published
+        self._floors = deque() # (time, watermark) after each poll, back to NOTIFICATION_STREAM_OVERLAP seconds ago
+        self._published = set() # IDs above the oldest floor that were already published
+
+    def subscribe(self, user_id):
+        subscription = super().subscribe(user_id)
+        with self._lock:
+            if self._poller is None:
+                self._poller = threading.Thread(target=self._poll, name='notification-stream-poller', daemon=True)
+                self._poller.start()
+        return subscription
+
+    def _poll(self):
+        """
+        Publishes the recipients of new notifications until no stream is left
+        (the next subscribe() starts a new poller).
+        """
+        try:
+            while True:
+                with self._lock:
+                    if not self._subscriptions:
+                        self._poller = None
+                        return
+                try:
+                    self.poll_once()
+                except DatabaseError:
+                    connection.close() # Reconnect on the next poll
+                time.sleep(settings.NOTIFICATION_STREAM_POLL_INTERVAL)
+        finally:
+            connection.close() # The poller's thread has a connection of its own
+
+    def poll_once(self):
+        """
+        Publishes the recipients of the notifications committed since the last poll,
+        including those numbered below IDs already published.
+        """
+        now = time.monotonic()
+        if self._watermark is None: # First poll: only notifications created from now on
+            self._watermark = Notification.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+            self._floors.append((now, self._watermark))
+            return
+        while len(self._floors) > 1 and self._floors[1][0] <= now - settings.NOTIFICATION_STREAM_OVERLAP:
+            self._floors.popleft()
+        floor = after = self._floors[0][1] # The watermark of about NOTIFICATION_STREAM_OVERLAP seconds ago
+        recipients = []
+        while True:
+            rows = list(
+                Notification.objects.filter(pk__gt=after)
+                .order_by('pk').values_list('pk', 'recipient_id')[:POLL_BATCH]
+            )
+            for pk, recipient_id in rows:
+                if pk not in self._published:
+                    self._published.add(pk)
+                    recipients.append(recipient_id)
+            if len(rows) < POLL_BATCH:
+                break
+            after = rows[-1][0]
+        if rows:
+            self._watermark = max(self._watermark, rows[-1][0])
+        self._floors.append((now, self._watermark))
+        self._published = {pk for pk in self._published if pk > floor} # Never read again
+        if recipients:
+            self.publish(recipients)
+
+
+def get_broker():
+    """
+    Returns the broker configured by NOTIFICATION_BROKER (one instance per broker class).
+    """
+    path = settings.NOTIFICATION_BROKER
+    if path not in _brokers:
+        _brokers[path] = import_string(path)()
+    return _brokers[path]
+
+
+def publish(user_ids):
+    """
+    Wakes the notification streams of the given recipients.
+    """
+    get_broker().publish(user_ids)
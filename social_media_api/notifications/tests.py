@@ -1,3 +1,410 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+from datetime import timedelta
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, connection
+from django.db.models import Q
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from posts.models import Post
+from social_media_api.testing import QueryBudgetTestCase, async_read_views
+from .models import Notification, NotificationOutbox, NotificationState
+from .outbox import drain_all
+from .async_views import read_after, start_position
+from .retention import purge_read_notifications
+from .serializers import NotificationSerializer
+from .unread import mark_all_read, recount_unread, with_read_state
+from .views import NotificationViewSet
+from .stream import PollingBroker, get_broker
+
+
+class NotificationRouteQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Every route in notifications/urls.py must stay within a fixed number of SQL queries,
+    independent of how many notifications, posts or comments are on the page.
+    """
+    def setUp(self):
+        super().setUp()
+        self.notification = Notification.objects.filter(recipient=self.user).first()
+
+    def test_list(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/notifications/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_list_next_page(self):
+        next_url = self.client.get('/api/notifications/').data['next']
+        with self.assertQueryBudget(2):
+            response = self.client.get(next_url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_unread_count(self):
+        self.client.get('/api/notifications/unread_count/') # First read initializes the counter
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/notifications/unread_count/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get(f'/api/notifications/{self.notification.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_partial_update(self):
+        with self.assertQueryBudget(7):
+            response = self.client.patch(f'/api/notifications/{self.notification.pk}/', {'is_read': True})
+        self.assertEqual(response.status_code, 200)
+
+    def test_mark_all_as_read(self):
+        self.client.get('/api/notifications/unread_count/') # Initializes the counter, as the badge does
+        with self.assertQueryBudget(5):
+            response = self.client.patch('/api/notifications/mark_all_as_read/')
+        self.assertEqual(response.status_code, 200)
+        results = self.client.get('/api/notifications/').data['results']
+        self.assertTrue(all(notification['is_read'] for notification in results))
+
+
+class NotificationOutboxTests(QueryBudgetTestCase):
+    """
+    Follow, like and comment notifications go through the outbox and are
+    delivered by the drain worker.
+    """
+    def test_follow_like_and_comment_are_delivered_by_the_worker(self):
+        author = self.users[4]
+        post = Post.objects.filter(user=author).last()
+        Notification.objects.filter(recipient=author).delete()
+
+        self.client.post('/api/follows/', {'following_id': author.pk})
+        self.client.post(f'/api/posts/{post.pk}/like/')
+        self.client.post(f'/api/posts/{post.pk}/comments/', {'content': 'Great post'})
+        self.assertFalse(Notification.objects.filter(recipient=author).exists())
+        self.assertEqual(NotificationOutbox.objects.count(), 3)
+
+        self.assertEqual(drain_all(), (3, 0))
+        self.assertEqual(
+            sorted(Notification.objects.filter(recipient=author, sender=self.user).values_list('type', flat=True)),
+            ['comment', 'follow', 'like'],
+        )
+        self.assertFalse(NotificationOutbox.objects.exists())
+
+    def test_failed_delivery_is_retried_later(self):
+        self.client.post('/api/follows/', {'following_id': self.users[4].pk})
+        with mock.patch.object(Notification, 'save', side_effect=DatabaseError('boom')), \
+                mock.patch.object(Notification.objects, 'bulk_create', side_effect=DatabaseError('boom')):
+            self.assertEqual(drain_all(), (0, 1))
+
+        row = NotificationOutbox.objects.get()
+        self.assertEqual(row.attempts, 1)
+        self.assertEqual(row.last_error, 'boom')
+        self.assertEqual(drain_all(), (0, 0)) # Backoff: not retried immediately
+
+        NotificationOutbox.objects.update(available_at=row.created_at)
+        self.assertEqual(drain_all(), (1, 0))
+
+
+class UnreadCountTests(QueryBudgetTestCase):
+    """
+    The cached unread count follows deliveries, per-item PATCH and mark_all_as_read.
+    """
+    def unread_count(self):
+        return self.client.get('/api/notifications/unread_count/').data['unread_count']
+
+    def test_counter_tracks_reads_and_deliveries(self):
+        unread = Notification.objects.filter(recipient=self.user, is_read=False)
+        self.assertEqual(self.unread_count(), unread.count())
+
+        notification = unread.first()
+        self.client.patch(f'/api/notifications/{notification.pk}/', {'is_read': True})
+        self.assertEqual(self.unread_count(), unread.count())
+        self.client.patch(f'/api/notifications/{notification.pk}/', {'is_read': False})
+        self.assertEqual(self.unread_count(), unread.count())
+
+        self.authenticate(self.users[3])
+        self.client.post('/api/follows/', {'following_id': self.user.pk})
+        drain_all()
+        self.authenticate(self.user)
+        self.assertEqual(self.unread_count(), unread.count())
+
+        self.client.patch('/api/notifications/mark_all_as_read/')
+        self.assertEqual(self.unread_count(), 0)
+        self.assertEqual(NotificationState.objects.get(user=self.user).unread_count, 0)
+
+    def test_concurrent_reads_move_the_counter_once(self):
+        count = self.unread_count()
+        notification = Notification.objects.filter(recipient=self.user, is_read=False).last()
+        # Loaded by a second request before the first one committed
+        stale = NotificationSerializer(
+            with_read_state(Notification.objects.filter(pk=notification.pk), self.user.pk).get(),
+            data={'is_read': True}, partial=True,
+        )
+        stale.is_valid(raise_exception=True)
+        self.client.patch(f'/api/notifications/{notification.pk}/', {'is_read': True})
+        NotificationViewSet().perform_update(stale)
+        self.assertEqual(self.unread_count(), count - 1)
+        self.assertEqual(recount_unread(self.user.pk), count - 1)
+
+    def test_mark_all_as_read_moves_the_watermark(self):
+        unread = Notification.objects.filter(recipient=self.user, is_read=False)
+        self.assertTrue(unread.exists())
+        self.unread_count() # Initializes the counter
+        self.client.patch('/api/notifications/mark_all_as_read/')
+        self.assertTrue(unread.exists()) # Rows are left untouched
+        self.assertEqual(recount_unread(self.user.pk), 0)
+
+        # A notification delivered afterwards is unread
+        self.authenticate(self.users[1])
+        self.client.post('/api/follows/', {'following_id': self.user.pk})
+        drain_all()
+        self.authenticate(self.user)
+        self.assertEqual(self.unread_count(), 1)
+        newest = self.client.get('/api/notifications/').data['results'][0]
+        self.assertEqual((newest['type'], newest['is_read']), ('follow', False))
+
+    def test_mark_all_as_read_without_a_counter_sets_the_flags(self):
+        # No state row for deliveries to lock yet: the committed notifications are flagged instead
+        self.client.patch('/api/notifications/mark_all_as_read/')
+        self.assertFalse(Notification.objects.filter(recipient=self.user, is_read=False).exists())
+        self.assertEqual(NotificationState.objects.get(user=self.user).read_through, 0)
+        self.assertEqual(self.unread_count(), 0)
+
+    def test_mark_all_as_read_without_a_counter_updates_in_batches(self):
+        unread = Notification.objects.filter(recipient=self.user, is_read=False)
+        count = unread.count()
+        self.assertGreater(count, 2)
+        with CaptureQueriesContext(connection) as queries:
+            mark_all_read(self.user.pk, batch_size=2)
+        updates = [query for query in queries if query['sql'].startswith('UPDATE "notifications_notification"')]
+        self.assertEqual(len(updates), (count + 1) // 2)
+        self.assertFalse(unread.exists())
+
+    def test_unread_again_under_the_watermark(self):
+        self.client.patch('/api/notifications/mark_all_as_read/')
+        notification = Notification.objects.filter(recipient=self.user).last()
+        response = self.client.patch(f'/api/notifications/{notification.pk}/', {'is_read': False})
+        self.assertFalse(response.data['is_read'])
+        self.assertEqual(self.unread_count(), 1)
+        self.assertEqual(recount_unread(self.user.pk), 1)
+        read = [item['is_read'] for item in self.client.get('/api/notifications/?page_size=100').data['results']]
+        self.assertEqual(read.count(False), 1)
+
+    def test_list_returns_compact_references(self):
+        item = next(
+            notification for notification in self.client.get('/api/notifications/').data['results']
+            if notification['post']
+        )
+        self.assertEqual(set(item['post']), {'id', 'excerpt'})
+        self.assertEqual(set(item['sender']), {'id', 'username', 'profile_picture'})
+
+
+class NotificationRetentionTests(QueryBudgetTestCase):
+    """
+    purge_notifications deletes old read notifications in batches and keeps unread or recent ones.
+    """
+    def test_purges_old_read_notifications_only(self):
+        now = timezone.now()
+        ids = list(Notification.objects.order_by('pk').values_list('pk', flat=True))
+        old_ids = ids[:len(ids) // 2] # IDs grow with age
+        Notification.objects.update(is_read=False, created_at=now)
+        Notification.objects.filter(pk__in=old_ids).update(created_at=now - timedelta(days=200))
+        read_one_by_one = Notification.objects.filter(recipient=self.user, pk__in=old_ids).order_by('pk')[:2]
+        Notification.objects.filter(pk__in=list(read_one_by_one.values_list('pk', flat=True))).update(is_read=True)
+        mark_all_read(self.users[1].pk) # Read in bulk
+        expected = set(Notification.objects.filter(
+            Q(recipient=self.user, is_read=True) | Q(recipient=self.users[1]), pk__in=old_ids,
+        ).values_list('pk', flat=True))
+        self.assertGreater(len(expected), 2)
+
+        archive = io.StringIO()
+        deleted = purge_read_notifications(now - timedelta(days=90), batch_size=7, archive=archive)
+        self.assertEqual(deleted, len(expected))
+        self.assertEqual({json.loads(line)['id'] for line in archive.getvalue().splitlines()}, expected)
+        self.assertEqual(set(ids) - set(Notification.objects.values_list('pk', flat=True)), expected)
+
+    def test_command(self):
+        Notification.objects.update(is_read=True, created_at=timezone.now() - timedelta(days=30))
+        out = io.StringIO()
+        call_command('purge_notifications', '--days', '60', stdout=out)
+        self.assertTrue(Notification.objects.exists())
+        call_command('purge_notifications', '--days', '7', '--batch-size', '5', stdout=out)
+        self.assertFalse(Notification.objects.exists())
+
+
+@async_read_views
+class AsyncNotificationListTests(QueryBudgetTestCase):
+    """
+    The async notification list returns exactly what NotificationViewSet.list returns.
+    """
+    def test_list(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/notifications/?page_size=4')
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesSync('/api/notifications/?page_size=4')
+        self.assertMatchesSync(response.json()['next'])
+
+    def test_other_methods_use_the_drf_view(self):
+        response = self.client.post('/api/notifications/', {})
+        self.assertEqual(response.status_code, 405)
+
+
+def parse_events(body):
+    """
+    Returns the notification events of a text/event-stream body as (id, data) pairs.
+    """
+    events = []
+    for block in body.decode().split('\n\n'):
+        fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+        if fields.get('event') == 'notification':
+            events.append((int(fields['id']), json.loads(fields['data'])))
+    return events
+
+
+# Stream queries run on the test's own connection, like under async_read_views
+@override_settings(
+    NOTIFICATION_BROKER='notifications.stream.LocalBroker', NOTIFICATION_STREAM_HEARTBEAT=0.2,
+    ASYNC_PARALLEL_QUERIES=False,
+)
+class NotificationStreamTestCase(QueryBudgetTestCase):
+    """
+    Streams use the in-process broker; heartbeats are shortened so idle waits end quickly.
+    """
+    def setUp(self):
+        super().setUp()
+        self.token = self.user.auth_token.key
+        self.ids = list(Notification.objects.filter(recipient=self.user).order_by('pk').values_list('pk', flat=True))
+
+    def deliver_follow(self, sender):
+        """
+        Has `sender` follow the test user, then delivers the notification like the worker does.
+        """
+        self.authenticate(sender)
+        self.client.post('/api/follows/', {'following_id': self.user.pk})
+        self.authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            drain_all()
+
+
+class NotificationStreamTests(NotificationStreamTestCase):
+    """
+    The WSGI URLconf answers GET /api/notifications/stream/ as a long poll.
+    """
+    def test_long_poll_resumes_after_last_event_id(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/notifications/stream/', HTTP_LAST_EVENT_ID=str(self.ids[-3]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = parse_events(response.content)
+        self.assertEqual([event_id for event_id, _ in events], self.ids[-2:])
+        listed = {item['id']: item for item in self.client.get('/api/notifications/').json()['results']}
+        self.assertEqual([data for _, data in events], [listed[event_id] for event_id in self.ids[-2:]])
+
+    def test_long_poll_without_new_notifications_ends_after_a_heartbeat(self):
+        with self.assertQueryBudget(4): # Looks again once the heartbeat interval is over
+            response = self.client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'retry: 3000\n\n')
+        self.assertEqual(get_broker().connected(), 0)
+
+    def test_stream_requires_authentication(self):
+        self.client.credentials()
+        response = self.client.get('/api/notifications/stream/')
+        self.assertEqual(response.status_code, 401)
+        self.assertEqual(response['WWW-Authenticate'], 'Token')
+
+    def commit_late(self, notifications):
+        """
+        Makes `notifications` invisible until the returned function "commits" them again,
+        like rows of a transaction that commits after rows numbered above them.
+        """
+        rows = [Notification.objects.get(pk=notification.pk) for notification in notifications]
+        Notification.objects.filter(pk__in=[row.pk for row in rows]).delete()
+        return lambda: Notification.objects.bulk_create(rows)
+
+    def new_notifications(self, count):
+        return [
+            Notification.objects.create(recipient=self.user, sender=self.users[1], type='follow', message=f"Late {i}")
+            for i in range(count)
+        ]
+
+    def test_polling_broker_publishes_recipients_of_new_rows(self):
+        broker = PollingBroker()
+        broker.poll_once() # Starts from the newest existing notification
+        self.deliver_follow(self.users[1])
+        with mock.patch.object(broker, 'publish') as publish:
+            broker.poll_once()
+        self.assertEqual(list(publish.call_args.args[0]), [self.user.pk])
+
+    def test_polling_broker_picks_up_rows_that_commit_late(self):
+        broker = PollingBroker()
+        broker.poll_once()
+        late, newer = self.new_notifications(2)
+        commit = self.commit_late([late])
+        with mock.patch.object(broker, 'publish') as publish:
+            broker.poll_once() # Sees the newer row only
+            commit()
+            broker.poll_once()
+            broker.poll_once() # Nothing new
+        self.assertEqual([list(call.args[0]) for call in publish.call_args_list], [[self.user.pk], [self.user.pk]])
+
+    def test_stream_reads_pick_up_rows_that_commit_late(self):
+        request = Request(APIRequestFactory().get('/api/notifications/stream/'))
+        request.user = self.user
+        position = start_position(self.user, None)
+        late, newer = self.new_notifications(2)
+        commit = self.commit_late([late])
+
+        def read():
+            batch = read_after(request, position)
+            for notification, created_at in batch:
+                position.advance(created_at, notification['id'])
+            return [notification['id'] for notification, _ in batch]
+
+        self.assertEqual(read(), [newer.pk])
+        commit()
+        self.assertEqual(read(), [late.pk])
+        self.assertEqual(read(), [])
+
+
+@async_read_views
+class AsyncNotificationStreamTests(NotificationStreamTestCase):
+    """
+    Under the ASGI URLconf the stream stays open and pushes each delivered notification.
+    """
+    async def open_stream(self, **headers):
+        response = await self.async_client.get(
+            '/api/notifications/stream/', headers={'Authorization': f'Token {self.token}', **headers},
+        )
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response.streaming_content
+
+    async def test_stream_pushes_delivered_notifications(self):
+        events = await self.open_stream()
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+        self.assertEqual(await asyncio.wait_for(anext(events), 5), b': keep-alive\n\n')
+
+        await sync_to_async(self.deliver_follow)(self.users[1])
+        ((_, data),) = parse_events(await asyncio.wait_for(anext(events), 5))
+        self.assertEqual((data['type'], data['sender']['id']), ('follow', self.users[1].pk))
+        await events.aclose()
+
+    async def test_stream_looks_again_after_a_missed_wakeup(self):
+        events = await self.open_stream()
+        self.assertEqual(await anext(events), b'retry: 3000\n\n')
+        await sync_to_async(self.authenticate)(self.users[1])
+        await sync_to_async(self.client.post)('/api/follows/', {'following_id': self.user.pk})
+        await sync_to_async(drain_all)() # Never published: on_commit callbacks do not run in this test
+        ((_, data),) = parse_events(await asyncio.wait_for(anext(events), 5))
+        self.assertEqual((data['type'], data['sender']['id']), ('follow', self.users[1].pk))
+        await events.aclose()
+
+    async def test_stream_resumes_after_last_event_id(self):
+        events = await self.open_stream(**{'Last-Event-ID': str(self.ids[-3])})
+        chunks = [await asyncio.wait_for(anext(events), 5) for _ in range(3)] # retry, then two events
+        await events.aclose()
+        self.assertEqual([event_id for event_id, _ in parse_events(b''.join(chunks))], self.ids[-2:])
@@ -0,0 +1,164 @@
+# notifications/unread.py
+"""
+Maintenance of NotificationState.unread_count and of the read watermark.
+
+Only users that already have a NotificationState row are adjusted on writes.
+The row is created lazily the first time the count is read, from a COUNT over
+the user's unread notifications, so it also covers notifications created
+before the counter existed.
+
+mark_all_read() does not touch the user's notifications: it moves the read
+watermark (NotificationState.read_through) to their newest notification, so
+its cost does not depend on the size of the backlog. A notification is read
+when its is_read flag is set or its ID is at or below the watermark.
+Deliveries lock their recipients' NotificationState rows before inserting
+(see lock_read_states()), and mark_all_read() reads the newest notification
+under the same lock. So no delivery of the user's is in flight at that point,
+and a notification committed later always gets an ID above the watermark.
+Before the user has a row there is nothing to lock, so the first
+mark_all_read() sets the flags of the committed notifications, in batches.
+"""
+from django.db import transaction
+from django.db.models import Subquery
+
+from posts.counters import add_clamped, adjust_by_occurrence
+from .models import Notification, NotificationState
+
+
+def increment_unread(recipient_ids):
+    """
+    Adds one unread notification per occurrence of a user ID in `recipient_ids`.
+    """
+    adjust_by_occurrence(recipient_ids, adjust_unread, 1)
+
+
+def adjust_unread(user_ids, delta):
+    """
+    Adds `delta` (positive or negative) to the unread count of one or more users without going below zero.
+    """
+    if not isinstance(user_ids, (list, tuple, set)):
+        user_ids = [user_ids]
+    NotificationState.objects.filter(user_id__in=user_ids).update(unread_count=add_clamped('unread_count', delta))
+
+
+def delete_notifications(queryset):
+    """
+    Deletes the notifications of `queryset` and takes the unread ones off
+    their recipients' counts. Returns the number of notifications deleted.
+    """
+    rows = list(queryset.values_list('pk', 'recipient_id', 'is_read', 'recipient__notification_state__read_through'))
+    if not rows:
+        return 0
+    deleted, _ = Notification.objects.filter(pk__in=[row[0] for row in rows]).delete()
+    unread = [
+        recipient_id for pk, recipient_id, is_read, read_through in rows if not is_read and pk > (read_through or 0)
+    ]
+    adjust_by_occurrence(unread, adjust_unread, -1)
+    return deleted
+
+
+def mark_all_read(user_id, batch_size=1000):
+    """
+    Marks all of a user's notifications as read by moving the read watermark
+    to the newest one, and sets the unread count to zero. One UPDATE, whatever
+    the backlog, once the user has a NotificationState row.
+    """
+    with transaction.atomic():
+        read_through = lock_read_states([user_id]).get(user_id)
+        if read_through is not None:
+            newest = Notification.objects.filter(recipient_id=user_id).order_by('-pk').values_list('pk', flat=True).first()
+            NotificationState.objects.filter(user_id=user_id).update(
+                unread_count=0, read_through=max(newest or 0, read_through), # Retention may have deleted the newest
+            )
+            return
+    # No row to lock deliveries out with (first use): flag the committed
+    # notifications instead, so one still in flight stays unread
+    _set_read_in_batches(Notification.objects.filter(recipient_id=user_id, is_read=False), batch_size)
+    NotificationState.objects.bulk_create([NotificationState(user_id=user_id)], ignore_conflicts=True)
+
+
+def lock_read_states(user_ids):
+    """
+    Locks the NotificationState rows of the given users until the end of the
+    transaction (in user ID order, so lockers never deadlock) and returns
+    {user_id: read_through} for those that have one. Read state changes and
+    deliveries take these locks first, so they apply one at a time per user.
+    """
+    return dict(
+        NotificationState.objects.select_for_update().filter(user_id__in=user_ids)
+        .order_by('user_id').values_list('user_id', 'read_through')
+    )
+
+
+def get_read_through(user_id):
+    """
+    Returns a user's read watermark (0 when nothing was marked read in bulk).
+    """
+    return NotificationState.objects.filter(user_id=user_id).values_list('read_through', flat=True).first() or 0
+
+
+def with_read_state(queryset, user_id):
+    """
+    Annotates each notification of `queryset` with the watermark of `user_id`
+    (in the same query), for is_read_for_user().
+    """
+    watermark = NotificationState.objects.filter(user_id=user_id).values('read_through')[:1]
+    return queryset.annotate(read_through=Subquery(watermark))
+
+
+def is_read_for_user(notification):
+    """
+    Returns whether a notification annotated by with_read_state() is read.
+    """
+    return notification.is_read or notification.pk <= (getattr(notification, 'read_through', None) or 0)
+
+
+def fold_read_watermark(user_id, batch_size=1000):
+    """
+    Sets is_read on the notifications under a user's watermark, in batches of
+    `batch_size` rows, then clears the watermark. Needed before one of them is
+    marked unread again. Returns the number of notifications updated.
+    """
+    read_through = get_read_through(user_id)
+    if not read_through:
+        return 0
+    pending = Notification.objects.filter(recipient_id=user_id, is_read=False, pk__lte=read_through)
+    total = _set_read_in_batches(pending, batch_size)
+    # Unless mark_all_read() moved it meanwhile
+    NotificationState.objects.filter(user_id=user_id, read_through=read_through).update(read_through=0)
+    return total
+
+
+def _set_read_in_batches(pending, batch_size):
+    """
+    Sets is_read on the notifications of `pending` (unread ones) `batch_size`
+    rows per UPDATE, so no statement holds locks on a whole backlog.
+    Returns the number updated.
+    """
+    total = 0
+    while True:
+        ids = list(pending.order_by().values_list('pk', flat=True)[:batch_size])
+        if not ids:
+            return total
+        total += Notification.objects.filter(pk__in=ids).update(is_read=True)
+
+
+def recount_unread(user_id):
+    """
+    Recomputes a user's unread count from the Notification table and stores it.
+    """
+    count = Notification.objects.filter(
+        recipient_id=user_id, is_read=False, pk__gt=get_read_through(user_id),
+    ).count()
+    NotificationState.objects.update_or_create(user_id=user_id, defaults={'unread_count': count})
+    return count
+
+
+def get_unread_count(user_id):
+    """
+    Returns a user's unread count, initializing the counter on first use.
+    """
+    count = NotificationState.objects.filter(user_id=user_id).values_list('unread_count', flat=True).first()
+    if count is None:
+        count = recount_unread(user_id)
+    return count
@@ -2,8 +2,20 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
 from .views import NotificationViewSet
+from .async_views import list_notifications, stream_notifications
+from social_media_api.asyncapi import read_view
 
 router = DefaultRouter()
 router.register(r'', NotificationViewSet, basename='notifications')
 
-urlpatterns = router.urls
+urlpatterns = [
+    # Before the router, whose detail route would take 'stream' for a notification ID.
+    # A worker thread per endless stream would not scale under WSGI: answer as a long poll there
+    path('stream/', stream_notifications, {'long_poll': True}),
+] + router.urls
+
+# Async read views, mounted in front of the routes above by the ASGI application (social_media_api/asgi_urls.py)
+async_urlpatterns = [
+    path('', read_view(list_notifications, NotificationViewSet.as_view({'get': 'list'}))),
+    path('stream/', stream_notifications), # Server-Sent Events: idle streams only wait on the event loop
+]
@@ -1,12 +1,39 @@
 from django.shortcuts import render
 # notifications/views.py
+from django.db import transaction
+from django.db.models.functions import Substr
 from rest_framework import viewsets, mixins, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.decorators import action
 
+from social_media_api.pagination import KeysetPagination
 from .models import Notification
-from .serializers import NotificationSerializer
+from .serializers import NotificationSerializer, NotificationListSerializer
+from .unread import (
+    adjust_unread, fold_read_watermark, get_unread_count, lock_read_states, mark_all_read, with_read_state,
+)
+
+EXCERPT_LENGTH = 80 # Characters of post/comment content shown in notification lists
+
+
+def list_queryset(user):
+    """
+    Returns the notifications of `user` as listed by NotificationListSerializer.
+    Only short excerpts of the post/comment are needed; the sender comes from the user-card cache.
+    """
+    queryset = Notification.objects.filter(recipient=user).annotate(
+        post_excerpt=Substr('post__content', 1, EXCERPT_LENGTH),
+        comment_excerpt=Substr('comment__content', 1, EXCERPT_LENGTH),
+    )
+    return with_read_state(queryset, user.pk)
+
+
+class NotificationPagination(KeysetPagination):
+    """
+    Cursor pagination over (created_at, id), newest first.
+    """
+    ordering_field = 'created_at'
 
 class NotificationViewSet(
     mixins.ListModelMixin, # Allows GET (list notifications)
@@ -16,27 +43,70 @@ class NotificationViewSet(
 ):
     """
     API endpoints for managing user notifications.
-    - List (GET /api/notifications/): Lists notifications for the authenticated user.
+    - List (GET /api/notifications/): Lists notifications for the authenticated user (compact form).
     - Retrieve (GET /api/notifications/<id>/): Retrieves a specific notification.
     - Update (PATCH /api/notifications/<id>/): Marks a notification as read.
+    - Unread count (GET /api/notifications/unread_count/): Number of unread notifications.
     """
     serializer_class = NotificationSerializer
     permission_classes = [IsAuthenticated] # Only authenticated users can access their notifications
+    pagination_class = NotificationPagination
     lookup_field = 'pk'
 
+    def get_serializer_class(self):
+        """
+        Lists use the compact serializer; single notifications keep the fully nested one.
+        """
+        if self.action == 'list':
+            return NotificationListSerializer
+        return NotificationSerializer
+
     def get_queryset(self):
         """
         Ensures users can only see their own notifications.
         """
-        return Notification.objects.filter(recipient=self.request.user)
+        if self.action == 'list':
+            return list_queryset(self.request.user)
+        queryset = Notification.objects.filter(recipient=self.request.user)
+        queryset = queryset.select_related('post', 'comment') # Nested objects are serialized, so load them in the same query
+        return with_read_state(queryset, self.request.user.pk)
+
+    def perform_update(self, serializer):
+        """
+        Sets is_read with a conditional UPDATE on its previous value and keeps the
+        cached unread count in step: of concurrent requests making the same
+        change, only the one that changed the row moves the count.
+        """
+        instance = serializer.instance
+        is_read = serializer.validated_data.get('is_read')
+        if is_read is None:
+            return
+        user_id = instance.recipient_id
+        with transaction.atomic():
+            read_through = lock_read_states([user_id]).get(user_id, 0) # Waits for mark_all_read and deliveries
+            if not is_read and instance.pk <= read_through:
+                # Read through the watermark only: set the flags under it so this one can be unread alone
+                fold_read_watermark(user_id)
+                read_through = 0
+            changed = Notification.objects.filter(pk=instance.pk, is_read=not is_read).update(is_read=is_read)
+            if changed and instance.pk > read_through: # Under the watermark it was read either way
+                adjust_unread(user_id, -1 if is_read else 1)
+        instance.is_read, instance.read_through = is_read, read_through
+
+    @action(detail=False, methods=['get'])
+    def unread_count(self, request):
+        """
+        Returns the number of unread notifications for the authenticated user.
+        """
+        return Response({"unread_count": get_unread_count(request.user.pk)}, status=status.HTTP_200_OK)
 
     @action(detail=False, methods=['patch'])
     def mark_all_as_read(self, request):
         """
-        Marks all unread notifications for the authenticated user as read.
+        Marks all notifications of the authenticated user as read. Only the read
+        watermark moves (see notifications/unread.py), so the cost is the same for any backlog.
         """
-        unread_notifications = self.get_queryset().filter(is_read=False)
-        unread_notifications.update(is_read=True)
+        mark_all_read(request.user.pk)
         return Response({"message": "All notifications marked as read."}, status=status.HTTP_200_OK)
 
 
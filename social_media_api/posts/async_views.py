@@ -0,0 +1,40 @@
+# posts/async_views.py
+"""
+Async read views of the posts app, served by the ASGI application (see social_media_api/asyncapi.py).
+"""
+from asgiref.sync import sync_to_async
+from rest_framework.exceptions import NotFound
+
+from social_media_api.asyncapi import async_api_view, gather_queries, json_response, serialize
+from social_media_api.conditional import is_conditional, not_modified, add_validators
+from .engagement import combine_engagement, engagement_queries
+from .models import Post
+from .serializers import PostSerializer, wants_engagement
+from .views import post_validators
+
+
+@async_api_view(login_required=False)
+async def retrieve_post(request, pk):
+    """
+    Async counterpart of PostViewSet.retrieve. With `?include=engagement`, the
+    post row, the viewer's like and comment and the recent likers are loaded concurrently.
+    """
+    if is_conditional(request):
+        version = await Post.objects.filter(pk=pk).values_list('changed_at', 'user_id').afirst()
+        if version is not None:
+            response = not_modified(request, *await sync_to_async(post_validators)(request, pk, *version))
+            if response is not None:
+                return response
+
+    queries = [lambda: Post.objects.filter(pk=pk).first()]
+    if wants_engagement(request):
+        queries += engagement_queries(request.user, [pk])
+    post, *engagement = await gather_queries(*queries)
+    if post is None:
+        raise NotFound("No Post matches the given query.")
+
+    context = {'request': request}
+    if engagement:
+        context['post_engagement'] = combine_engagement([pk], *engagement)
+    response = json_response(await serialize(PostSerializer(post, context=context)))
+    return add_validators(response, *await sync_to_async(post_validators)(request, post.pk, post.changed_at, post.user_id))
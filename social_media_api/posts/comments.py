@@ -0,0 +1,93 @@
+# posts/comments.py
+"""
+Comment threads.
+
+A top-level comment starts a thread. A reply points at the comment it answers
+(parent) and at the top-level comment of its thread (thread), and records its
+depth under it, so that:
+- the top-level comments of a post are one (post, thread IS NULL, created_at)
+  index range, however many replies the post has;
+- the replies of a thread, at any depth, are one (thread, created_at) index
+  range, returned oldest first with parent and depth for clients to nest them;
+- every top-level comment carries replies_count, the size of its thread,
+  updated in the reply's transaction like Post.comments_count.
+"""
+from django.conf import settings
+from rest_framework.exceptions import ValidationError
+
+from notifications.models import Notification
+from notifications.unread import delete_notifications
+from .counters import add_clamped, adjust_by_occurrence, adjust_counter
+from .models import Comment
+
+
+def reply_fields(post, parent):
+    """
+    Returns the thread fields of a new comment on `post` answering `parent` (None for a top-level comment).
+    """
+    if parent is None:
+        return {}
+    if parent.post_id != post.pk:
+        raise ValidationError({'parent': "Not a comment on this post."})
+    if parent.depth >= settings.COMMENT_MAX_DEPTH:
+        raise ValidationError({'parent': f"Replies nest at most {settings.COMMENT_MAX_DEPTH} levels deep."})
+    return {'parent': parent, 'thread_id': parent.thread_id or parent.pk, 'depth': parent.depth + 1}
+
+
+def adjust_replies(thread_ids, delta):
+    """
+    Atomically adds `delta` to replies_count of the given top-level comments with a single UPDATE.
+    The counter never goes below zero.
+    """
+    if not isinstance(thread_ids, (list, tuple, set)):
+        thread_ids = [thread_ids]
+    return Comment.objects.filter(pk__in=thread_ids).update(replies_count=add_clamped('replies_count', delta))
+
+
+def comment_tree(comment_ids):
+    """
+    Returns (id, post_id, thread_id) of the given comments and of every reply under them.
+    Threads of top-level comments are read in one query, replies under replies level by level.
+    Every comment is returned once, even when `comment_ids` holds both a comment and replies under it.
+    """
+    fields = ('pk', 'post_id', 'thread_id')
+    rows = list(Comment.objects.filter(pk__in=comment_ids).order_by().values_list(*fields))
+    seen = {pk for pk, _, _ in rows}
+    # Whatever their replies_count says: a drifted counter must not leave replies off the post's count
+    threads = {pk for pk, _, thread_id in rows if thread_id is None}
+    if threads:
+        replies = [row for row in Comment.objects.filter(thread_id__in=threads).order_by().values_list(*fields) if row[0] not in seen]
+        rows += replies
+        seen.update(pk for pk, _, _ in replies)
+    parents = [pk for pk, _, thread_id in rows if thread_id is not None and thread_id not in threads]
+    while parents: # At most COMMENT_MAX_DEPTH levels
+        replies = [
+            row for row in Comment.objects.filter(parent_id__in=parents).order_by().values_list(*fields)
+            if row[0] not in seen
+        ]
+        rows += replies
+        seen.update(pk for pk, _, _ in replies)
+        parents = [pk for pk, _, _ in replies]
+    return rows
+
+
+def delete_comments(comment_ids):
+    """
+    Deletes comments with every reply under them and their notifications (off
+    their recipients' unread counts), and takes them off their posts'
+    comments_count and their threads' replies_count. Returns the number of comments deleted.
+    """
+    rows = comment_tree(comment_ids)
+    if not rows:
+        return 0
+    ids = [pk for pk, _, _ in rows]
+    delete_notifications(Notification.objects.filter(comment_id__in=ids))
+    _, deleted = Comment.objects.filter(pk__in=ids).delete() # Their outbox rows cascade
+    deleted_ids = set(ids)
+    adjust_by_occurrence(
+        [post_id for _, post_id, _ in rows], lambda post_ids, delta: adjust_counter(post_ids, 'comments_count', delta), -1,
+    )
+    adjust_by_occurrence(
+        [thread_id for _, _, thread_id in rows if thread_id is not None and thread_id not in deleted_ids], adjust_replies, -1,
+    )
+    return deleted.get(Comment._meta.label, 0)
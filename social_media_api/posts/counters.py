@@ -0,0 +1,84 @@
+# posts/counters.py
+"""
+Helpers for the denormalized likes_count / comments_count columns on Post
+(and recounting Comment.replies_count, see posts/comments.py). add_clamped()
+and adjust_by_occurrence() also serve the other denormalized counters
+(Comment.replies_count, NotificationState.unread_count).
+"""
+from collections import Counter
+
+from django.db.models import Case, Count, F, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce, Now
+
+from .models import Post, Like, Comment
+
+COUNTERS = {
+    'likes_count': Like,
+    'comments_count': Comment,
+}
+
+
+def adjust_counter(post_ids, field, delta):
+    """
+    Atomically adds `delta` to a counter of the given posts with a single UPDATE.
+    The counter never goes below zero. changed_at is bumped so cached copies are revalidated.
+    """
+    if not isinstance(post_ids, (list, tuple, set)):
+        post_ids = [post_ids]
+    return Post.objects.filter(pk__in=post_ids).update(**{field: add_clamped(field, delta), 'changed_at': Now()})
+
+
+def add_clamped(field, delta):
+    """
+    Returns the expression of the counter column `field` plus `delta`, which never goes below zero.
+    """
+    value = F(field) + delta
+    if delta < 0:
+        # The counter columns are unsigned on MySQL, so only subtract where the result stays >= 0
+        value = Case(When(**{f'{field}__gte': -delta}, then=value), default=Value(0))
+    return value
+
+
+def adjust_by_occurrence(ids, adjust, step):
+    """
+    Adds `step` to the counter of each ID once per occurrence in `ids` with
+    `adjust(ids, delta)`, running one UPDATE per distinct count, not per ID.
+    """
+    by_count = {}
+    for pk, count in Counter(ids).items():
+        by_count.setdefault(count, []).append(pk)
+    for count, same_count_ids in by_count.items():
+        adjust(same_count_ids, step * count)
+
+
+def recount_counters(queryset):
+    """
+    Recomputes every counter of the posts in `queryset` from the Like and Comment tables
+    with one UPDATE ... SET counter = (SELECT COUNT(*) ...) statement.
+    """
+    values = {}
+    for field, model in COUNTERS.items():
+        counts = (
+            model.objects.filter(post=OuterRef('pk'))
+            .order_by()
+            .values('post')
+            .annotate(total=Count('pk'))
+            .values('total')
+        )
+        values[field] = Coalesce(Subquery(counts), Value(0))
+    return queryset.update(**values, changed_at=Now())
+
+
+def recount_replies(queryset):
+    """
+    Recomputes replies_count of the top-level comments in `queryset` from their
+    threads with one UPDATE ... SET replies_count = (SELECT COUNT(*) ...) statement.
+    """
+    counts = (
+        Comment.objects.filter(thread=OuterRef('pk'))
+        .order_by()
+        .values('thread')
+        .annotate(total=Count('pk'))
+        .values('total')
+    )
+    return queryset.filter(thread__isnull=True).update(replies_count=Coalesce(Subquery(counts), Value(0)))
@@ -0,0 +1,81 @@
+# posts/engagement.py
+"""
+Viewer engagement of a page of posts: whether the current user liked or
+commented on each post, and the most recent likers ("facepile").
+
+Everything is loaded for the whole page at once, with one query per
+attribute, so the cost of a page does not depend on its number of posts.
+"""
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+
+from .models import Like, Comment
+
+FACEPILE_SIZE = 3
+
+
+def viewer_post_ids(model, user, post_ids):
+    """
+    Returns the IDs of the posts among `post_ids` that `user` has a `model` (Like or Comment) row on.
+    Anonymous users get an empty set without querying.
+    """
+    if user is None or not user.is_authenticated:
+        return set()
+    return set(model.objects.filter(user=user, post_id__in=post_ids).order_by().values_list('post_id', flat=True).distinct())
+
+
+def recent_likers(post_ids, size=FACEPILE_SIZE):
+    """
+    Returns {post_id: [user_id, ...]} with the `size` most recent likers of every post,
+    using a single ROW_NUMBER() window query.
+    """
+    ranked = (
+        Like.objects.filter(post_id__in=post_ids)
+        .annotate(rank=Window(RowNumber(), partition_by=F('post_id'), order_by=[F('created_at').desc(), F('id').desc()]))
+        .filter(rank__lte=size)
+        .order_by('post_id', 'rank')
+        .values_list('post_id', 'user_id')
+    )
+    likers = {post_id: [] for post_id in post_ids}
+    for post_id, user_id in ranked:
+        likers[post_id].append(user_id)
+    return likers
+
+
+def load_engagement(user, post_ids):
+    """
+    Returns {post_id: {'liked_by_me', 'commented_by_me', 'liker_ids'}} for the given posts.
+    Anonymous users get False for both flags without querying.
+    """
+    post_ids = list(post_ids)
+    if not post_ids:
+        return {}
+    return combine_engagement(
+        post_ids, viewer_post_ids(Like, user, post_ids), viewer_post_ids(Comment, user, post_ids), recent_likers(post_ids),
+    )
+
+
+def combine_engagement(post_ids, liked, commented, likers):
+    """
+    Builds the load_engagement() result from its parts, which callers may load concurrently.
+    """
+    return {
+        post_id: {
+            'liked_by_me': post_id in liked,
+            'commented_by_me': post_id in commented,
+            'liker_ids': likers[post_id],
+        }
+        for post_id in post_ids
+    }
+
+
+def engagement_queries(user, post_ids):
+    """
+    Returns the three independent queries of load_engagement() as callables
+    (liked, commented, likers), so async views can run them concurrently.
+    """
+    return (
+        lambda: viewer_post_ids(Like, user, post_ids),
+        lambda: viewer_post_ids(Comment, user, post_ids),
+        lambda: recent_likers(post_ids),
+    )
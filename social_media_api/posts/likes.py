@@ -0,0 +1,79 @@
+# posts/likes.py
+"""
+Idempotent like / unlike of one or many posts.
+
+Both operations lock the target Post rows (in primary-key order, so two
+batches cannot deadlock) for the duration of the transaction. Concurrent
+requests for the same post are therefore serialized on the row whose
+likes_count they update anyway, and the "already liked?" check cannot race:
+liking twice is a no-op instead of an IntegrityError, and the counter moves
+exactly once. The bulk insert still ignores conflicts as a second line of
+defence.
+"""
+from django.db import transaction
+
+from notifications.outbox import enqueue_many as enqueue_notifications
+from .counters import adjust_counter
+from .models import Post, Like
+
+MAX_BATCH_SIZE = 100
+
+
+def _lock_posts(post_ids):
+    """
+    Locks the existing posts among `post_ids`. Returns {post_id: (author_id, likes_count)}.
+    """
+    rows = (
+        Post.objects.select_for_update()
+        .filter(pk__in=post_ids)
+        .order_by('pk')
+        .values_list('pk', 'user_id', 'likes_count')
+    )
+    return {pk: (author_id, likes_count) for pk, author_id, likes_count in rows}
+
+
+def _liked_post_ids(user, post_ids):
+    return set(Like.objects.filter(user=user, post_id__in=post_ids).order_by().values_list('post_id', flat=True))
+
+
+def set_likes(user, like=(), unlike=()):
+    """
+    Likes the posts in `like` and unlikes the posts in `unlike` for `user`, in one transaction.
+
+    Liking an already liked post (or unliking a post that is not liked) changes nothing.
+    Returns ({post_id: {'liked': bool, 'likes_count': int}}, missing_post_ids).
+    """
+    like, unlike = set(like), set(unlike)
+    requested = like | unlike
+    if not requested:
+        return {}, []
+
+    with transaction.atomic():
+        posts = _lock_posts(requested)
+        liked = _liked_post_ids(user, posts.keys())
+
+        to_like = sorted((like & posts.keys()) - liked)
+        to_unlike = sorted(unlike & liked)
+        if to_like:
+            Like.objects.bulk_create([Like(user=user, post_id=post_id) for post_id in to_like], ignore_conflicts=True)
+            adjust_counter(to_like, 'likes_count', 1)
+            enqueue_notifications([
+                {
+                    'recipient_id': posts[post_id][0], 'sender': user, 'post_id': post_id,
+                    'type': 'like', 'message': f"{user.username} liked your post.",
+                }
+                for post_id in to_like if posts[post_id][0] != user.pk # No notification for liking your own post
+            ])
+        if to_unlike:
+            Like.objects.filter(user=user, post_id__in=to_unlike).delete()
+            adjust_counter(to_unlike, 'likes_count', -1)
+
+    liked = (liked | set(to_like)) - set(to_unlike)
+    state = {}
+    for post_id, (_, likes_count) in posts.items():
+        if post_id in to_like:
+            likes_count += 1
+        elif post_id in to_unlike:
+            likes_count = max(likes_count - 1, 0)
+        state[post_id] = {'liked': post_id in liked, 'likes_count': likes_count}
+    return state, sorted(requested - posts.keys())
@@ -0,0 +1,27 @@
+# posts/management/commands/recount_post_counters.py
+from django.core.management.base import BaseCommand
+from django.db.models import Max
+
+from posts.counters import recount_counters, recount_replies
+from posts.models import Comment, Post
+
+
+class Command(BaseCommand):
+    """
+    Recomputes the denormalized likes_count and comments_count columns of every post,
+    and replies_count of their top-level comments. Posts are processed in primary key ranges so each UPDATE stays small.
+    """
+    help = "Recomputes Post.likes_count, Post.comments_count and Comment.replies_count from the Like and Comment tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help="Number of post IDs per UPDATE.")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        max_id = Post.objects.aggregate(max_id=Max('id'))['max_id'] or 0
+
+        updated = 0
+        for start in range(0, max_id + 1, batch_size):
+            updated += recount_counters(Post.objects.filter(id__gte=start, id__lt=start + batch_size))
+            recount_replies(Comment.objects.filter(post_id__gte=start, post_id__lt=start + batch_size))
+        self.stdout.write(self.style.SUCCESS(f"Recounted counters for {updated} posts."))
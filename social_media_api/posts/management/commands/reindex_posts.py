@@ -0,0 +1,29 @@
+# posts/management/commands/reindex_posts.py
+from django.core.management.base import BaseCommand
+
+from posts.models import Post
+from posts.search import get_search_backend
+
+
+class Command(BaseCommand):
+    """
+    Rebuilds the post search index with the configured backend.
+    """
+    help = "Indexes every post with the POST_SEARCH_BACKEND search backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help="Posts loaded per query.")
+
+    def handle(self, *args, **options):
+        backend = get_search_backend()
+        total = 0
+        batch = []
+        for post in Post.objects.order_by('id').iterator(chunk_size=options['batch_size']):
+            batch.append(post)
+            if len(batch) == options['batch_size']:
+                backend.index_posts(batch)
+                total += len(batch)
+                batch = []
+        backend.index_posts(batch)
+        total += len(batch)
+        self.stdout.write(self.style.SUCCESS(f"Indexed {total} posts."))
@@ -0,0 +1,20 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:13
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0001_initial'),
+        ('posts', '0005_postterm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='media_asset',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='assets.mediaasset'),
+        ),
+    ]
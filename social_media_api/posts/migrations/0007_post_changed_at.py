@@ -0,0 +1,24 @@
+# Generated by Django 5.2.5 on 2026-10-18 03:16
+
+from django.db import migrations, models
+
+
+def copy_updated_at(apps, schema_editor):
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.update(changed_at=models.F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0006_post_media_asset'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='changed_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(copy_updated_at, migrations.RunPython.noop),
+    ]
@@ -10,11 +10,23 @@ class Post(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='posts')
     content = models.TextField()
     media = models.ImageField(upload_to='post_media/', blank=True, null=True, help_text="Optional media file (image/video).")
+    # Deduplicated upload behind `media`, with its resized variants (see assets/)
+    media_asset = models.ForeignKey('assets.MediaAsset', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     timestamp = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True) # To track when a post was last updated
+    # Last change to anything in the post's API payload (edits, counters, media variants); drives the ETag
+    changed_at = models.DateTimeField(auto_now=True)
+    # Denormalized counters, kept up to date by posts/counters.py (recount_post_counters repairs drift)
+    likes_count = models.PositiveIntegerField(default=0)
+    comments_count = models.PositiveIntegerField(default=0)
 
     class Meta:
         ordering = ['-timestamp'] # Order posts by most recent first
+        indexes = [
+            # Keyset pagination scans (timestamp, id) for the post list and (user, timestamp, id) for timelines
+            models.Index(fields=['-timestamp', '-id'], name='post_ts_id_idx'),
+            models.Index(fields=['user', '-timestamp', '-id'], name='post_user_ts_id_idx'),
+        ]
 
     def __str__(self):
         return f"Post by {self.user.username} at {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
@@ -32,6 +44,10 @@ class Like(models.Model):
         # Ensures a user can like a post only once
         unique_together = ('user', 'post')
         ordering = ['-created_at'] # Most recent likes first
+        indexes = [
+            # Most recent likers of a post (facepiles)
+            models.Index(fields=['post', '-created_at', '-id'], name='like_post_created_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username} likes {self.post.id}"
@@ -43,13 +59,48 @@ class Comment(models.Model):
     """
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='comments')
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
+    # Threads (see posts/comments.py): a reply points at the comment it answers (parent)
+    # and at the top-level comment that starts its thread (thread); both are null for top-level comments
+    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # Replies are deleted through their parent chain, so deleting a thread root needs no second cascade
+    thread = models.ForeignKey('self', on_delete=models.DO_NOTHING, null=True, blank=True, related_name='+')
+    depth = models.PositiveSmallIntegerField(default=0) # 0 for top-level comments, parent's depth + 1 for replies
+    # Denormalized number of replies in the thread of a top-level comment, kept up to date by posts/comments.py
+    replies_count = models.PositiveIntegerField(default=0)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['created_at'] # Oldest comments first
+        indexes = [
+            # Top-level comments of a post, newest first (thread IS NULL), and all comments of a post
+            models.Index(fields=['post', 'thread', '-created_at', '-id'], name='comment_post_thread_idx'),
+            # Replies of a thread, oldest first
+            models.Index(fields=['thread', 'created_at', 'id'], name='comment_thread_created_idx'),
+            # Which posts of a page the viewer commented on (commented_by_me)
+            models.Index(fields=['user', 'post'], name='comment_user_post_idx'),
+        ]
 
     def __str__(self):
         return f"Comment by {self.user.username} on Post {self.post.id}"
+
+class PostTerm(models.Model):
+    """
+    One entry of the inverted index over post content used by posts.search.InvertedIndexBackend.
+    'author' is copied from the post so searches can be scoped to a feed without a join.
+    """
+    term = models.CharField(max_length=64)
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='terms')
+    author = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='+')
+    frequency = models.PositiveSmallIntegerField(default=1) # Occurrences of the term in the post
+
+    class Meta:
+        unique_together = ('term', 'post')
+        indexes = [
+            models.Index(fields=['term', 'author'], name='postterm_term_author_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} in Post {self.post_id}"
 # Create your models here.
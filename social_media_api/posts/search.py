@@ -0,0 +1,165 @@
+# posts/search.py
+"""
+Full-text search over posts.
+
+The backend is chosen with the POST_SEARCH_BACKEND setting. The default
+InvertedIndexBackend keeps a PostTerm row per (term, post) in the database,
+so it works the same on MySQL and SQLite. Other backends (e.g. a search
+server) only need to implement the BaseSearchBackend methods.
+"""
+import math
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Case, Count, F, FloatField, Max, Sum, When
+from django.utils.module_loading import import_string
+
+from users.cards import get_cards
+
+from .models import Post, PostTerm
+
+TOKEN_RE = re.compile(r'\w+')
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'for', 'if', 'in', 'into', 'is', 'it',
+    'no', 'not', 'of', 'on', 'or', 'so', 'such', 'that', 'the', 'their', 'then', 'there', 'these',
+    'they', 'this', 'to', 'was', 'will', 'with',
+})
+
+
+def tokenize(text):
+    """
+    Splits text into lower-case index terms, dropping stop words and one-letter tokens.
+    Returns a Counter of term -> number of occurrences.
+    """
+    terms = Counter()
+    for token in TOKEN_RE.findall(text.lower()):
+        if len(token) > 1 and token not in STOP_WORDS:
+            terms[token[:MAX_TERM_LENGTH]] += 1
+    return terms
+
+
+def query_terms(query):
+    """
+    Returns the distinct terms of a search query, in the order they were typed.
+    """
+    return list(dict.fromkeys(tokenize(query)))[:MAX_QUERY_TERMS]
+
+
+class BaseSearchBackend:
+    """
+    Interface every post search backend implements.
+    """
+    def index_post(self, post):
+        """
+        Adds the post to the index, replacing any previous version of it.
+        """
+        raise NotImplementedError
+
+    def index_posts(self, posts):
+        """
+        Indexes several posts; backends override this when they can do it in bulk.
+        """
+        for post in posts:
+            self.index_post(post)
+
+    def remove_post(self, post_id):
+        """
+        Removes the post from the index.
+        """
+        raise NotImplementedError
+
+    def search(self, query, author_ids=None, limit=20):
+        """
+        Returns up to `limit` (post_id, score) pairs for posts matching any query term,
+        best match first. `author_ids` restricts the results to posts by those users.
+        """
+        raise NotImplementedError
+
+    def matching_post_ids(self, query):
+        """
+        Returns the IDs of posts containing every query term, as a list or a values queryset.
+        """
+        raise NotImplementedError
+
+
+class InvertedIndexBackend(BaseSearchBackend):
+    """
+    Inverted index stored in the PostTerm table.
+    Content and author username are indexed; results are ranked by TF-IDF.
+    """
+    def index_post(self, post):
+        self.index_posts([post])
+
+    def index_posts(self, posts):
+        posts = list(posts)
+        cards = get_cards({post.user_id for post in posts}) # Cached, no user query
+        entries = []
+        for post in posts:
+            terms = tokenize(post.content)
+            terms.update(tokenize(cards[post.user_id]['username']))
+            entries.extend(
+                PostTerm(term=term, post_id=post.pk, author_id=post.user_id, frequency=min(count, 32767))
+                for term, count in terms.items()
+            )
+        PostTerm.objects.filter(post_id__in=[post.pk for post in posts]).delete()
+        PostTerm.objects.bulk_create(entries)
+
+    def remove_post(self, post_id):
+        PostTerm.objects.filter(post_id=post_id).delete()
+
+    def search(self, query, author_ids=None, limit=20):
+        terms = query_terms(query)
+        if not terms:
+            return []
+
+        entries = PostTerm.objects.filter(term__in=terms)
+        if author_ids is not None:
+            entries = entries.filter(author_id__in=author_ids)
+
+        # Inverse document frequency of every term; the largest post ID stands in
+        # for the number of posts so no COUNT(*) over the Post table is needed
+        total = Post.objects.aggregate(last=Max('id'))['last'] or 1
+        document_counts = dict(
+            PostTerm.objects.filter(term__in=terms).order_by()
+            .values_list('term').annotate(documents=Count('post'))
+        )
+        weights = [
+            When(term=term, then=F('frequency') * math.log(1 + total / documents))
+            for term, documents in document_counts.items()
+        ]
+        if not weights:
+            return []
+
+        ranked = (
+            entries.order_by().values('post_id')
+            .annotate(score=Sum(Case(*weights, default=0.0, output_field=FloatField())))
+            .order_by('-score', '-post_id')
+            .values_list('post_id', 'score')
+        )
+        return list(ranked[:limit])
+
+    def matching_post_ids(self, query):
+        terms = query_terms(query)
+        return (
+            PostTerm.objects.filter(term__in=terms).order_by()
+            .values('post_id')
+            .annotate(matched=Count('term'))
+            .filter(matched=len(terms))
+            .values('post_id')
+        )
+
+
+_backends = {}
+
+
+def get_search_backend():
+    """
+    Returns the backend configured by POST_SEARCH_BACKEND (one instance per backend class).
+    """
+    path = settings.POST_SEARCH_BACKEND
+    if path not in _backends:
+        _backends[path] = import_string(path)()
+    return _backends[path]
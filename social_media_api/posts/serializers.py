@@ -1,64 +1,82 @@
 # posts/serializers.py
 from rest_framework import serializers
 from .models import Post, Like, Comment # NEW: Import Like and Comment
-from users.serializers import UserPublicSerializer # To show public user info in post
+from .likes import MAX_BATCH_SIZE
+from assets.fields import MediaUploadField, MediaUploadSerializerMixin, load_assets, variant_urls # Deduplicated uploads
+from .engagement import load_engagement # Per-page liked_by_me / commented_by_me / likers
+from users.cards import UserCardField, UserCardListSerializer, UserCardSerializerMixin, render_card # Cached public user info
+
+
+def wants_engagement(request):
+    """
+    Viewer engagement (liked_by_me, commented_by_me, likers) is opt-in: `?include=engagement`.
+    """
+    return request is not None and 'engagement' in request.query_params.get('include', '').split(',')
 
 
 # NEW: Comment Serializer
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(UserCardSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Comment model.
+    `parent` is the comment a reply answers (write it to reply, on creation only);
+    thread, depth and replies_count are set from it (see posts/comments.py).
     """
-    user = UserPublicSerializer(read_only=True) # Display public user info for the commenter
+    user = UserCardField(source='user_id') # Display public user info for the commenter
 
     class Meta:
         model = Comment
-        fields = ['id', 'user', 'post', 'content', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'user', 'post', 'created_at', 'updated_at'] # These fields are set by system/URL
+        list_serializer_class = UserCardListSerializer # One cache multi-get for all commenters
+        fields = ['id', 'user', 'post', 'parent', 'thread', 'depth', 'replies_count', 'content', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'user', 'post', 'thread', 'depth', 'replies_count', 'created_at', 'updated_at'] # These fields are set by system/URL
 
     def create(self, validated_data):
         # 'post' and 'user' will be set by the view's perform_create method
         return Comment.objects.create(**validated_data)
 
+    def update(self, instance, validated_data):
+        validated_data.pop('parent', None) # A comment stays in its thread
+        return super().update(instance, validated_data)
+
 
 # NEW: Like Serializer (used primarily for creation/deletion)
-class LikeSerializer(serializers.ModelSerializer):
+class LikeSerializer(UserCardSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for the Like model.
     Used for creating and confirming likes.
     """
-    user = UserPublicSerializer(read_only=True) # Display public user info for the liker
+    user = UserCardField(source='user_id') # Display public user info for the liker
 
     class Meta:
         model = Like
+        list_serializer_class = UserCardListSerializer
         fields = ['id', 'user', 'post', 'created_at']
         read_only_fields = ['id', 'user', 'post', 'created_at'] # All fields set by system/URL
 
 
-class PostSerializer(serializers.ModelSerializer):
+class PostSerializer(UserCardSerializerMixin, MediaUploadSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for Post model.
     Handles creation, viewing, updating of posts.
-    Includes likes_count and comments_count.
+    Includes likes_count and comments_count, and with `?include=engagement`
+    also liked_by_me, commented_by_me and the most recent likers.
+    `media_variants` holds the thumbnail and preview URLs once the upload is processed.
     """
-    user = UserPublicSerializer(read_only=True) # Display public user info, not writable
-    media = serializers.ImageField(required=False, allow_null=True) # Make media optional
-    likes_count = serializers.SerializerMethodField() # NEW: Field to show total likes
-    comments_count = serializers.SerializerMethodField() # NEW: Field to show total comments
+    user = UserCardField(source='user_id') # Display public user info, not writable
+    media = MediaUploadField(required=False, allow_null=True) # Make media optional; stored deduplicated
+    media_variants = serializers.SerializerMethodField() # Resized copies of media, null until processed
+    likes_count = serializers.IntegerField(read_only=True) # Denormalized counter on the Post row
+    comments_count = serializers.IntegerField(read_only=True) # Denormalized counter on the Post row
     # Optional: nested comments (can be complex for large numbers of comments)
     # comments = CommentSerializer(many=True, read_only=True) # NEW: Nested comments
 
     class Meta:
         model = Post
-        fields = ['id', 'user', 'content', 'media', 'timestamp', 'updated_at',
+        list_serializer_class = UserCardListSerializer # One cache multi-get for all authors on a page
+        fields = ['id', 'user', 'content', 'media', 'media_variants', 'timestamp', 'updated_at',
                   'likes_count', 'comments_count'] # NEW: Added counts
         read_only_fields = ['id', 'user', 'timestamp', 'updated_at', 'likes_count', 'comments_count']
 
-    def get_likes_count(self, obj):
-        return obj.likes.count() # Counts related likes
-
-    def get_comments_count(self, obj):
-        return obj.comments.count() # Counts related comments
+    media_fields = {'media': 'media_asset'}
 
     def create(self, validated_data):
         """
@@ -67,10 +85,64 @@ class PostSerializer(serializers.ModelSerializer):
         validated_data['user'] = self.context['request'].user
         return super().create(validated_data)
 
+    def wants_engagement(self):
+        return wants_engagement(self.context.get('request'))
+
+    def prefetch_page(self, instances):
+        """
+        Loads the media assets of the page with one query (only if it has media), and
+        the viewer engagement of every post on the page with one query per attribute.
+        """
+        assets = self.context.setdefault('media_assets', {})
+        for post in instances:
+            if Post.media_asset.is_cached(post) and post.media_asset is not None: # Just uploaded
+                assets[post.media_asset_id] = post.media_asset
+        assets.update(load_assets(
+            post.media_asset_id for post in instances if post.media_asset_id not in assets
+        ))
+        if not self.wants_engagement():
+            return set()
+        engagement = self.context.setdefault('post_engagement', {})
+        missing = [post.pk for post in instances if post.pk not in engagement]
+        if missing:
+            engagement.update(load_engagement(self.context['request'].user, missing))
+        return {user_id for post in instances for user_id in engagement[post.pk]['liker_ids']}
+
+    def get_media_variants(self, post):
+        asset = self.context.get('media_assets', {}).get(post.media_asset_id)
+        return variant_urls(asset, self.context.get('request'))
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        engagement = self.context.get('post_engagement', {}).get(instance.pk)
+        if engagement is not None:
+            data['liked_by_me'] = engagement['liked_by_me']
+            data['commented_by_me'] = engagement['commented_by_me']
+            data['likers'] = [render_card(user_id, self.context) for user_id in engagement['liker_ids']]
+        return data
+
     def validate_content(self, value):
         """
         Ensure content is not empty.
         """
         if not value.strip():
             raise serializers.ValidationError("Post content cannot be empty.")
-        return value
\ No newline at end of file
+        return value
+
+
+class LikeBatchSerializer(serializers.Serializer):
+    """
+    Validates a batch like/unlike request: {"like": [post ids], "unlike": [post ids]}.
+    """
+    like = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+    unlike = serializers.ListField(child=serializers.IntegerField(min_value=1), required=False, default=list)
+
+    def validate(self, attrs):
+        like, unlike = set(attrs['like']), set(attrs['unlike'])
+        if not like and not unlike:
+            raise serializers.ValidationError("Provide post IDs to like and/or unlike.")
+        if like & unlike:
+            raise serializers.ValidationError("A post cannot be liked and unliked in the same request.")
+        if len(like | unlike) > MAX_BATCH_SIZE:
+            raise serializers.ValidationError(f"At most {MAX_BATCH_SIZE} posts per request.")
+        return {'like': like, 'unlike': unlike}
@@ -1,3 +1,488 @@
 from django.test import TestCase
 
-# Create your tests here.
+from notifications.models import NotificationOutbox
+from social_media_api.testing import QueryBudgetTestCase, async_read_views
+from users.cards import refresh_card
+from .counters import recount_counters, recount_replies
+from .models import Post, Like, Comment
+
+
+class PostRouteQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Every route in posts/urls.py must stay within a fixed number of SQL queries,
+    independent of how many posts, likes or comments are on the page.
+    """
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.filter(user=self.user).first()
+        self.other_post = Post.objects.filter(user=self.users[1]).first()
+        self.comment = Comment.objects.filter(user=self.user).first()
+
+    def test_list(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get('/api/posts/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_list_next_page(self):
+        next_url = self.client.get('/api/posts/').data['next']
+        with self.assertQueryBudget(2):
+            response = self.client.get(next_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 10)
+
+    def test_list_with_engagement(self):
+        with self.assertQueryBudget(5):
+            response = self.client.get('/api/posts/?include=engagement')
+        self.assertEqual(response.status_code, 200)
+
+    def test_user_timeline(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get(f'/api/posts/user/{self.users[1].pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(all(post['user']['id'] == self.users[1].pk for post in response.data['results']))
+
+    def test_create(self):
+        with self.assertQueryBudget(5):
+            response = self.client.post('/api/posts/', {'content': 'Fresh post'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_search(self):
+        with self.assertQueryBudget(5):
+            response = self.client.get('/api/posts/search/?q=django')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), 20)
+
+    def test_search_feed_scope(self):
+        with self.assertQueryBudget(5):
+            response = self.client.get('/api/posts/search/?q=django&scope=feed')
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get(f'/api/posts/{self.post.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve_not_modified(self):
+        etag = self.client.get(f'/api/posts/{self.post.pk}/')['ETag']
+        with self.assertQueryBudget(2):
+            response = self.client.get(f'/api/posts/{self.post.pk}/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_partial_update(self):
+        with self.assertQueryBudget(5):
+            response = self.client.patch(f'/api/posts/{self.post.pk}/', {'content': 'Edited'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_destroy(self):
+        with self.assertQueryBudget(14):
+            response = self.client.delete(f'/api/posts/{self.post.pk}/')
+        self.assertEqual(response.status_code, 204)
+
+    def test_like(self):
+        Like.objects.filter(user=self.user, post=self.other_post).delete()
+        with self.assertQueryBudget(8):
+            response = self.client.post(f'/api/posts/{self.other_post.pk}/like/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_unlike(self):
+        Like.objects.get_or_create(user=self.user, post=self.other_post)
+        with self.assertQueryBudget(7):
+            response = self.client.post(f'/api/posts/{self.other_post.pk}/unlike/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_batch_likes(self):
+        post_ids = list(Post.objects.exclude(user=self.user).values_list('pk', flat=True)[:20])
+        Like.objects.filter(user=self.user, post_id__in=post_ids).delete()
+        with self.assertQueryBudget(8):
+            response = self.client.post('/api/posts/likes/', {'like': post_ids}, format='json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_add_comment(self):
+        with self.assertQueryBudget(7):
+            response = self.client.post(f'/api/posts/{self.other_post.pk}/comments/', {'content': 'Hello'})
+        self.assertEqual(response.status_code, 201)
+
+    def test_add_reply(self):
+        parent = Comment.objects.filter(post=self.other_post).first()
+        with self.assertQueryBudget(9):
+            response = self.client.post(
+                f'/api/posts/{self.other_post.pk}/comments/', {'content': 'Hello', 'parent': parent.pk},
+            )
+        self.assertEqual(response.status_code, 201)
+
+    def test_comments(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get(f'/api/posts/{self.other_post.pk}/comments/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_comments_next_page(self):
+        next_url = self.client.get(f'/api/posts/{self.other_post.pk}/comments/?page_size=1').data['next']
+        with self.assertQueryBudget(3):
+            response = self.client.get(next_url)
+        self.assertEqual(response.status_code, 200)
+
+    def test_replies(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get(f'/api/posts/comments/{self.comment.pk}/replies/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_comments_not_modified(self):
+        etag = self.client.get(f'/api/posts/{self.other_post.pk}/comments/')['ETag']
+        with self.assertQueryBudget(3):
+            response = self.client.get(f'/api/posts/{self.other_post.pk}/comments/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_comment_retrieve(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get(f'/api/posts/comments/{self.comment.pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_partial_update(self):
+        with self.assertQueryBudget(3):
+            response = self.client.patch(f'/api/posts/comments/{self.comment.pk}/', {'content': 'Edited'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_comment_destroy(self):
+        with self.assertQueryBudget(13):
+            response = self.client.delete(f'/api/posts/comments/{self.comment.pk}/')
+        self.assertEqual(response.status_code, 204)
+
+
+class PostSearchTests(QueryBudgetTestCase):
+    """
+    The search index follows post changes and ranks results by relevance.
+    """
+    def test_index_follows_create_update_and_delete(self):
+        post_id = self.client.post('/api/posts/', {'content': 'Serendipitous kumquats'}).data['id']
+        results = self.client.get('/api/posts/search/?q=kumquats').data['results']
+        self.assertEqual([post['id'] for post in results], [post_id])
+
+        self.client.patch(f'/api/posts/{post_id}/', {'content': 'Plain oranges'})
+        self.assertEqual(self.client.get('/api/posts/search/?q=kumquats').data['results'], [])
+        self.assertEqual(len(self.client.get('/api/posts/search/?q=oranges').data['results']), 1)
+
+        self.client.delete(f'/api/posts/{post_id}/')
+        self.assertEqual(self.client.get('/api/posts/search/?q=oranges').data['results'], [])
+
+    def test_more_occurrences_rank_higher(self):
+        once = self.client.post('/api/posts/', {'content': 'quokka sighting'}).data['id']
+        twice = self.client.post('/api/posts/', {'content': 'quokka quokka everywhere'}).data['id']
+        results = self.client.get('/api/posts/search/?q=quokka').data['results']
+        self.assertEqual([post['id'] for post in results], [twice, once])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+
+    def test_feed_scope_only_returns_followed_authors(self):
+        followed = set(self.user.following_relationships.values_list('following_id', flat=True))
+        results = self.client.get('/api/posts/search/?q=python&scope=feed&page_size=100').data['results']
+        self.assertTrue(results)
+        self.assertTrue(all(post['user']['id'] in followed for post in results))
+
+    def test_page_size_is_clamped(self):
+        for page_size, expected in [('-5', 1), ('0', 1), ('abc', 20)]:
+            response = self.client.get(f'/api/posts/search/?q=django&page_size={page_size}')
+            self.assertEqual((response.status_code, len(response.data['results'])), (200, expected))
+
+    def test_feed_query_uses_index(self):
+        results = self.client.get('/api/follows/feed/?q=post+11').data['results']
+        self.assertTrue(results)
+        self.assertTrue(all(post['content'].startswith('Post 11 ') for post in results))
+
+
+class PostCounterTests(QueryBudgetTestCase):
+    """
+    The denormalized counters on Post follow likes and comments.
+    """
+    def test_like_and_comment_update_counters(self):
+        post = Post.objects.filter(user=self.users[3]).last()
+        Like.objects.filter(user=self.user, post=post).delete()
+        before = Post.objects.get(pk=post.pk)
+
+        self.client.post(f'/api/posts/{post.pk}/like/')
+        self.client.post(f'/api/posts/{post.pk}/comments/', {'content': 'Counting'})
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, before.likes_count + 1)
+        self.assertEqual(post.comments_count, before.comments_count + 1)
+
+        self.client.post(f'/api/posts/{post.pk}/unlike/')
+        post.refresh_from_db()
+        self.assertEqual(post.likes_count, before.likes_count)
+
+
+class CommentThreadTests(QueryBudgetTestCase):
+    """
+    Replies form threads under top-level comments, listed page by page with their counts kept in sync.
+    """
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.filter(user=self.users[1]).first()
+        self.url = f'/api/posts/{self.post.pk}/comments/'
+
+    def comment(self, content, parent=None):
+        data = {'content': content} if parent is None else {'content': content, 'parent': parent}
+        response = self.client.post(self.url, data)
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data
+
+    def walk(self, url):
+        seen = []
+        while url:
+            data = self.client.get(url).data
+            seen.extend(data['results'])
+            url = data['next']
+        return seen
+
+    def test_replies_join_the_thread_of_their_top_level_comment(self):
+        top = self.comment('Top')
+        reply = self.comment('Reply', parent=top['id'])
+        nested = self.comment('Nested', parent=reply['id'])
+        self.assertEqual((reply['thread'], reply['depth']), (top['id'], 1))
+        self.assertEqual((nested['thread'], nested['parent'], nested['depth']), (top['id'], reply['id'], 2))
+        self.assertEqual(Comment.objects.get(pk=top['id']).replies_count, 2)
+
+        replies = self.walk(f"/api/posts/comments/{top['id']}/replies/?page_size=1")
+        self.assertEqual([comment['id'] for comment in replies], [reply['id'], nested['id']]) # Oldest first
+
+    def test_top_level_pages_skip_replies(self):
+        tops = [self.comment(f'Top {n}')['id'] for n in range(4)]
+        self.comment('Reply', parent=tops[0])
+        comments = self.walk(f'{self.url}?page_size=2')
+        ids = [comment['id'] for comment in comments]
+        self.assertEqual(ids[:4], tops[::-1]) # Newest first
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), set(Comment.objects.filter(post=self.post, thread__isnull=True).values_list('pk', flat=True)))
+
+    def test_invalid_parents_are_refused(self):
+        other_comment = Comment.objects.exclude(post=self.post).first()
+        response = self.client.post(self.url, {'content': 'Lost', 'parent': other_comment.pk})
+        self.assertEqual(response.status_code, 400)
+        with self.settings(COMMENT_MAX_DEPTH=1):
+            reply = self.comment('Reply', parent=self.comment('Top')['id'])
+            response = self.client.post(self.url, {'content': 'Too deep', 'parent': reply['id']})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get(f"/api/posts/comments/{reply['id']}/replies/").status_code, 400)
+
+    def test_deleting_a_reply_deletes_its_subtree_and_fixes_counters(self):
+        top = self.comment('Top')
+        reply = self.comment('Reply', parent=top['id'])
+        self.comment('Nested', parent=reply['id'])
+        self.comment('Sibling', parent=top['id'])
+        before = Post.objects.get(pk=self.post.pk).comments_count
+
+        self.client.delete(f"/api/posts/comments/{reply['id']}/")
+        self.assertEqual(Comment.objects.get(pk=top['id']).replies_count, 1)
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, before - 2)
+
+        self.client.delete(f"/api/posts/comments/{top['id']}/")
+        self.assertFalse(Comment.objects.filter(thread_id=top['id']).exists())
+        self.assertEqual(Post.objects.get(pk=self.post.pk).comments_count, before - 4)
+
+    def test_recount_replies(self):
+        top = self.comment('Top')
+        self.comment('Reply', parent=top['id'])
+        Comment.objects.filter(pk=top['id']).update(replies_count=7)
+        recount_replies(Comment.objects.filter(post=self.post))
+        self.assertEqual(Comment.objects.get(pk=top['id']).replies_count, 1)
+
+
+class PostEngagementTests(QueryBudgetTestCase):
+    """
+    `?include=engagement` adds the viewer's likes and comments and the most recent likers.
+    """
+    def test_engagement_fields(self):
+        post = Post.objects.filter(user=self.users[1]).order_by('-pk').first()
+        Like.objects.filter(post=post).delete()
+        Comment.objects.filter(post=post).delete()
+        for user in self.users[:5]:
+            Like.objects.create(user=user, post=post)
+        Comment.objects.create(user=self.user, post=post, content='Nice')
+
+        data = self.client.get(f'/api/posts/{post.pk}/?include=engagement').data
+        self.assertTrue(data['liked_by_me'])
+        self.assertTrue(data['commented_by_me'])
+        self.assertEqual([card['id'] for card in data['likers']], [user.pk for user in self.users[4:1:-1]])
+
+        self.authenticate(self.users[5])
+        data = self.client.get(f'/api/posts/{post.pk}/?include=engagement').data
+        self.assertFalse(data['liked_by_me'])
+        self.assertFalse(data['commented_by_me'])
+
+    def test_engagement_is_opt_in(self):
+        item = self.client.get('/api/posts/').data['results'][0]
+        self.assertNotIn('liked_by_me', item)
+        self.assertNotIn('likers', item)
+
+
+class PostLikeTests(QueryBudgetTestCase):
+    """
+    Likes are idempotent, and the batch endpoint reports the resulting state of every post.
+    """
+    def setUp(self):
+        super().setUp()
+        self.posts = list(Post.objects.filter(user=self.users[3]).order_by('pk')[:3])
+        Like.objects.filter(user=self.user, post__in=self.posts).delete()
+        recount_counters(Post.objects.filter(pk__in=[post.pk for post in self.posts]))
+
+    def likes_count(self, post):
+        return Post.objects.values_list('likes_count', flat=True).get(pk=post.pk)
+
+    def test_liking_twice_is_a_no_op(self):
+        post = self.posts[0]
+        before = self.likes_count(post)
+        for _ in range(2):
+            response = self.client.post(f'/api/posts/{post.pk}/like/')
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data['likes_count'], before + 1)
+        self.assertEqual(self.likes_count(post), before + 1)
+        self.assertEqual(NotificationOutbox.objects.filter(post=post, type='like').count(), 1)
+
+        for _ in range(2):
+            response = self.client.post(f'/api/posts/{post.pk}/unlike/')
+            self.assertEqual(response.status_code, 200)
+            self.assertFalse(response.data['liked'])
+        self.assertEqual(self.likes_count(post), before)
+
+    def test_like_unknown_post(self):
+        response = self.client.post('/api/posts/999999/like/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_like_and_unlike(self):
+        first, second, third = self.posts
+        Like.objects.create(user=self.user, post=second)
+        recount_counters(Post.objects.filter(pk=second.pk))
+        counts = {post.pk: self.likes_count(post) for post in self.posts}
+
+        response = self.client.post('/api/posts/likes/', {
+            'like': [first.pk, third.pk, 999999], 'unlike': [second.pk],
+        }, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['not_found'], [999999])
+        self.assertEqual(response.data['results'], [
+            {'post_id': first.pk, 'liked': True, 'likes_count': counts[first.pk] + 1},
+            {'post_id': second.pk, 'liked': False, 'likes_count': counts[second.pk] - 1},
+            {'post_id': third.pk, 'liked': True, 'likes_count': counts[third.pk] + 1},
+        ])
+        for post in self.posts:
+            self.assertEqual(self.likes_count(post), response.data['results'][self.posts.index(post)]['likes_count'])
+
+        repeated = self.client.post('/api/posts/likes/', {'like': [first.pk, third.pk]}, format='json')
+        self.assertEqual(repeated.data['results'][0]['likes_count'], counts[first.pk] + 1)
+
+    def test_batch_rejects_conflicting_ids(self):
+        post = self.posts[0]
+        response = self.client.post('/api/posts/likes/', {'like': [post.pk], 'unlike': [post.pk]}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(QueryBudgetTestCase):
+    """
+    ETags change whenever anything shown in the response changes.
+    """
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.filter(user=self.users[3]).order_by('pk').first()
+        self.url = f'/api/posts/{self.post.pk}/'
+
+    def assertChanged(self, url, etag):
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        return response['ETag']
+
+    def test_current_etag_is_not_modified(self):
+        response = self.client.get(self.url)
+        self.assertNotIn('Last-Modified', response)
+        repeated = self.client.get(self.url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeated.status_code, 304)
+        self.assertEqual(repeated['ETag'], response['ETag'])
+        self.assertEqual(repeated.content, b'')
+
+    def test_likes_comments_and_edits_change_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        self.client.post(f'{self.url}like/')
+        etag = self.assertChanged(self.url, etag)
+        self.client.post(f'{self.url}comments/', {'content': 'Nice'})
+        etag = self.assertChanged(self.url, etag)
+        Post.objects.filter(pk=self.post.pk).update(content='Edited')
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304) # Only saves bump changed_at
+
+        self.authenticate(self.post.user)
+        self.client.patch(self.url, {'content': 'Edited again'})
+        self.authenticate(self.user)
+        self.assertChanged(self.url, etag)
+
+    def test_comment_edits_change_the_etag(self):
+        url = f'{self.url}comments/'
+        self.client.post(url, {'content': 'First'})
+        etag = self.client.get(url)['ETag']
+        comment = Comment.objects.filter(post=self.post, user=self.user).latest('created_at')
+        self.client.patch(f'/api/posts/comments/{comment.pk}/', {'content': 'Edited'})
+        self.assertChanged(url, etag)
+
+    def test_non_numeric_ids_are_not_found(self):
+        for url in ['/api/posts/abc/', '/api/posts/abc/comments/']:
+            self.assertEqual(self.client.get(url).status_code, 404)
+            self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"stale"').status_code, 404)
+
+    def test_author_rename_changes_the_etag(self):
+        etag = self.client.get(self.url)['ETag']
+        author = self.post.user
+        author.username = 'renamed'
+        author.save(update_fields=['username'])
+        refresh_card(author)
+        self.assertChanged(self.url, etag)
+
+    def test_if_modified_since_after_author_rename(self):
+        author = self.post.user
+        author.username = 'renamed'
+        author.save(update_fields=['username'])
+        refresh_card(author)
+        # A date alone can never prove the post or its comments current
+        for url in (self.url, f'{self.url}comments/'):
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE='Fri, 01 Jan 2100 00:00:00 GMT')
+            self.assertEqual(response.status_code, 200)
+            self.assertNotIn('Last-Modified', response)
+
+
+@async_read_views
+class AsyncPostDetailTests(QueryBudgetTestCase):
+    """
+    The async post detail view returns exactly what PostViewSet.retrieve returns.
+    """
+    def setUp(self):
+        super().setUp()
+        self.post = Post.objects.filter(user=self.users[1]).first()
+        self.url = f'/api/posts/{self.post.pk}/'
+
+    def test_retrieve(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertMatchesSync(self.url)
+
+    def test_retrieve_with_engagement(self):
+        with self.assertQueryBudget(5):
+            response = self.client.get(f'{self.url}?include=engagement')
+        self.assertIn('likers', response.json())
+        self.assertMatchesSync(f'{self.url}?include=engagement')
+
+    def test_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+        with self.assertQueryBudget(2):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_errors(self):
+        self.assertMatchesSync('/api/posts/999999/')
+        self.client.credentials()
+        self.assertMatchesSync(self.url) # Public
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-token')
+        self.assertMatchesSync(self.url)
+
+    def test_other_methods_use_the_drf_view(self):
+        post = Post.objects.filter(user=self.user).first()
+        response = self.client.patch(f'/api/posts/{post.pk}/', {'content': 'Edited'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['content'], 'Edited')
+        response = self.client.delete(f'/api/posts/{self.post.pk}/') # Not the owner
+        self.assertEqual(response.status_code, 403)
@@ -1,6 +1,8 @@
 from rest_framework.routers import DefaultRouter
 from django.urls import path, include # NEW: include for nested routes if desired
 from .views import PostViewSet, CommentViewSet # NEW: Import CommentViewSet
+from .async_views import retrieve_post
+from social_media_api.asyncapi import read_view
 
 router = DefaultRouter()
 router.register(r'', PostViewSet, basename='posts') # Main posts endpoints
@@ -9,9 +11,12 @@ router.register(r'comments', CommentViewSet, basename='comments') # NEW: Top-lev
 # Define specific URLs for post-related actions (like, unlike, add comment)
 urlpatterns = [
     # Custom actions for PostViewSet
+    path('user/<int:user_id>/', PostViewSet.as_view({'get': 'user_timeline'}), name='post-user-timeline'),
+    path('search/', PostViewSet.as_view({'get': 'search'}), name='post-search'),
+    path('likes/', PostViewSet.as_view({'post': 'likes'}), name='post-likes'),
     path('<int:pk>/like/', PostViewSet.as_view({'post': 'like_post'}), name='post-like'),
     path('<int:pk>/unlike/', PostViewSet.as_view({'post': 'unlike_post'}), name='post-unlike'),
-    path('<int:pk>/comments/', PostViewSet.as_view({'post': 'add_comment', 'get': 'recent_comments'}), name='post-comments'),
+    path('<int:pk>/comments/', PostViewSet.as_view({'post': 'add_comment', 'get': 'comments'}), name='post-comments'),
     # You can also define specific paths for comment creation like this if you want:
     # path('<int:post_pk>/comments/new/', CommentViewSet.as_view({'post': 'create'}), name='post-comment-create'),
 ]
@@ -19,6 +24,13 @@ urlpatterns = [
 # Add the router URLs (for all Post and top-level Comment CRUD)
 urlpatterns += router.urls
 
+# Async read views, mounted in front of the routes above by the ASGI application (social_media_api/asgi_urls.py)
+async_urlpatterns = [
+    path('<int:pk>/', read_view(retrieve_post, PostViewSet.as_view({
+        'get': 'retrieve', 'put': 'update', 'patch': 'partial_update', 'delete': 'destroy',
+    }))),
+]
+
 
 # ----------------------------------------------------------------------------------
 # NEW APP: Follows
@@ -1,27 +1,88 @@
 from django.shortcuts import render
+from django.db import transaction
 # posts/views.py
 from rest_framework import viewsets, mixins, status
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from users.permissions import IsOwnerOrReadOnly # Import the custom permission
 from rest_framework.decorators import action # NEW: For custom actions on ViewSets
-from rest_framework.exceptions import ValidationError # NEW: For specific validation errors
+from rest_framework.exceptions import ValidationError, NotFound, NotAuthenticated # NEW: For specific validation errors
 
 from .models import Post, Like, Comment # NEW: Import Like and Comment
-from .serializers import PostSerializer, CommentSerializer, LikeSerializer # NEW: Import new serializers
+from .serializers import PostSerializer, CommentSerializer, LikeSerializer, LikeBatchSerializer # NEW: Import new serializers
+from .counters import adjust_counter # Keeps Post.likes_count / comments_count in sync
+from .comments import adjust_replies, delete_comments, reply_fields # Comment threads
+from .likes import set_likes # Idempotent, race-free like / unlike
+from .search import get_search_backend # Full-text index over post content
+from notifications.outbox import enqueue as enqueue_notification # Notifications are delivered by the outbox worker
+from follows.feed import fan_out_post # Delivers new posts to followers' feed inboxes
+from follows.graph import follow_graph # In-memory adjacency lists of the follow graph
+from social_media_api.pagination import KeysetPagination # Cursor pagination over (timestamp, id)
+from social_media_api.conditional import is_conditional, make_etag, not_modified, add_validators # ETag / Last-Modified
+from users.cards import card_versions
+from users.models import CustomUser
+
+
+def post_validators(request, post_id, changed_at, author_id):
+    """
+    Returns the (ETag, Last-Modified) of a post as returned to `request`.
+    There is no Last-Modified: the author's card can change (renames) without
+    the post's changed_at moving forward, so only the ETag, which covers both,
+    tells a current post from a stale one.
+    """
+    etag = make_etag('post', int(post_id), changed_at, card_versions([author_id]), request.user.pk, request.get_full_path())
+    return etag, None
+
+
+def comment_validators(request, post_changed_at, versions):
+    """
+    Returns the (ETag, Last-Modified) of a page of comments from their
+    (id, updated_at, user_id). Adding or deleting a comment bumps the post's changed_at.
+    There is no Last-Modified, for the same reason as in post_validators().
+    """
+    etag = make_etag(
+        'comments', post_changed_at, versions, card_versions(user_id for _, _, user_id in versions),
+        request.get_full_path(),
+    )
+    return etag, None
+
+
+def comment_page(request, paginator, queryset, post_changed_at):
+    """
+    Answers one cursor page of `queryset` (comments of the post last changed at
+    `post_changed_at`), or 304 Not Modified when the client's copy is current.
+    The page is one index range scan of the keyset order, however deep.
+    """
+    rows = paginator.page_queryset(queryset, request)
+    if is_conditional(request):
+        versions = list(rows.values_list('pk', 'updated_at', 'user_id'))
+        response = not_modified(request, *comment_validators(request, post_changed_at, versions))
+        if response is not None:
+            return response
+
+    comments = list(rows)
+    versions = [(comment.pk, comment.updated_at, comment.user_id) for comment in comments]
+    page = paginator.paginate_rows(comments, request)
+    response = paginator.get_paginated_response(CommentSerializer(page, many=True).data)
+    return add_validators(response, *comment_validators(request, post_changed_at, versions))
+
 
 class PostViewSet(viewsets.ModelViewSet):
     """
     API endpoints for managing posts.
     - List (GET /api/posts/): Publicly accessible, lists all posts.
     - Create (POST /api/posts/): Authenticated users only.
+    - Timeline (GET /api/posts/user/<user_id>/): Publicly accessible, posts by one author.
+    - Search (GET /api/posts/search/?q=<terms>[&scope=feed]): Ranked full-text search.
     - Retrieve (GET /api/posts/<id>/): Publicly accessible, view single post.
     - Update (PUT/PATCH /api/posts/<id>/): Authenticated, owner-only.
     - Destroy (DELETE /api/posts/<id>/): Authenticated, owner-only.
     - Custom actions for Liking/Unliking, and managing comments on posts.
+    - Batch likes (POST /api/posts/likes/): Like and/or unlike many posts at once.
     """
-    queryset = Post.objects.all()
+    queryset = Post.objects.all() # Authors are resolved from the user-card cache
     serializer_class = PostSerializer
+    pagination_class = KeysetPagination # Cursor pages instead of OFFSET + COUNT(*)
     lookup_field = 'pk' # Use primary key for lookup
 
     def get_permissions(self):
@@ -32,9 +93,9 @@ class PostViewSet(viewsets.ModelViewSet):
         - Update and Destroy require authentication and ownership (IsAuthenticated, IsOwnerOrReadOnly).
         - Custom actions for likes/comments might have their own permissions.
         """
-        if self.action in ['list', 'retrieve', 'recent_comments']: # 'recent_comments' for public read
+        if self.action in ['list', 'retrieve', 'comments', 'user_timeline', 'search']: # 'comments' for public read
             permission_classes = [AllowAny]
-        elif self.action in ['create', 'like_post', 'unlike_post', 'add_comment']: # Actions requiring authentication
+        elif self.action in ['create', 'likes', 'like_post', 'unlike_post', 'add_comment']: # Actions requiring authentication
             permission_classes = [IsAuthenticated]
         elif self.action in ['update', 'partial_update', 'destroy']:
             permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
@@ -42,11 +103,41 @@ class PostViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated] # Default for any other action
         return [permission() for permission in permission_classes]
 
+    def retrieve(self, request, *args, **kwargs):
+        """
+        Returns a single post, or 304 Not Modified if the client's ETag
+        is still current. That check only reads the post's change timestamp.
+        """
+        if is_conditional(request):
+            try:
+                version = self.get_queryset().filter(pk=int(kwargs['pk'])).values_list('changed_at', 'user_id').first()
+            except (TypeError, ValueError):
+                raise NotFound("No Post matches the given query.")
+            if version is not None:
+                response = not_modified(request, *post_validators(request, kwargs['pk'], *version))
+                if response is not None:
+                    return response
+
+        post = self.get_object()
+        serializer = self.get_serializer(post)
+        response = Response(serializer.data)
+        return add_validators(response, *post_validators(request, post.pk, post.changed_at, post.user_id))
+
     def perform_create(self, serializer):
         """
-        Automatically assigns the logged-in user as the author of the post.
+        Automatically assigns the logged-in user as the author of the post
+        and delivers it to the feeds of the author's followers.
+        """
+        post = serializer.save(user=self.request.user) # Set the user (author) field
+        fan_out_post(post)
+        get_search_backend().index_post(post)
+
+    def perform_update(self, serializer):
+        """
+        Saves the post and refreshes its entry in the search index.
         """
-        serializer.save(user=self.request.user) # Set the user (author) field
+        post = serializer.save()
+        get_search_backend().index_post(post)
 
     def perform_destroy(self, instance):
         """
@@ -54,59 +145,131 @@ class PostViewSet(viewsets.ModelViewSet):
         """
         post_id = instance.id
         instance.delete()
+        get_search_backend().remove_post(post_id)
         return Response({"message": f"Post {post_id} deleted successfully."}, status=status.HTTP_200_OK)
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
-    def like_post(self, request, pk=None):
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny], url_path=r'user/(?P<user_id>\d+)')
+    def user_timeline(self, request, user_id=None):
         """
-        API endpoint to like a specific post.
+        API endpoint to list the posts of a single author, newest first.
+        Publicly accessible and cursor paginated like the post list.
         """
-        post = self.get_object() # Get the post instance
-        user = request.user
+        queryset = self.get_queryset().filter(user_id=user_id)
+        page = self.paginate_queryset(queryset)
+        if not page and not CustomUser.objects.filter(pk=user_id).exists():
+            raise NotFound("User not found.")
+        serializer = self.get_serializer(page, many=True)
+        return self.get_paginated_response(serializer.data)
 
-        # Check if user already liked the post
-        if Like.objects.filter(post=post, user=user).exists():
-            raise ValidationError("You have already liked this post.")
+    @action(detail=False, methods=['get'], permission_classes=[AllowAny])
+    def search(self, request):
+        """
+        API endpoint for ranked full-text search over posts.
+        `?scope=feed` restricts the results to posts by users the caller follows.
+        Returns the best matches (up to `page_size`, default 20), each with its relevance score.
+        """
+        query = request.query_params.get('q', '')
+        if not query.strip():
+            raise ValidationError({"q": "A search query is required."})
 
-        Like.objects.create(post=post, user=user)
-        return Response({"message": "Post liked successfully."}, status=status.HTTP_200_OK)
+        author_ids = None
+        if request.query_params.get('scope') == 'feed':
+            if not request.user.is_authenticated:
+                raise NotAuthenticated("Log in to search your feed.")
+            author_ids = list(follow_graph.following(request.user.pk))
 
-    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
-    def unlike_post(self, request, pk=None):
+        try:
+            limit = max(1, min(int(request.query_params.get('page_size', 20)), 100))
+        except ValueError:
+            limit = 20
+        ranked = get_search_backend().search(query, author_ids=author_ids, limit=limit)
+
+        posts = self.get_queryset().order_by().in_bulk([post_id for post_id, _ in ranked]) # Kept in rank order below
+        ranked = [(posts[post_id], score) for post_id, score in ranked if post_id in posts]
+        results = self.get_serializer([post for post, _ in ranked], many=True).data # One card multi-get for the page
+        for data, (_, score) in zip(results, ranked):
+            data['score'] = round(score, 4)
+        return Response({"results": results}, status=status.HTTP_200_OK)
+
+    @action(detail=False, methods=['post'], permission_classes=[IsAuthenticated])
+    def likes(self, request):
         """
-        API endpoint to unlike a specific post.
+        API endpoint to like and/or unlike many posts at once:
+        {"like": [post ids], "unlike": [post ids]} (at most 100 posts).
+        Idempotent; returns the resulting like state and count of every post,
+        plus the requested IDs that do not exist.
         """
-        post = self.get_object()
-        user = request.user
+        serializer = LikeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        state, missing = set_likes(request.user, **serializer.validated_data)
+        results = [{"post_id": post_id, **state[post_id]} for post_id in sorted(state)]
+        return Response({"results": results, "not_found": missing}, status=status.HTTP_200_OK)
+
+    def _set_like(self, pk, liked):
+        """
+        Likes or unlikes one post; returns its resulting state. Raises NotFound for unknown posts.
+        """
+        try:
+            post_id = int(pk)
+        except (TypeError, ValueError):
+            raise NotFound("Post not found.")
+        state, _ = set_likes(self.request.user, **{'like' if liked else 'unlike': [post_id]})
+        if post_id not in state:
+            raise NotFound("Post not found.")
+        return state[post_id]
 
-        like = Like.objects.filter(post=post, user=user)
-        if not like.exists():
-            raise ValidationError("You have not liked this post.")
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def like_post(self, request, pk=None):
+        """
+        API endpoint to like a specific post. Liking an already liked post is a no-op.
+        """
+        state = self._set_like(pk, liked=True)
+        return Response({"message": "Post liked successfully.", **state}, status=status.HTTP_200_OK)
 
-        like.delete()
-        return Response({"message": "Post unliked successfully."}, status=status.HTTP_200_OK)
+    @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
+    def unlike_post(self, request, pk=None):
+        """
+        API endpoint to unlike a specific post. Unliking a post that is not liked is a no-op.
+        """
+        state = self._set_like(pk, liked=False)
+        return Response({"message": "Post unliked successfully.", **state}, status=status.HTTP_200_OK)
 
     @action(detail=True, methods=['post'], permission_classes=[IsAuthenticated])
     def add_comment(self, request, pk=None):
         """
-        API endpoint to add a comment to a specific post.
+        API endpoint to add a comment to a specific post, or with `parent` a reply to one of its comments.
         """
         post = self.get_object()
         serializer = CommentSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
-        serializer.save(user=request.user, post=post) # Set user and post for the comment
+        thread = reply_fields(post, serializer.validated_data.get('parent'))
+        with transaction.atomic():
+            comment = serializer.save(user=request.user, post=post, **thread) # Set user and post for the comment
+            adjust_counter(post.pk, 'comments_count', 1)
+            if comment.thread_id:
+                adjust_replies(comment.thread_id, 1)
+            if post.user_id != request.user.pk: # No notification for commenting on your own post
+                enqueue_notification(
+                    recipient_id=post.user_id, sender=request.user, post=post, comment=comment, type='comment',
+                    message=f"{request.user.username} commented on your post."
+                )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @action(detail=True, methods=['get'], permission_classes=[AllowAny])
-    def recent_comments(self, request, pk=None):
+    def comments(self, request, pk=None):
         """
-        API endpoint to list recent comments on a specific post.
-        Publicly accessible.
+        API endpoint to list the top-level comments on a specific post, newest first, cursor paginated.
+        Each has its replies_count; replies are listed by GET /api/posts/comments/<id>/replies/.
+        Publicly accessible. Answers 304 Not Modified when the client's copy is current.
         """
-        post = self.get_object()
-        comments = post.comments.all().order_by('-created_at')[:5] # Get 5 most recent comments
-        serializer = CommentSerializer(comments, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        try:
+            post_changed_at = self.get_queryset().filter(pk=int(pk)).values_list('changed_at', flat=True).first()
+        except (TypeError, ValueError):
+            post_changed_at = None
+        if post_changed_at is None:
+            raise NotFound("No Post matches the given query.")
+        comments = Comment.objects.filter(post_id=pk, thread__isnull=True)
+        return comment_page(request, KeysetPagination(ordering_field='created_at'), comments, post_changed_at)
 
 
 # NEW: Comment ViewSet for CRUD on comments themselves (editing/deleting a specific comment)
@@ -115,6 +278,7 @@ class CommentViewSet(viewsets.ModelViewSet):
     API endpoints for managing comments.
     - List: Not provided directly via ViewSet, typically nested under posts.
     - Retrieve (GET /api/comments/<id>/): Publicly accessible.
+    - Replies (GET /api/comments/<id>/replies/): The thread of a top-level comment. Publicly accessible.
     - Update (PUT/PATCH /api/comments/<id>/): Authenticated, owner-only.
     - Destroy (DELETE /api/comments/<id>/): Authenticated, owner-only.
     """
@@ -125,10 +289,10 @@ class CommentViewSet(viewsets.ModelViewSet):
     def get_permissions(self):
         """
         Sets permissions for comment actions.
-        - Retrieve is public.
+        - Retrieve and replies are public.
         - Update and Destroy require authentication and ownership.
         """
-        if self.action == 'retrieve':
+        if self.action in ['retrieve', 'replies']:
             permission_classes = [AllowAny]
         elif self.action in ['update', 'partial_update', 'destroy']:
             permission_classes = [IsAuthenticated, IsOwnerOrReadOnly]
@@ -143,6 +307,26 @@ class CommentViewSet(viewsets.ModelViewSet):
 
     def perform_destroy(self, instance):
         comment_id = instance.id
-        instance.delete()
+        with transaction.atomic():
+            delete_comments([instance.pk]) # With its replies, fixing the post's and thread's counters
         return Response({"message": f"Comment {comment_id} deleted successfully."}, status=status.HTTP_200_OK)
+
+    @action(detail=True, methods=['get'])
+    def replies(self, request, pk=None):
+        """
+        API endpoint to list the replies in the thread of a top-level comment, oldest first, cursor paginated.
+        Replies at every depth are listed; their parent and depth tell which comment each answers.
+        Answers 304 Not Modified when the client's copy is current.
+        """
+        try:
+            comment = Comment.objects.filter(pk=int(pk)).values_list('thread_id', 'post__changed_at').first()
+        except (TypeError, ValueError):
+            comment = None
+        if comment is None:
+            raise NotFound("No Comment matches the given query.")
+        thread_id, post_changed_at = comment
+        if thread_id is not None:
+            raise ValidationError({'detail': f"Not a top-level comment: its replies are listed by comment {thread_id}."})
+        replies = Comment.objects.filter(thread_id=pk)
+        return comment_page(request, KeysetPagination(ordering_field='created_at', descending=False), replies, post_changed_at)
 # Create your views here.
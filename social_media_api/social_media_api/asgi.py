@@ -10,7 +10,31 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 import os
 
 from django.core.asgi import get_asgi_application
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'social_media_api.settings')
+os.environ.setdefault('ASYNC_READ_VIEWS', 'True') # Serve the read-heavy endpoints with async views
 
-application = get_asgi_application()
+# Long-lived Server-Sent Event streams (see notifications/async_views.py)
+STREAM_PATHS = ('/api/notifications/stream/',)
+
+
+class StreamHandler(ASGIHandler):
+    """
+    Serves streams without a thread of their own. Django gives every request a
+    worker thread for its synchronous steps (middleware, ORM calls) that lives
+    as long as the response, i.e. one idle thread per open stream. Here those
+    short steps share a single thread instead.
+    """
+    async def __call__(self, scope, receive, send):
+        await self.handle(scope, receive, send)
+
+
+django_application = get_asgi_application()
+stream_application = StreamHandler()
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'http' and scope['path'] in STREAM_PATHS:
+        return await stream_application(scope, receive, send)
+    return await django_application(scope, receive, send)
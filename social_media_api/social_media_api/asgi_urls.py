@@ -0,0 +1,19 @@
+# social_media_api/asgi_urls.py
+"""
+URLconf of the ASGI application (ROOT_URLCONF when ASYNC_READ_VIEWS is on).
+
+The async read views of each app come first; the regular routes behind them
+serve every other path, and the async views hand other methods to the DRF views.
+"""
+from django.urls import path, include
+
+from follows import urls as follows_urls
+from notifications import urls as notifications_urls
+from posts import urls as posts_urls
+from .urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    path('api/posts/', include(posts_urls.async_urlpatterns)),
+    path('api/follows/', include(follows_urls.async_urlpatterns)),
+    path('api/notifications/', include(notifications_urls.async_urlpatterns)),
+] + sync_urlpatterns
@@ -0,0 +1,155 @@
+# social_media_api/asyncapi.py
+"""
+Async code path for read-heavy endpoints.
+
+DRF views are synchronous, so under ASGI every request to them occupies a
+worker thread for its whole duration. The async views of the read-heavy
+endpoints (post detail, feed, notification list) are plain Django coroutine
+views: authentication and the queries of a request are awaited without
+blocking the event loop, and independent sub-queries run concurrently with
+gather_queries(). Responses are rendered with DRF's JSON renderer, so they are
+byte-for-byte the same as the DRF views' JSON.
+
+The async views are mounted by social_media_api/asgi_urls.py, the URLconf of
+the ASGI application (ASYNC_READ_VIEWS); WSGI deployments keep the DRF views.
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.http import HttpResponse
+from rest_framework import exceptions, status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from users.authentication import get_local_token_user, get_token_user
+
+TOKEN_KEYWORD = 'Token'
+
+
+def json_response(data, status=status.HTTP_200_OK):
+    """
+    Returns an HttpResponse with `data` rendered exactly like DRF renders JSON.
+    """
+    return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def authenticate(request):
+    """
+    Returns the user of the request's `Authorization: Token <key>` header, or
+    the session user without one (like TokenAuthentication followed by
+    SessionAuthentication). Raises AuthenticationFailed for an invalid token.
+    Tokens are read like CachedTokenAuthentication does; a hit in the process's
+    LRU is answered without leaving the event loop.
+    """
+    header = request.headers.get('Authorization', '').split()
+    if not header or header[0].lower() != TOKEN_KEYWORD.lower():
+        return await request.auser()
+    if len(header) != 2:
+        raise exceptions.AuthenticationFailed("Invalid token header. Token string should not contain spaces.")
+    found = get_local_token_user(header[1]) or await sync_to_async(get_token_user)(header[1])
+    if found is None:
+        raise exceptions.AuthenticationFailed("Invalid token.")
+    user, _ = found
+    if not user.is_active:
+        raise exceptions.AuthenticationFailed("User inactive or deleted.")
+    return user
+
+
+def async_api_view(login_required=True):
+    """
+    Decorator for async read views. The view receives a DRF Request (for
+    query_params and serializer contexts) whose user is already authenticated.
+    APIExceptions are turned into DRF-style error responses.
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            try:
+                user = await authenticate(request)
+                if login_required and not user.is_authenticated:
+                    raise exceptions.NotAuthenticated()
+                api_request = Request(request)
+                api_request.user = user
+                return await view(api_request, *args, **kwargs)
+            except exceptions.APIException as exc:
+                response = json_response({'detail': exc.detail}, status=exc.status_code)
+                if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+                    response['WWW-Authenticate'] = TOKEN_KEYWORD
+                return response
+        return wrapper
+    return decorator
+
+
+def read_view(async_view, sync_view):
+    """
+    Returns a view serving GET / HEAD with `async_view` and every other method
+    with the synchronous DRF `sync_view` (run in a worker thread).
+    """
+    async def view(request, *args, **kwargs):
+        if request.method in ('GET', 'HEAD'):
+            return await async_view(request, *args, **kwargs)
+        return await sync_to_async(sync_view)(request, *args, **kwargs)
+    view.csrf_exempt = True # DRF views do their own CSRF checks (SessionAuthentication only)
+    return view
+
+
+async def serialize(serializer):
+    """
+    Returns serializer.data, computed in the request's thread: serializers read
+    the user-card cache and, on misses, the database.
+    """
+    return await sync_to_async(lambda: serializer.data)()
+
+
+def _isolated(call):
+    """
+    Wraps an ORM call run outside the request's thread: that thread has its own
+    database connection, which is recycled like the request's (CONN_MAX_AGE).
+    """
+    def run():
+        close_old_connections()
+        try:
+            return call()
+        finally:
+            close_old_connections()
+    return run
+
+
+async def gather_queries(*calls):
+    """
+    Runs independent synchronous ORM calls concurrently and returns their
+    results in order. Each call gets a worker thread and database connection
+    of its own, so the queries really overlap instead of queueing on the
+    request's thread. With ASYNC_PARALLEL_QUERIES off, they run one after the
+    other on the request's connection (tests: TestCase data is only visible there).
+    """
+    if not settings.ASYNC_PARALLEL_QUERIES:
+        return [await sync_to_async(call)() for call in calls]
+    return await asyncio.gather(*(sync_to_async(_isolated(call), thread_sensitive=False)() for call in calls))
+
+
+async def run_query(call):
+    """
+    Runs one synchronous ORM call like gather_queries() does and returns its result.
+    """
+    (result,) = await gather_queries(call)
+    return result
+
+
+def _close_connections():
+    for connection in connections.all(initialized_only=True):
+        connection.close()
+
+
+async def release_connections():
+    """
+    Closes the database connections of the request's thread. For views that
+    stay open long after their last query there (streams): their later queries
+    go through run_query(), so a waiting view holds no connection. Kept with
+    ASYNC_PARALLEL_QUERIES off, where every query runs on those connections.
+    """
+    if settings.ASYNC_PARALLEL_QUERIES:
+        await sync_to_async(_close_connections)()
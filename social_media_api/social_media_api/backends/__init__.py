@@ -0,0 +1,4 @@
+# social_media_api/backends
+"""
+Database backends whose connections come from a bounded pool (see social_media_api/pool.py).
+"""
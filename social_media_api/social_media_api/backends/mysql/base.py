@@ -0,0 +1,13 @@
+# social_media_api/backends/mysql/base.py
+"""
+Django's MySQL backend with pooled connections (ENGINE 'social_media_api.backends.mysql').
+"""
+from django.db.backends.mysql import base
+
+from social_media_api.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def set_raw_autocommit(self, raw, autocommit):
+        with self.wrap_database_errors:
+            raw.autocommit(autocommit)
@@ -0,0 +1,14 @@
+# social_media_api/backends/sqlite3/base.py
+"""
+Django's SQLite backend with pooled connections (ENGINE 'social_media_api.backends.sqlite3'),
+for local development against a database file.
+"""
+from django.db.backends.sqlite3 import base
+
+from social_media_api.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    def set_raw_autocommit(self, raw, autocommit):
+        with self.wrap_database_errors:
+            raw.isolation_level = None if autocommit else '' # As in base.DatabaseWrapper._set_autocommit
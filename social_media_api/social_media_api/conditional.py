@@ -0,0 +1,57 @@
+# social_media_api/conditional.py
+"""
+Conditional GET support (ETag / Last-Modified) for API views.
+
+For conditional requests, views compute a version of what they are about to
+return from cheap queries (IDs and change timestamps, never full rows), then
+call `not_modified()` before loading or serializing anything. Clients holding
+a current copy get a 304 with an empty body; otherwise the view builds the
+payload as usual and `add_validators()` stamps it for the next request.
+"""
+import hashlib
+
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """
+    Returns a strong ETag for the given version parts (any repr-stable values).
+    """
+    return quote_etag(hashlib.sha1(repr(parts).encode()).hexdigest())
+
+
+def is_conditional(request):
+    """
+    Returns True if the client sent If-None-Match or If-Modified-Since. Requests
+    without them skip the version lookup; validators are then computed from the
+    rows loaded for the response.
+    """
+    return 'HTTP_IF_NONE_MATCH' in request.META or 'HTTP_IF_MODIFIED_SINCE' in request.META
+
+
+def _timestamp(last_modified):
+    return int(last_modified.timestamp()) if last_modified is not None else None
+
+
+def not_modified(request, etag, last_modified=None):
+    """
+    Returns a 304 response if the client's If-None-Match / If-Modified-Since
+    headers show it already has this version, otherwise None.
+    """
+    response = get_conditional_response(
+        getattr(request, '_request', request), etag=etag, last_modified=_timestamp(last_modified),
+    )
+    if response is not None:
+        add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified=None):
+    """
+    Sets the ETag and Last-Modified headers of a response.
+    """
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(_timestamp(last_modified))
+    return response
@@ -0,0 +1,23 @@
+# social_media_api/metrics.py
+"""
+Registry of in-process runtime metrics, served by the /api/metrics/ endpoint.
+
+Apps register a callable returning a dict of values, usually from AppConfig.ready():
+
+    metrics.register('user_cards', card_stats)
+"""
+_providers = {}
+
+
+def register(name, provider):
+    """
+    Registers (or replaces) a metrics provider under `name`.
+    """
+    _providers[name] = provider
+
+
+def snapshot():
+    """
+    Returns the current values of every registered provider.
+    """
+    return {name: provider() for name, provider in sorted(_providers.items())}
@@ -0,0 +1,145 @@
+# social_media_api/pagination.py
+import base64
+import binascii
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over (ordering_field, id), newest first (oldest first with descending=False).
+
+    The cursor is an opaque token holding the position of the last row of the
+    previous page, and the next page is fetched with a keyset condition
+    `(field, id) < (cursor_field, cursor_id)` (> when ascending). Every page is a bounded index
+    range scan, no matter how deep, and no COUNT(*) is ever run.
+    Responses have the shape {"next": <url or null>, "results": [...]}.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    ordering_field = 'timestamp'
+    invalid_cursor_message = 'Invalid cursor'
+    descending = True
+
+    def __init__(self, ordering_field=None, descending=None):
+        if ordering_field:
+            self.ordering_field = ordering_field
+        if descending is not None:
+            self.descending = descending
+        self.request = None
+        self.next_position = None
+
+    def get_page_size(self, request):
+        """
+        Returns the requested page size, capped at max_page_size.
+        """
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def encode_cursor(self, position):
+        value, pk = position
+        raw = f"{value.isoformat()}|{pk}".encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        """
+        Returns the (value, id) position encoded in the request's cursor, or None for the first page.
+        """
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode()
+            value, pk = raw.rsplit('|', 1)
+            return datetime.fromisoformat(value), int(pk)
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def keyset_filter(self, position, field=None, pk_field='pk'):
+        """
+        Returns the Q object selecting rows strictly after `position` in (field, pk) order.
+        """
+        field = field or self.ordering_field
+        value, pk = position
+        after = 'lt' if self.descending else 'gt'
+        return Q(**{f'{field}__{after}': value}) | Q(**{field: value, f'{pk_field}__{after}': pk})
+
+    def get_ordering(self):
+        """
+        Returns the order_by() arguments of the keyset order.
+        """
+        prefix = '-' if self.descending else ''
+        return f'{prefix}{self.ordering_field}', f'{prefix}pk'
+
+    def page_queryset(self, queryset, request):
+        """
+        Returns `queryset` in keyset order, after the request's cursor and cut to
+        one row more than the page size (to detect a next page). Not evaluated.
+        """
+        position = self.decode_cursor(request)
+        queryset = queryset.order_by(*self.get_ordering())
+        if position is not None:
+            queryset = queryset.filter(self.keyset_filter(position))
+        return queryset[:self.get_page_size(request) + 1]
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        return self.paginate_rows(list(self.page_queryset(queryset, request)), request)
+
+    async def apaginate_queryset(self, queryset, request):
+        """
+        Async counterpart of paginate_queryset(), for async views.
+        """
+        self.request = request
+        return self.paginate_rows([row async for row in self.page_queryset(queryset, request)], request)
+
+    def paginate_rows(self, rows, request):
+        """
+        Turns rows already fetched in keyset order (one more than the page size,
+        to detect a next page) into the current page and remembers its end position.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        page = rows[:page_size]
+        self.next_position = None
+        if len(rows) > page_size:
+            last = page[-1]
+            self.next_position = (getattr(last, self.ordering_field), last.pk)
+        return page
+
+    def get_next_link(self):
+        if self.next_position is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.next_position))
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {
+                    'type': 'string',
+                    'nullable': True,
+                    'format': 'uri',
+                },
+                'results': schema,
+            },
+        }
@@ -0,0 +1,293 @@
+# social_media_api/pool.py
+"""
+Bounded database connection pools, shared by Django and the raw SQL helpers of database.py.
+
+The pooled database backends (social_media_api.backends.mysql / .sqlite3) take
+their connections from the pool of their alias instead of opening new ones,
+and hand them back instead of closing them. With CONN_MAX_AGE = 0 Django
+"closes" its connection at the end of every request, so a process never holds
+more than max_size connections however many threads or coroutines serve
+requests, and busy processes reuse warm connections instead of reconnecting.
+
+A pool:
+- opens connections lazily, up to max_size; a checkout waits up to `timeout`
+  seconds for a free one, then raises PoolTimeout;
+- checks connections on checkout (ping) when they were idle for more than
+  `recheck_after` seconds, replacing dead ones;
+- closes connections idle for more than `max_idle` seconds, or open for more
+  than `max_lifetime` seconds (before the server's wait_timeout drops them);
+- forgets inherited connections after a fork, so processes never share a socket.
+
+Checkout wait times and utilization are served by /api/metrics/ ('db_pools').
+"""
+import atexit
+import os
+import threading
+import time
+from collections import deque
+
+from django.db import OperationalError
+
+from . import metrics
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(OperationalError):
+    """
+    No connection became free within the pool's timeout.
+    """
+
+
+def ping(connection):
+    """
+    Raises if `connection` is no longer usable.
+    """
+    if hasattr(connection, 'ping'):
+        connection.ping() # MySQLdb: a round trip without a result set
+    else:
+        connection.cursor().execute('SELECT 1')
+
+
+class ConnectionPool:
+    """
+    Thread-safe pool of DB-API connections opened by `connect()`, see the module docstring.
+    """
+    def __init__(self, connect, max_size=10, timeout=10.0, max_idle=300.0, max_lifetime=3600.0,
+                 recheck_after=1.0, check=ping, name=''):
+        self.connect = connect
+        self.max_size = max_size
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self.max_lifetime = max_lifetime
+        self.recheck_after = recheck_after
+        self.check = check
+        self.name = name
+
+        self._condition = threading.Condition()
+        self._idle = deque() # (connection, opened_at, returned_at), most recently returned last
+        self._opened_at = {} # id(connection) -> opened_at, for checked out connections
+        self._size = 0 # Open connections, idle or checked out
+        self._pid = os.getpid()
+        self._stats = dict.fromkeys(
+            ('checkouts', 'waits', 'timeouts', 'opened', 'closed', 'failed_checks'), 0,
+        )
+        self._wait_total = self._wait_max = 0.0
+
+    def acquire(self):
+        """
+        Checks out a connection, opening one if the pool is below max_size.
+        """
+        started = time.monotonic()
+        deadline = started + self.timeout
+        waited = False
+        while True:
+            with self._condition:
+                self._check_pid()
+                expired = self._take_expired(time.monotonic())
+                entry = None
+                while True:
+                    if self._idle:
+                        entry = self._idle.pop() # Warmest first, so surplus connections idle out
+                        break
+                    if self._size < self.max_size:
+                        self._size += 1 # Reserved: opened below, outside the lock
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1
+                        raise PoolTimeout(f"No database connection free in pool '{self.name}' after {self.timeout}s.")
+                    waited = True
+                    self._condition.wait(remaining)
+            self._close_all(expired)
+
+            if entry is None:
+                connection, opened_at = self._open(), time.monotonic()
+            else:
+                connection, opened_at, returned_at = entry
+                if time.monotonic() - returned_at > self.recheck_after and not self._healthy(connection):
+                    continue
+            self._checked_out(connection, opened_at, time.monotonic() - started, waited)
+            return connection
+
+    def release(self, connection, discard=False):
+        """
+        Returns a checked out connection; `discard` closes it instead (broken,
+        or left in a state the next user must not inherit).
+        """
+        now = time.monotonic()
+        with self._condition:
+            if os.getpid() != self._pid:
+                return # Checked out before a fork: belongs to the parent
+            opened_at = self._opened_at.pop(id(connection), now)
+            if not discard and now - opened_at < self.max_lifetime:
+                self._idle.append((connection, opened_at, now))
+                self._condition.notify()
+                return
+            self._size -= 1
+            self._condition.notify()
+        self._close(connection)
+
+    def close(self):
+        """
+        Closes the idle connections (checked out ones are closed when returned).
+        """
+        with self._condition:
+            idle = [connection for connection, _, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+        self._close_all(idle)
+
+    def stats(self):
+        """
+        Returns the pool's size, utilization and checkout statistics (wait times in milliseconds).
+        """
+        with self._condition:
+            in_use = self._size - len(self._idle)
+            checkouts = self._stats['checkouts']
+            return {
+                'max_size': self.max_size,
+                'open': self._size,
+                'in_use': in_use,
+                'idle': len(self._idle),
+                'utilization': round(in_use / self.max_size, 3),
+                **self._stats,
+                'wait_ms_mean': round(self._wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                'wait_ms_max': round(self._wait_max * 1000, 3),
+            }
+
+    def _open(self):
+        try:
+            connection = self.connect()
+        except Exception:
+            with self._condition:
+                self._size -= 1
+                self._condition.notify()
+            raise
+        with self._condition:
+            self._stats['opened'] += 1
+        return connection
+
+    def _healthy(self, connection):
+        try:
+            self.check(connection)
+            return True
+        except Exception:
+            with self._condition:
+                self._stats['failed_checks'] += 1
+                self._size -= 1
+                self._condition.notify()
+            self._close(connection)
+            return False
+
+    def _checked_out(self, connection, opened_at, wait, waited):
+        with self._condition:
+            self._opened_at[id(connection)] = opened_at
+            self._stats['checkouts'] += 1
+            self._stats['waits'] += waited
+            self._wait_total += wait
+            self._wait_max = max(self._wait_max, wait)
+
+    def _take_expired(self, now):
+        """
+        Removes idle connections past max_idle or max_lifetime; returns them to be closed. Lock held.
+        """
+        expired = [
+            connection for connection, opened_at, returned_at in self._idle
+            if now - returned_at > self.max_idle or now - opened_at > self.max_lifetime
+        ]
+        if expired:
+            expired_ids = {id(connection) for connection in expired}
+            self._idle = deque(entry for entry in self._idle if id(entry[0]) not in expired_ids)
+            self._size -= len(expired)
+        return expired
+
+    def _check_pid(self):
+        """
+        After a fork, drops the parent's connections without closing them. Lock held.
+        """
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._idle.clear()
+            self._opened_at.clear()
+            self._size = 0
+
+    def _close_all(self, connections):
+        for connection in connections:
+            self._close(connection)
+
+    def _close(self, connection):
+        with self._condition:
+            self._stats['closed'] += 1
+        try:
+            connection.close()
+        except Exception:
+            pass # Already dead
+
+
+def get_pool(alias, create):
+    """
+    Returns the pool of a database alias, created by `create()` on first use.
+    """
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = create()
+        return _pools[alias]
+
+
+def pool_stats():
+    return {alias: pool.stats() for alias, pool in sorted(_pools.items())}
+
+
+@atexit.register
+def close_pools():
+    """
+    Closes the idle connections of every pool, e.g. on shutdown.
+    """
+    for pool in list(_pools.values()):
+        pool.close()
+
+
+metrics.register('db_pools', pool_stats)
+
+
+# Options of the 'POOL' entry of a database's settings, see ConnectionPool
+POOL_OPTIONS = {
+    'MAX_SIZE': 'max_size', 'TIMEOUT': 'timeout', 'MAX_IDLE': 'max_idle',
+    'MAX_LIFETIME': 'max_lifetime', 'RECHECK_AFTER': 'recheck_after',
+}
+
+
+class PooledDatabaseWrapperMixin:
+    """
+    Django DatabaseWrapper mixin: connections come from the pool of the alias
+    (configured by the 'POOL' entry of its settings) and go back to it on close().
+    """
+    @property
+    def pool(self):
+        return get_pool(self.alias, self.create_pool)
+
+    def create_pool(self):
+        options = {POOL_OPTIONS[key]: value for key, value in self.settings_dict.get('POOL', {}).items()}
+        params = self.get_connection_params()
+        connect = super().get_new_connection
+        return ConnectionPool(lambda: connect(params), name=self.alias, **options)
+
+    def get_new_connection(self, conn_params):
+        return self.pool.acquire()
+
+    def set_raw_autocommit(self, raw, autocommit):
+        """
+        Sets the autocommit mode of a raw connection checked out of the pool
+        without this wrapper (see database.py), like _set_autocommit() does for its own.
+        """
+        raise NotImplementedError
+
+    def _close(self):
+        if self.connection is None:
+            return
+        # Mid-transaction, outside autocommit or after an error: the next user must not inherit it
+        discard = self.in_atomic_block or not self.autocommit or self.errors_occurred
+        with self.wrap_database_errors:
+            self.pool.release(self.connection, discard=discard)
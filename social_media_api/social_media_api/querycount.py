@@ -0,0 +1,88 @@
+# social_media_api/querycount.py
+import time
+
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+
+class QueryCounter:
+    """
+    Context manager that records the number of SQL queries and the total time
+    spent in the database while it is active, across every configured database.
+
+        with QueryCounter() as counter:
+            ...
+        counter.count, counter.duration, counter.queries
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0 # Seconds
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+            self.queries.append(sql)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+        self._stack = None
+        return False
+
+
+class QueryCountMiddleware:
+    """
+    Adds X-DB-Query-Count and X-DB-Time-Ms headers to every response when DEBUG is on,
+    so N+1 query regressions are visible from any client.
+    Supports both sync and async requests, so async views stay async under ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not settings.DEBUG:
+            return self.get_response(request)
+
+        with QueryCounter() as counter:
+            response = self.get_response(request)
+        return self.add_headers(response, counter)
+
+    async def __acall__(self, request):
+        if not settings.DEBUG:
+            return await self.get_response(request)
+
+        # The ORM calls of an async request run in its thread-sensitive worker thread
+        # (asgiref), so the counter is installed there; gather_queries() threads are not counted
+        counter = QueryCounter()
+        await sync_to_async(counter.__enter__)()
+        try:
+            response = await self.get_response(request)
+        finally:
+            await sync_to_async(counter.__exit__)(None, None, None)
+        return self.add_headers(response, counter)
+
+    def add_headers(self, response, counter):
+        response['X-DB-Query-Count'] = str(counter.count)
+        response['X-DB-Time-Ms'] = f"{counter.duration * 1000:.2f}"
+        return response
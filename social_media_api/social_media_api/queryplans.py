@@ -0,0 +1,163 @@
+# social_media_api/queryplans.py
+"""
+Query plan checks for the hot endpoints.
+
+QueryPlanCapture records the statements the ORM runs while it is active;
+plan_problems() runs EXPLAIN on one of them and reports full table scans and
+sorts done outside an index (MySQL "Using filesort" / "Using temporary",
+SQLite "USE TEMP B-TREE"), the signs that no index matches a query's filter
+and ordering. Used by the query plan regression tests and by the
+explain_endpoints command, which checks the plans against a real database.
+"""
+import re
+from contextlib import ExitStack
+
+from django.db import connections
+
+EXPLAINED_STATEMENTS = ('SELECT', 'UPDATE', 'DELETE')
+
+# Hot read endpoints and the like toggle; {user}, {other}, {post} and {comment} are
+# filled in with a user, a user they follow, one of that user's posts and a top-level comment on it
+HOT_ENDPOINTS = [
+    ('get', '/api/posts/'),
+    ('get', '/api/posts/?include=engagement'),
+    ('get', '/api/posts/{post}/'),
+    ('get', '/api/posts/{post}/comments/'),
+    ('get', '/api/posts/comments/{comment}/replies/'),
+    ('get', '/api/posts/user/{other}/'),
+    ('get', '/api/posts/search/?q=django'),
+    ('get', '/api/follows/feed/'),
+    ('get', '/api/follows/feed/?include=engagement'),
+    ('get', '/api/follows/feed/?ranking=top'),
+    ('get', '/api/follows/following/{user}/'),
+    ('get', '/api/follows/followers/{other}/'),
+    ('get', '/api/notifications/'),
+    ('get', '/api/notifications/unread_count/'),
+    ('get', '/api/users/{other}/'),
+    ('post', '/api/posts/{post}/like/'),
+    ('post', '/api/posts/{post}/unlike/'),
+]
+
+# Queries that must sort whatever the indexes, and why
+ACCEPTED_SORTS = [
+    # Search ranks the matching posts by their score, summed over the query terms
+    re.compile(r'FROM [`"]?posts_postterm[`"]? .*GROUP BY', re.DOTALL),
+    # Feed ranking counts the reader's own likes / comments per author (cached, see follows/ranking.py)
+    re.compile(r'AS [`"]?interactions[`"]? FROM [`"]?posts_(like|comment)[`"]? .*GROUP BY', re.DOTALL),
+]
+
+SQLITE_READ = re.compile(r'^(SCAN|SEARCH) (\S+)( .*)?$') # "SCAN t USING [COVERING] INDEX i" walks an index
+SQLITE_DERIVED = re.compile(r'^(?:CO-ROUTINE|MATERIALIZE) (\S+)')
+SQLITE_SORT = re.compile(r'^USE TEMP B-TREE FOR (.*)$')
+
+
+class QueryPlanCapture:
+    """
+    Context manager that records (alias, sql, params) of every SELECT, UPDATE
+    and DELETE run on any database while it is active.
+    """
+    def __init__(self):
+        self.queries = []
+        self._stack = None
+
+    def __call__(self, execute, sql, params, many, context):
+        statement = sql.lstrip().split(None, 1)[0].upper()
+        if not many and statement in EXPLAINED_STATEMENTS:
+            self.queries.append((context['connection'].alias, sql, params))
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self._stack = ExitStack()
+        for connection in connections.all():
+            self._stack.enter_context(connection.execute_wrapper(self))
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._stack.close()
+        self._stack = None
+        return False
+
+
+def explain(alias, sql, params):
+    """
+    Returns the plan of a query as a list of dicts, one per step (MySQL: per
+    table, SQLite: per plan line, under 'detail').
+    """
+    connection = connections[alias]
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    with connection.cursor() as cursor:
+        cursor.execute(prefix + sql, params)
+        columns = [column[0] for column in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def plan_problems(alias, sql, params):
+    """
+    Returns a description of each full table scan or out-of-index sort in the
+    plan of a query (sorts of ACCEPTED_SORTS queries excepted).
+    """
+    vendor = connections[alias].vendor
+    check = {'sqlite': _sqlite_problems, 'mysql': _mysql_problems}.get(vendor)
+    if check is None:
+        return []
+    sorts = not any(pattern.search(sql) for pattern in ACCEPTED_SORTS)
+    return list(check(explain(alias, sql, params), sorts))
+
+
+def _mysql_problems(steps, sorts):
+    for step in steps:
+        table, extra = step.get('table') or '', step.get('Extra') or ''
+        if table.startswith('<'):
+            continue # Derived table or union result: already reduced rows
+        if step.get('type') == 'ALL':
+            yield f"full scan of {table}"
+        if sorts and ('Using filesort' in extra or 'Using temporary' in extra):
+            yield f"sort outside an index on {table} ({extra})"
+
+
+def _sqlite_problems(steps, sorts):
+    """
+    Subqueries (CO-ROUTINE / MATERIALIZE steps) hold already reduced rows:
+    scanning or sorting them is not a missing index, so sorts are only
+    reported at plan levels that read a real table.
+    """
+    derived = {match.group(1) for step in steps if (match := SQLITE_DERIVED.match(step['detail']))}
+    reads_table = set() # Plan levels (parent step IDs) that read a real table
+    for step in steps:
+        if match := SQLITE_READ.match(step['detail']):
+            operation, table, using = match.groups()
+            if table in derived or table.startswith('('):
+                continue
+            reads_table.add(step['parent'])
+            if operation == 'SCAN' and not using:
+                yield f"full scan of {table}"
+    for step in steps:
+        if sorts and step['parent'] in reads_table and (match := SQLITE_SORT.match(step['detail'])):
+            yield f"sort outside an index ({match.group(1).lower()})"
+
+
+def format_plan(alias, sql, params):
+    """
+    Returns the plan of a query as text, one step per line.
+    """
+    lines = []
+    for step in explain(alias, sql, params):
+        if 'detail' in step:
+            lines.append(step['detail'])
+        else:
+            lines.append(' '.join(f"{key}={value}" for key, value in step.items() if value is not None))
+    return '\n'.join(lines)
+
+
+def endpoint_plans(client, ids):
+    """
+    Requests every HOT_ENDPOINTS URL with `client` (an authenticated API test
+    client; `ids` fills in the URLs) and yields (method, url, alias, sql,
+    params, problems) for every statement each request ran.
+    """
+    for method, url in HOT_ENDPOINTS:
+        url = url.format(**ids)
+        with QueryPlanCapture() as capture:
+            getattr(client, method)(url)
+        for alias, sql, params in capture.queries:
+            yield method, url, alias, sql, params, plan_problems(alias, sql, params)
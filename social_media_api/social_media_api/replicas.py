@@ -0,0 +1,144 @@
+# social_media_api/replicas.py
+"""
+Read replica routing with read-your-writes stickiness.
+
+PrimaryReplicaRouter sends reads of the apps in REPLICA_ROUTED_APPS to one of
+the READ_REPLICAS and every write to the primary ('default'). Replicas lag
+behind the primary, so reads stay on the primary:
+- inside a transaction on the primary, where reads decide what gets written;
+- for the rest of a request once it has written anything;
+- for PRIMARY_STICKINESS_SECONDS after such a request, for requests of the same
+  client (same Authorization header or session cookie), so a user who just
+  posted, liked or followed sees it on their next page load;
+- inside use_primary() blocks: logins, and the loads that fill long-lived
+  caches (user cards, follow graph lists) right after an invalidation.
+Without READ_REPLICAS every query goes to the primary, as before.
+"""
+import hashlib
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_request = ContextVar('replica_routing_request', default=None) # RequestRouting of the current request
+_primary_only = ContextVar('replica_routing_primary_only', default=False)
+
+
+class RequestRouting:
+    """
+    Stickiness of one request. `client` is the cache key of the client (None
+    without credentials); `pinned` tells whether its reads go to the primary,
+    looked up in the cache on the first routed read.
+    """
+    __slots__ = ('client', 'pinned', 'wrote')
+
+    def __init__(self, client):
+        self.client = client
+        self.pinned = None
+        self.wrote = False
+
+
+def sticky_cache():
+    return caches[settings.PRIMARY_STICKINESS_CACHE]
+
+
+def client_key(request):
+    """
+    Returns the stickiness cache key of the request's client, None for anonymous clients.
+    """
+    credentials = request.headers.get('Authorization') or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not credentials:
+        return None
+    return 'primary-sticky:' + hashlib.sha256(credentials.encode()).hexdigest()
+
+
+def reads_pinned():
+    """
+    Returns True when the reads of the current request must go to the primary.
+    """
+    if _primary_only.get():
+        return True
+    routing = _request.get()
+    if routing is None:
+        return False
+    if routing.pinned is None:
+        routing.pinned = routing.client is not None and bool(sticky_cache().get(routing.client))
+    return routing.pinned
+
+
+@contextmanager
+def use_primary():
+    """
+    Sends the reads of the block to the primary, e.g. to authenticate a user
+    who may have registered a moment ago.
+    """
+    token = _primary_only.set(True)
+    try:
+        yield
+    finally:
+        _primary_only.reset(token)
+
+
+class PrimaryReplicaRouter:
+    """
+    Database router of DATABASE_ROUTERS (see the module docstring).
+    """
+    def db_for_read(self, model, **hints):
+        if not settings.READ_REPLICAS or model._meta.app_label not in settings.REPLICA_ROUTED_APPS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            return instance._state.db # Related objects come from where the instance came from
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block or reads_pinned():
+            return DEFAULT_DB_ALIAS
+        return random.choice(settings.READ_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        routing = _request.get()
+        if routing is not None:
+            routing.wrote = routing.pinned = True
+        return DEFAULT_DB_ALIAS
+
+
+class PrimaryStickinessMiddleware:
+    """
+    Tracks the stickiness of each request: once a request has written, its
+    client's reads stay on the primary for PRIMARY_STICKINESS_SECONDS.
+    Supports both sync and async requests.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        routing = RequestRouting(client_key(request))
+        token = _request.set(routing)
+        try:
+            return self.get_response(request)
+        finally:
+            _request.reset(token)
+            if self.must_remember(routing):
+                sticky_cache().set(routing.client, True, settings.PRIMARY_STICKINESS_SECONDS)
+
+    async def __acall__(self, request):
+        routing = RequestRouting(client_key(request))
+        token = _request.set(routing)
+        try:
+            return await self.get_response(request)
+        finally:
+            _request.reset(token)
+            if self.must_remember(routing):
+                await sticky_cache().aset(routing.client, True, settings.PRIMARY_STICKINESS_SECONDS)
+
+    def must_remember(self, routing):
+        return routing.wrote and routing.client is not None and bool(settings.READ_REPLICAS)
@@ -9,7 +9,7 @@ https://docs.djangoproject.com/en/4.2/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
-from decouple import config
+from decouple import config, Csv
 from pathlib import Path
 import os
 from pathlib import Path
@@ -27,7 +27,7 @@ SECRET_KEY = config('SECRET_KEY')
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = config('DEBUG', default=False, cast=bool)
 
-ALLOWED_HOSTS = ['http://127.0.0.1:8000/',]
+ALLOWED_HOSTS = config('ALLOWED_HOSTS', default='127.0.0.1,localhost', cast=Csv()) # Host names, not URLs
 
 
 # Application definition
@@ -44,11 +44,15 @@ INSTALLED_APPS = [
     'users', # Your users app
     'posts', # Posts app
     'follows', # Follows app
-    'notifications'
+    'notifications',
+    'assets', # Uploaded images and their resized variants
+    'loadtest', # Synthetic data generator and load driver (management commands only)
 ]
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'social_media_api.querycount.QueryCountMiddleware', # Query count / DB time headers when DEBUG is on
+    'social_media_api.replicas.PrimaryStickinessMiddleware', # Read-your-writes with read replicas
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -57,7 +61,12 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'social_media_api.urls'
+# The ASGI application (asgi.py) turns on ASYNC_READ_VIEWS: the feed, post detail and
+# notification list are then served by async views (social_media_api/asyncapi.py)
+ASYNC_READ_VIEWS = config('ASYNC_READ_VIEWS', default=False, cast=bool)
+ROOT_URLCONF = 'social_media_api.asgi_urls' if ASYNC_READ_VIEWS else 'social_media_api.urls'
+# Independent sub-queries of an async view run concurrently, each on its own connection
+ASYNC_PARALLEL_QUERIES = config('ASYNC_PARALLEL_QUERIES', default=True, cast=bool)
 
 TEMPLATES = [
     {
@@ -81,9 +90,14 @@ WSGI_APPLICATION = 'social_media_api.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/4.2/ref/settings/#databases
 
+# Connections come from a bounded per-process pool (social_media_api/pool.py) and go back
+# to it at the end of every request (CONN_MAX_AGE = 0). DB_POOL_SIZE=0 turns the pool off
+# and keeps Django's persistent connections instead
+DB_POOL_SIZE = config('DB_POOL_SIZE', default=20, cast=int)
+
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.mysql', # Changed to MySQL engine
+        'ENGINE': 'social_media_api.backends.mysql' if DB_POOL_SIZE else 'django.db.backends.mysql', # MySQL engine
         'NAME': config('DB_NAME'),       # Your MySQL database name
         'USER': config('DB_USER'),       # Your MySQL username
         'PASSWORD': config('DB_PASSWORD'), # Your MySQL password
@@ -91,10 +105,31 @@ DATABASES = {
         'PORT': '3306',                  # Default MySQL port
         'OPTIONS': {                     # Optional: for specific MySQL settings like character set
             'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
-        }
+        },
+        'CONN_MAX_AGE': 0 if DB_POOL_SIZE else 60, # Seconds a thread keeps its connection without a pool
+        'CONN_HEALTH_CHECKS': True, # Persistent connections are checked before each request reuses them
+        'POOL': {
+            'MAX_SIZE': DB_POOL_SIZE, # Connections per process
+            'TIMEOUT': config('DB_POOL_TIMEOUT', default=10, cast=float), # Seconds a checkout waits for a free connection
+            'MAX_IDLE': 300, # Seconds before an idle connection is closed
+            'MAX_LIFETIME': 3600, # Seconds before a connection is replaced (below MySQL's wait_timeout)
+            'RECHECK_AFTER': 1, # Idle seconds after which a checkout pings the connection first
+        },
     }
 }
 
+# Read replicas (see social_media_api/replicas.py)
+# DB_REPLICA_HOSTS lists the hosts of replicas of the database above, e.g. "10.0.0.2,10.0.0.3";
+# reads of the routed apps go to a random replica, writes and everything else to 'default'
+DB_REPLICA_HOSTS = config('DB_REPLICA_HOSTS', default='', cast=Csv())
+for number, host in enumerate(DB_REPLICA_HOSTS, start=1):
+    DATABASES[f'replica{number}'] = {**DATABASES['default'], 'HOST': host, 'TEST': {'MIRROR': 'default'}}
+READ_REPLICAS = [f'replica{number}' for number in range(1, len(DB_REPLICA_HOSTS) + 1)]
+REPLICA_ROUTED_APPS = {'posts', 'follows', 'notifications', 'users'}
+DATABASE_ROUTERS = ['social_media_api.replicas.PrimaryReplicaRouter']
+PRIMARY_STICKINESS_SECONDS = config('PRIMARY_STICKINESS_SECONDS', default=5, cast=int) # Longer than the replica lag
+PRIMARY_STICKINESS_CACHE = 'default' # Must be shared by all processes in production
+
 
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
@@ -134,6 +169,17 @@ STATIC_URL = 'static/'
 MEDIA_URL = '/media/' # For user uploaded files like profile pictures
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media') # Directory where media files will be stored
 
+# Uploaded images (see assets/). Uploads are stored as-is and deduplicated by
+# content hash; the process_media worker renders these JPEG variants (longest side in pixels).
+MEDIA_VARIANTS = {
+    'thumbnail': 320,
+    'preview': 1280,
+}
+MEDIA_VARIANT_QUALITY = 85
+MEDIA_MAX_UPLOAD_SIZE = 10 * 1024 * 1024 # Bytes
+MEDIA_MAX_PIXELS = 50_000_000 # Larger images are rejected by the worker (decompression bombs)
+MEDIA_CLAIM_TIMEOUT = 10 * 60 # Seconds before an asset claimed by a crashed worker is retried
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
@@ -146,7 +192,7 @@ AUTH_USER_MODEL = 'users.CustomUser' # Points to your custom user model in the '
 # Django REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication', # Use Token Authentication
+        'users.authentication.CachedTokenAuthentication', # Token Authentication, cached (see users/authentication.py)
         'rest_framework.authentication.SessionAuthentication', # Optional, good for browsable API
     ],
     'DEFAULT_PERMISSION_CLASSES': [
@@ -155,3 +201,60 @@ REST_FRAMEWORK = {
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10, # Default page size for pagination
 }
+
+# Home feed (see follows/feed.py)
+# Posts are fanned out into each follower's FeedEntry inbox when they are created.
+# Authors with more followers than FEED_FANOUT_MAX_FOLLOWERS are switched to
+# fan-out-on-read: their posts are pulled and merged into the feed at read time.
+FEED_FANOUT_MAX_FOLLOWERS = config('FEED_FANOUT_MAX_FOLLOWERS', default=5000, cast=int)
+FEED_FANOUT_BATCH_SIZE = 1000 # Rows per bulk insert when filling inboxes
+FEED_BACKFILL_POSTS = 100 # Recent posts copied into an inbox on a new follow
+
+# Engagement-ranked feed, ?ranking=top (see follows/ranking.py)
+FEED_RANKING_CANDIDATES = config('FEED_RANKING_CANDIDATES', default=1000, cast=int) # Recent feed posts scored per ranking
+FEED_RANKING_HALF_LIFE = 12 # Hours after which recency halves a post's score
+FEED_RANKING_SNAPSHOT_TTL = 10 * 60 # Seconds a ranking is kept for its next pages
+FEED_RANKING_AFFINITY_TTL = 60 * 60 # Seconds a reader's author affinities are cached
+
+# Comment threads (see posts/comments.py)
+COMMENT_MAX_DEPTH = 8 # Deepest reply level; replies to comments at this depth are refused
+
+# Cache
+# Local memory by default; point 'default' at a shared backend (Redis, Memcached) in production
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'social-media-api',
+    }
+}
+
+# Authentication tokens (see users/authentication.py)
+AUTH_TOKEN_CACHE = 'default' # Shared by all processes in production
+AUTH_TOKEN_CACHE_TTL = 5 * 60 # Seconds
+AUTH_TOKEN_LOCAL_SIZE = 10000 # Tokens kept in each process's LRU
+AUTH_TOKEN_LOCAL_TTL = 5 # Seconds a process reuses a token; revocations reach other processes within this delay
+
+# Public user cards embedded in every payload (see users/cards.py)
+USER_CARD_CACHE = 'default'
+USER_CARD_TTL = 60 * 60 # Seconds
+
+# In-memory follow graph (see follows/graph.py)
+FOLLOW_GRAPH_CACHE = 'default' # Holds the version stamps shared by all processes
+FOLLOW_GRAPH_TTL = 5 * 60 # Seconds before an adjacency list is reloaded even if unchanged
+FOLLOW_GRAPH_MAX_ENTRIES = 100_000 # Adjacency lists kept per process
+
+# Post search (see posts/search.py); any subclass of posts.search.BaseSearchBackend
+POST_SEARCH_BACKEND = 'posts.search.InvertedIndexBackend'
+
+# Notification stream (see notifications/stream.py)
+# PollingBroker also wakes streams for notifications delivered by the worker process;
+# LocalBroker only for those delivered in the serving process
+NOTIFICATION_BROKER = 'notifications.stream.PollingBroker'
+NOTIFICATION_STREAM_POLL_INTERVAL = 1 # Seconds between checks for new notifications
+NOTIFICATION_STREAM_HEARTBEAT = 15 # Seconds of silence before a keep-alive comment
+NOTIFICATION_STREAM_RETRY = 3000 # Milliseconds EventSource waits before reconnecting
+NOTIFICATION_STREAM_OVERLAP = 5 # Seconds streams look back for notifications that committed after newer ones
+
+# Read notifications older than this are deleted by the purge_notifications command
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+
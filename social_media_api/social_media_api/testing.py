@@ -0,0 +1,123 @@
+# social_media_api/testing.py
+"""
+Shared fixtures for the per-app test suites.
+"""
+from contextlib import contextmanager
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from follows.feed import pull_authors
+from follows.graph import follow_graph
+from follows.models import Follow
+from notifications.models import Notification
+from posts.counters import recount_counters
+from posts.models import Post, Like, Comment
+from users.authentication import local_tokens
+from users.cards import get_cards
+from users.models import CustomUser
+from .querycount import QueryCounter
+
+
+def seed_social_data(users=6, posts_per_user=12, password='Str0ng-pass!'):
+    """
+    Creates a small but realistic social graph: every user follows the next
+    three users, posts a dozen times, and likes / comments on the posts of the
+    users they follow. Notifications are created for the follows, likes and comments.
+    Returns the list of users in creation order.
+    """
+    people = [
+        CustomUser.objects.create_user(username=f'user{i}', email=f'user{i}@example.com', password=password)
+        for i in range(users)
+    ]
+    for person in people:
+        Token.objects.create(user=person)
+
+    follows, posts = [], []
+    for i, person in enumerate(people):
+        for offset in range(1, 4):
+            follows.append(Follow(follower=person, following=people[(i + offset) % users]))
+        for n in range(posts_per_user):
+            posts.append(Post(user=person, content=f"Post {n} by {person.username} about #django and #python"))
+    Follow.objects.bulk_create(follows)
+    Post.objects.bulk_create(posts)
+
+    likes, comments, notifications = [], [], []
+    for follow in follows:
+        notifications.append(Notification(
+            recipient=follow.following, sender=follow.follower, type='follow',
+            message=f"{follow.follower.username} started following you.",
+        ))
+        for post in Post.objects.filter(user=follow.following)[:4]:
+            likes.append(Like(user=follow.follower, post=post))
+            comments.append(Comment(user=follow.follower, post=post, content=f"Nice one, {post.user.username}!"))
+            notifications.append(Notification(
+                recipient=post.user, sender=follow.follower, post=post, type='like',
+                message=f"{follow.follower.username} liked your post.",
+            ))
+    Like.objects.bulk_create(likes)
+    Comment.objects.bulk_create(comments)
+    Notification.objects.bulk_create(notifications)
+
+    recount_counters(Post.objects.all())
+    call_command('rebuild_feeds', stdout=StringIO())
+    call_command('reindex_posts', stdout=StringIO())
+    return people
+
+
+# Serves requests through the ASGI URLconf (async read views). Sub-queries run on the
+# test's own connection: data created by a TestCase is not visible to other connections
+async_read_views = override_settings(ROOT_URLCONF='social_media_api.asgi_urls', ASYNC_PARALLEL_QUERIES=False)
+
+
+class QueryBudgetTestCase(APITestCase):
+    """
+    Base class for route tests that assert a fixed SQL query budget.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = seed_social_data()
+        cls.user = cls.users[0]
+
+    def setUp(self):
+        cache.clear() # Cached user cards must not leak between tests
+        local_tokens.clear() # Nor users cached by token lookups
+        # Budgets measure the steady state: user cards and the follow graph are warm
+        get_cards(user.pk for user in self.users)
+        follow_graph.counts([user.pk for user in self.users])
+        pull_authors()
+        self.authenticate(self.user)
+
+    def authenticate(self, user):
+        """
+        Authenticates the test client with the user's token, like a real API client.
+        """
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {user.auth_token.key}')
+
+    def assertMatchesSync(self, url, **extra):
+        """
+        Fetches `url` from the current URLconf and from the DRF views, and fails
+        unless both return the same status, JSON body and ETag. Returns the response.
+        """
+        response = self.client.get(url, **extra)
+        with self.settings(ROOT_URLCONF='social_media_api.urls'):
+            expected = self.client.get(url, **extra)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response.get('ETag'), expected.get('ETag'))
+        return response
+
+    @contextmanager
+    def assertQueryBudget(self, budget):
+        """
+        Fails if the block runs more than `budget` SQL queries.
+        """
+        with QueryCounter() as counter:
+            yield counter
+        if counter.count > budget:
+            queries = '\n'.join(f'  {sql}' for sql in counter.queries)
+            self.fail(f"Query budget exceeded: {counter.count} queries run, budget is {budget}.\n{queries}")
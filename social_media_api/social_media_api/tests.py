@@ -0,0 +1,307 @@
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+import database
+from posts.models import Comment, Post
+from rest_framework.authtoken.models import Token
+from users.models import CustomUser
+from . import asgi
+from .backends.sqlite3.base import DatabaseWrapper as PooledSQLiteWrapper
+from .pool import ConnectionPool, PoolTimeout
+from .querycount import QueryCounter
+from .queryplans import QueryPlanCapture, endpoint_plans, format_plan, plan_problems
+from .replicas import PrimaryReplicaRouter
+from .testing import QueryBudgetTestCase, seed_social_data
+
+
+class QueryCounterTests(TestCase):
+    def test_counts_queries_and_time(self):
+        with QueryCounter() as counter:
+            list(CustomUser.objects.all())
+            Post.objects.count()
+        self.assertEqual(counter.count, 2)
+        self.assertEqual(len(counter.queries), 2)
+        self.assertGreater(counter.duration, 0)
+
+
+class QueryCountMiddlewareTests(TestCase):
+    @override_settings(DEBUG=True)
+    def test_headers_in_debug_mode(self):
+        response = self.client.get('/api/posts/')
+        self.assertEqual(response['X-DB-Query-Count'], '1')
+        self.assertIn('X-DB-Time-Ms', response)
+
+    @override_settings(DEBUG=False)
+    def test_no_headers_without_debug(self):
+        response = self.client.get('/api/posts/')
+        self.assertNotIn('X-DB-Query-Count', response)
+
+
+@override_settings(ROOT_URLCONF='social_media_api.asgi_urls', ASYNC_PARALLEL_QUERIES=True)
+class ParallelQueryTests(TransactionTestCase):
+    """
+    Sub-queries of async views run concurrently on connections of their own
+    (committed data only, hence a TransactionTestCase) and give the same results.
+    """
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_feed_and_post_with_engagement(self):
+        user = seed_social_data()[0]
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {user.auth_token.key}')
+        post = Post.objects.exclude(user=user).filter(likes__user=user).first()
+
+        for url in ['/api/follows/feed/?include=engagement', f'/api/posts/{post.pk}/?include=engagement']:
+            response = client.get(url)
+            with self.settings(ROOT_URLCONF='social_media_api.urls'):
+                expected = client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json(), expected.json())
+        self.assertTrue(response.json()['liked_by_me'])
+
+
+class ASGIApplicationTests(TestCase):
+    """
+    The ASGI application hands streams to StreamHandler and everything else to Django's handler.
+    """
+    def dispatch(self, path):
+        with mock.patch.object(asgi, 'stream_application', mock.AsyncMock()) as streams, \
+                mock.patch.object(asgi, 'django_application', mock.AsyncMock()) as requests:
+            async_to_sync(asgi.application)({'type': 'http', 'path': path}, None, None)
+        return streams.called, requests.called
+
+    def test_streams_use_the_stream_handler(self):
+        self.assertEqual(self.dispatch('/api/notifications/stream/'), (True, False))
+        self.assertEqual(self.dispatch('/api/notifications/'), (False, True))
+
+
+@override_settings(READ_REPLICAS=['replica'])
+class ReplicaRoutingTests(TransactionTestCase):
+    """
+    A second SQLite database stands in for a read replica. It has the schema
+    but replication never happens, so reads served by it miss every new row.
+    """
+    databases = '__all__' # Includes the replica, registered below after the test databases were set up
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        connections.settings['replica'] = connections.configure_settings({
+            'default': connections.settings['default'],
+            'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(cls.replica_dir.name, 'replica.sqlite3')},
+        })['replica']
+        call_command('migrate', database='replica', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        connections['replica'].close()
+        del connections['replica']
+        del connections.settings['replica']
+        cls.replica_dir.cleanup()
+
+    def setUp(self):
+        cache.clear() # Stickiness marks live in the cache
+        self.addCleanup(cache.clear)
+        self.users = [
+            CustomUser.objects.create_user(username=f'reader{i}', email=f'reader{i}@example.com', password='Str0ng-pass!')
+            for i in range(2)
+        ]
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=user).key}')
+        return client
+
+    def test_reads_go_to_the_replica_and_writes_to_the_primary(self):
+        router = PrimaryReplicaRouter()
+        self.assertEqual(router.db_for_read(Post), 'replica')
+        self.assertEqual(router.db_for_write(Post), 'default')
+        self.assertIsNone(router.db_for_read(Token)) # Not a routed app
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Post), 'default')
+
+        post = Post.objects.create(user=self.users[0], content="Only on the primary")
+        self.assertEqual(self.client_for(self.users[1]).get(f'/api/posts/{post.pk}/').status_code, 404)
+
+    def test_client_reads_its_own_writes(self):
+        author, reader = self.client_for(self.users[0]), self.client_for(self.users[1])
+        post_id = author.post('/api/posts/', {'content': "Fresh post"}).json()['id']
+
+        self.assertEqual(author.get(f'/api/posts/{post_id}/').status_code, 200) # Sticks to the primary
+        self.assertEqual(reader.get(f'/api/posts/{post_id}/').status_code, 404) # Replica has not caught up
+        cache.clear() # The stickiness window is over
+        self.assertEqual(author.get(f'/api/posts/{post_id}/').status_code, 404)
+
+    def test_login_reads_the_primary(self):
+        response = APIClient().post('/api/users/login/', {'username': 'reader0', 'password': 'Str0ng-pass!'})
+        self.assertEqual(response.status_code, 200)
+
+
+class ConnectionPoolTests(SimpleTestCase):
+    """
+    Pools of SQLite connections to a temporary database file.
+    """
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'pool.sqlite3')
+        self.enterContext(mock.patch.dict('social_media_api.pool._pools')) # Pools created here stay here
+
+    def make_pool(self, **options):
+        pool = ConnectionPool(lambda: sqlite3.connect(self.path, check_same_thread=False), name='test', **options)
+        self.addCleanup(pool.close)
+        return pool
+
+    def make_wrapper(self):
+        """
+        Returns a pooled SQLite database wrapper, like Django creates for ENGINE 'social_media_api.backends.sqlite3'.
+        """
+        settings_dict = connections.configure_settings({
+            'default': connections.settings['default'],
+            'pooled': {'ENGINE': 'social_media_api.backends.sqlite3', 'NAME': self.path, 'POOL': {'MAX_SIZE': 2}},
+        })['pooled']
+        wrapper = PooledSQLiteWrapper(settings_dict, alias='pooled')
+        self.addCleanup(lambda: wrapper.pool.close())
+        return wrapper
+
+    def test_connections_are_reused(self):
+        pool = self.make_pool(max_size=2)
+        first = pool.acquire()
+        pool.release(first)
+        self.assertIs(pool.acquire(), first)
+        stats = pool.stats()
+        self.assertEqual(
+            (stats['opened'], stats['checkouts'], stats['in_use'], stats['idle'], stats['utilization']),
+            (1, 2, 1, 0, 0.5),
+        )
+
+    def test_checkout_waits_for_a_free_connection_then_times_out(self):
+        pool = self.make_pool(max_size=1, timeout=0.05)
+        held = pool.acquire()
+        with self.assertRaises(PoolTimeout):
+            pool.acquire()
+
+        pool.timeout = 5
+        threading.Timer(0.05, pool.release, [held]).start()
+        self.assertIs(pool.acquire(), held)
+        stats = pool.stats()
+        self.assertEqual((stats['timeouts'], stats['waits'], stats['opened']), (1, 1, 1))
+        self.assertGreater(stats['wait_ms_max'], 0)
+
+    def test_dead_connections_are_replaced_on_checkout(self):
+        pool = self.make_pool(recheck_after=0)
+        dead = pool.acquire()
+        pool.release(dead)
+        dead.close()
+        fresh = pool.acquire()
+        self.assertIsNot(fresh, dead)
+        fresh.execute('SELECT 1')
+        self.assertEqual(pool.stats()['failed_checks'], 1)
+
+    def test_idle_and_old_connections_are_closed(self):
+        pool = self.make_pool(max_idle=0.01)
+        first = pool.acquire()
+        pool.release(first)
+        time.sleep(0.02)
+        self.assertIsNot(pool.acquire(), first)
+
+        pool = self.make_pool(max_lifetime=0)
+        first = pool.acquire()
+        pool.release(first)
+        self.assertEqual((pool.stats()['open'], pool.stats()['closed']), (0, 1))
+
+    def test_django_connections_go_back_to_the_pool(self):
+        wrapper = self.make_wrapper()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        raw = wrapper.connection
+        wrapper.close()
+        self.assertEqual(wrapper.pool.stats()['idle'], 1)
+
+        wrapper.ensure_connection()
+        self.assertIs(wrapper.connection, raw)
+        wrapper.set_autocommit(False) # The next user must not inherit an open transaction
+        wrapper.close()
+        self.assertEqual((wrapper.pool.stats()['open'], wrapper.pool.stats()['closed']), (0, 1))
+
+    def test_raw_sql_block_that_raises_leaves_no_rows(self):
+        wrapper = self.make_wrapper()
+        with wrapper.cursor() as cursor: # Used by Django first, so back in the pool in autocommit mode
+            cursor.execute('CREATE TABLE notes (body TEXT)')
+        wrapper.close()
+        with mock.patch.object(database, 'connections', {'pooled': wrapper}):
+            with self.assertRaises(ValueError):
+                with database.connection('pooled') as raw:
+                    raw.execute("INSERT INTO notes VALUES ('lost')")
+                    raise ValueError
+            self.assertEqual(database.fetch_all('SELECT COUNT(*) FROM notes', alias='pooled'), [(0,)])
+            database.execute("INSERT INTO notes VALUES ('kept')", alias='pooled')
+            wrapper.ensure_connection() # Django gets the connection back in autocommit mode
+            self.assertIsNone(wrapper.connection.isolation_level)
+            wrapper.close()
+
+    def test_raw_sql_helpers_share_the_pool(self):
+        wrapper = self.make_wrapper()
+        with mock.patch.object(database, 'connections', {'pooled': wrapper}):
+            database.execute('CREATE TABLE notes (body TEXT)', alias='pooled')
+            self.assertEqual(database.execute('INSERT INTO notes VALUES (?), (?)', ['a', 'b'], alias='pooled'), 2)
+            self.assertEqual(database.fetch_all('SELECT body FROM notes ORDER BY body', alias='pooled'), [('a',), ('b',)])
+        stats = wrapper.pool.stats()
+        self.assertEqual((stats['opened'], stats['checkouts'], stats['in_use']), (1, 3, 0))
+
+
+class RawSQLTests(TestCase):
+    """
+    Without a pool, the raw SQL helpers run on the thread's Django connection, in a transaction of their own.
+    """
+    def test_block_that_raises_leaves_no_rows(self):
+        with self.assertRaises(ValueError):
+            with database.connection() as raw:
+                raw.execute("INSERT INTO notifications_notificationstate (user_id, unread_count, read_through, updated_at) "
+                            "VALUES (%s, 0, 0, '2026-01-01')" % CustomUser.objects.create(username='raw').pk)
+                raise ValueError
+        self.assertEqual(database.fetch_all('SELECT COUNT(*) FROM notifications_notificationstate'), [(0,)])
+
+
+class QueryPlanTests(QueryBudgetTestCase):
+    """
+    Every statement of the hot endpoints must be served by an index: no full
+    table scan and no sort outside an index (see social_media_api/queryplans.py).
+    """
+    def test_hot_endpoints_use_indexes(self):
+        cache.clear() # Include the queries run on cache misses
+        other = self.users[1]
+        post = Post.objects.filter(user=other).first()
+        comment = Comment.objects.filter(post=post, thread__isnull=True).first()
+        Comment.objects.create(user=self.user, post=post, parent=comment, thread=comment, depth=1, content='Reply')
+        ids = {'user': self.user.pk, 'other': other.pk, 'post': post.pk, 'comment': comment.pk}
+        failures = [
+            f"{method.upper()} {url}: {', '.join(problems)}\n  {sql}\n  {format_plan(alias, sql, params)}"
+            for method, url, alias, sql, params, problems in endpoint_plans(self.client, ids) if problems
+        ]
+        self.assertFalse(failures, '\n'.join(failures))
+
+    def test_reports_full_scans_and_sorts(self):
+        with QueryPlanCapture() as capture:
+            list(Post.objects.filter(content='Post 1').order_by())
+            list(Post.objects.filter(user=self.user).order_by('content')[:5])
+            list(Post.objects.filter(user=self.user).order_by('-timestamp', '-id')[:5])
+        scan, sort, indexed = [plan_problems(*query) for query in capture.queries]
+        self.assertTrue(any('full scan' in problem for problem in scan))
+        self.assertTrue(any('sort' in problem for problem in sort))
+        self.assertEqual(indexed, [])
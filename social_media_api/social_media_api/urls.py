@@ -22,7 +22,7 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
-from .views import home
+from .views import home, metrics_view
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -30,6 +30,7 @@ urlpatterns = [
     path('api/posts/', include('posts.urls')), # Include posts app URLs
     path('api/follows/', include('follows.urls')), # Include follows app URLs
     path('api/notifications/', include('notifications.urls')), # NEW: Include notifications app URLs
+    path('api/metrics/', metrics_view, name='metrics'), # Staff-only runtime metrics
     path('', home, name='home'),
 ]
 
@@ -1,4 +1,18 @@
 from django.http import HttpResponse
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import metrics
 
 def home(request):
-    return HttpResponse("🚀 Welcome to the Social Media API")
\ No newline at end of file
+    return HttpResponse("🚀 Welcome to the Social Media API")
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """
+    Runtime metrics of this process (cache hit rates, pools, ...). Staff only.
+    """
+    return Response(metrics.snapshot())
\ No newline at end of file
@@ -3,7 +3,8 @@ from django.contrib import admin
 
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import CustomUser
+from .authentication import revoke_user_tokens
+from .models import AccountDeletion, CustomUser
 
 @admin.register(CustomUser)
 class CustomUserAdmin(UserAdmin):
@@ -20,6 +21,20 @@ class CustomUserAdmin(UserAdmin):
     )
     list_display = UserAdmin.list_display + ('bio',) # Add 'bio' to list display
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        revoke_user_tokens(obj.pk) # Changes (e.g. is_active, is_staff) apply to cached token lookups at once
+
+
+@admin.register(AccountDeletion)
+class AccountDeletionAdmin(admin.ModelAdmin):
+    """
+    Progress of the background purges of deleted accounts (read-only).
+    """
+    list_display = ('username', 'user_id', 'stage', 'requested_at', 'finished_at')
+    list_filter = ('stage',)
+    readonly_fields = ('user_id', 'username', 'stage', 'deleted_rows', 'requested_at', 'updated_at', 'finished_at')
+
 
 # ----------------------------------------------------------------------------------
 # NEW APP: Posts
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from social_media_api import metrics
+        from .authentication import token_stats
+        from .cards import card_stats
+        metrics.register('user_cards', card_stats)
+        metrics.register('auth_tokens', token_stats)
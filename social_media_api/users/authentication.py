@@ -0,0 +1,224 @@
+# users/authentication.py
+"""
+Cached token authentication.
+
+rest_framework's TokenAuthentication joins authtoken_token and
+users_customuser on every request. CachedTokenAuthentication reads tokens
+through two cache tiers instead, and only queries the database on a miss:
+- a bounded LRU in each process (AUTH_TOKEN_LOCAL_SIZE tokens), whose
+  entries are reused for at most AUTH_TOKEN_LOCAL_TTL seconds;
+- the shared Django cache AUTH_TOKEN_CACHE, for AUTH_TOKEN_CACHE_TTL seconds.
+
+Entries hold the token's creation time and the user's field values (never the
+password hash); every request gets its own user instance built from them.
+Cache keys hash the token, so they never reveal it.
+
+Each user has a generation stamp in the shared cache, and every entry records
+the stamp it was read under. revoke_user_tokens() moves the stamp on, so all
+of the user's shared entries stop matching, including one written by a lookup
+that read the database before the revocation committed; it also drops the
+user's entries from this process's LRU. A stamp evicted from the cache is
+replaced by a new unique value, so entries never match again after an
+eviction either. It is called on logout, account deletion, profile changes
+and admin saves. Other processes stop using their local copy within
+AUTH_TOKEN_LOCAL_TTL seconds. Changes made elsewhere (e.g. in the shell) are
+picked up within AUTH_TOKEN_CACHE_TTL seconds.
+"""
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+from social_media_api.replicas import use_primary
+from .models import CustomUser
+
+USER_FIELDS = tuple(field.attname for field in CustomUser._meta.concrete_fields if field.attname != 'password')
+TOKEN_FIELDS = ('key', 'user_id', 'created')
+# Keys change with the user fields, so entries of another layout are never read
+ENTRY_VERSION = hashlib.sha256(' '.join(USER_FIELDS).encode()).hexdigest()[:8]
+
+_stats_lock = threading.Lock()
+_stats = {'local_hits': 0, 'shared_hits': 0, 'misses': 0}
+
+
+def _cache():
+    return caches[settings.AUTH_TOKEN_CACHE]
+
+
+def token_key(key):
+    return f'authtoken:{ENTRY_VERSION}:{hashlib.sha256(key.encode()).hexdigest()[:32]}'
+
+
+def generation_key(user_id):
+    return f'authtoken:{ENTRY_VERSION}:generation:{user_id}'
+
+
+def _generation(user_id):
+    """
+    Returns the current generation stamp of a user's token entries, creating it if missing.
+    """
+    cache = _cache()
+    key = generation_key(user_id)
+    generation = cache.get(key)
+    if generation is None:
+        cache.add(key, time.time_ns(), timeout=None) # Unique, so entries stamped before an eviction never match
+        generation = cache.get(key)
+    return generation
+
+
+def _record(outcome):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+
+class LocalTokenCache:
+    """
+    Thread-safe LRU of token entries, (user_id, created, user values, generation)
+    keyed by token_key(), each reused for at most AUTH_TOKEN_LOCAL_TTL seconds.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict() # token_key -> (entry, expires_at), least recently used first
+
+    def get(self, cache_key):
+        now = time.monotonic()
+        with self._lock:
+            item = self._entries.get(cache_key)
+            if item is None:
+                return None
+            entry, expires_at = item
+            if expires_at <= now:
+                del self._entries[cache_key]
+                return None
+            self._entries.move_to_end(cache_key)
+            return entry
+
+    def set(self, cache_key, entry):
+        if settings.AUTH_TOKEN_LOCAL_TTL <= 0:
+            return
+        with self._lock:
+            self._entries[cache_key] = (entry, time.monotonic() + settings.AUTH_TOKEN_LOCAL_TTL)
+            self._entries.move_to_end(cache_key)
+            while len(self._entries) > settings.AUTH_TOKEN_LOCAL_SIZE:
+                self._entries.popitem(last=False)
+
+    def discard_user(self, user_id):
+        with self._lock:
+            stale = [cache_key for cache_key, (entry, _) in self._entries.items() if entry[0] == user_id]
+            for cache_key in stale:
+                del self._entries[cache_key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_tokens = LocalTokenCache()
+
+
+def _load_entry(key):
+    """
+    Reads a token and its user from the database; returns their cache entry, or None for an unknown token.
+    """
+    with use_primary(): # Never cache a user from a lagging replica; new tokens may not be there yet
+        token = Token.objects.select_related('user').filter(key=key).first()
+    if token is None:
+        return None
+    generation = _generation(token.user_id) # Read after the token: a revocation from now on moves it past this entry
+    return token.user_id, token.created, tuple(getattr(token.user, attname) for attname in USER_FIELDS), generation
+
+
+def _build(key, entry):
+    user_id, created, values, _ = entry
+    user = CustomUser.from_db(DEFAULT_DB_ALIAS, USER_FIELDS, values) # password is deferred
+    token = Token.from_db(DEFAULT_DB_ALIAS, TOKEN_FIELDS, (key, user_id, created))
+    token.user = user
+    return user, token
+
+
+def get_local_token_user(key):
+    """
+    Returns (user, token) from this process's LRU only, or None. Never blocks, for async code.
+    """
+    entry = local_tokens.get(token_key(key))
+    if entry is None:
+        return None
+    _record('local_hits')
+    return _build(key, entry)
+
+
+def get_token_user(key):
+    """
+    Returns (user, token) for a token key, or None when no such token exists.
+    """
+    cache_key = token_key(key)
+    entry = local_tokens.get(cache_key)
+    if entry is not None:
+        _record('local_hits')
+        return _build(key, entry)
+
+    entry = _cache().get(cache_key)
+    if entry is not None and entry[3] == _cache().get(generation_key(entry[0])):
+        _record('shared_hits')
+    else: # Missing, or stamped before a revocation
+        _record('misses')
+        entry = _load_entry(key)
+        if entry is None:
+            return None
+        _cache().set(cache_key, entry, timeout=settings.AUTH_TOKEN_CACHE_TTL)
+        if _cache().get(generation_key(entry[0])) != entry[3]:
+            return _build(key, entry) # Revoked meanwhile: the shared entry is already stale, keep none here
+    local_tokens.set(cache_key, entry)
+    return _build(key, entry)
+
+
+def revoke_user_tokens(user_id):
+    """
+    Invalidates the cached token entries of a user, in the shared cache and this process.
+    """
+    cache = _cache()
+    try:
+        cache.incr(generation_key(user_id))
+    except ValueError: # No stamp: entries stamped with an evicted one must not match a new stamp either
+        cache.set(generation_key(user_id), time.time_ns(), timeout=None)
+    local_tokens.discard_user(user_id)
+
+
+def token_stats():
+    """
+    Returns lookup counters of this process since startup.
+    """
+    with _stats_lock:
+        stats = dict(_stats)
+    lookups = sum(stats.values())
+    hits = stats['local_hits'] + stats['shared_hits']
+    return {
+        **stats,
+        'hit_ratio': round(hits / lookups, 4) if lookups else None,
+        'local_size': len(local_tokens),
+    }
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    Drop-in replacement for TokenAuthentication reading tokens through the caches above.
+    """
+    def authenticate_credentials(self, key):
+        found = get_token_user(key)
+        if found is None:
+            raise exceptions.AuthenticationFailed(_('Invalid token.'))
+        user, token = found
+        if not user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return user, token
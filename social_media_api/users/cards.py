@@ -0,0 +1,213 @@
+# users/cards.py
+"""
+Shared cache of public user cards ({id, username, profile_picture}).
+
+Cards are embedded in every post, comment, like, follow and notification
+payload. Serializers resolve them through UserCardField, and list serializers
+using UserCardListSerializer fetch every card of a page with one cache
+multi-get; only the misses are loaded from the database, in one query.
+Keys carry CARD_VERSION, so changing the card layout never serves old entries.
+"""
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import models
+from rest_framework import serializers
+
+from social_media_api.replicas import use_primary
+from .models import CustomUser
+
+CARD_VERSION = 2
+CARD_FIELDS = ('id', 'username', 'profile_picture', 'avatar_asset__status', 'avatar_asset__variants')
+AVATAR_VARIANT = 'thumbnail'
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0}
+
+
+def _cache():
+    return caches[settings.USER_CARD_CACHE]
+
+
+def card_key(user_id):
+    return f'usercard:v{CARD_VERSION}:{user_id}'
+
+
+def build_card(user):
+    """
+    Returns the cacheable card of a user. profile_picture is stored as the
+    storage-relative name and turned into a URL when serialized; once the
+    upload is processed it is the small avatar variant instead of the original.
+    """
+    picture = user.profile_picture.name or None
+    asset = user.avatar_asset if user.avatar_asset_id is not None else None
+    if picture and asset is not None and asset.status == asset.READY:
+        picture = asset.variants.get(AVATAR_VARIANT, picture)
+    return {
+        'id': user.pk,
+        'username': user.username,
+        'profile_picture': picture,
+    }
+
+
+def _record(hits, misses):
+    with _stats_lock:
+        _stats['hits'] += hits
+        _stats['misses'] += misses
+
+
+def get_cards(user_ids):
+    """
+    Returns {user_id: card} for the given IDs with one cache multi-get,
+    loading and caching any misses with a single query.
+    """
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return {}
+
+    cache = _cache()
+    cached = cache.get_many([card_key(user_id) for user_id in user_ids])
+    cards = {card['id']: card for card in cached.values()}
+
+    missing = user_ids - cards.keys()
+    _record(hits=len(cards), misses=len(missing))
+    if missing:
+        with use_primary(): # Cards are cached for USER_CARD_TTL: never fill them from a lagging replica
+            users = list(CustomUser.objects.filter(pk__in=missing).select_related('avatar_asset').only(*CARD_FIELDS))
+        loaded = {user.pk: build_card(user) for user in users}
+        cache.set_many({card_key(user_id): card for user_id, card in loaded.items()}, timeout=settings.USER_CARD_TTL)
+        cards.update(loaded)
+    return cards
+
+
+def card_versions(user_ids):
+    """
+    Returns a hashable snapshot of the given users' cards, for use in ETags.
+    """
+    return tuple(sorted(
+        (user_id, card['username'], card['profile_picture']) for user_id, card in get_cards(user_ids).items()
+    ))
+
+
+def refresh_card(user):
+    """
+    Replaces the cached card of a user after their profile changed.
+    """
+    _cache().set(card_key(user.pk), build_card(user), timeout=settings.USER_CARD_TTL)
+
+
+def invalidate_card(user_id):
+    """
+    Drops the cached card of a user.
+    """
+    _cache().delete(card_key(user_id))
+
+
+def card_stats():
+    """
+    Returns hit/miss counters of this process since startup.
+    """
+    with _stats_lock:
+        hits, misses = _stats['hits'], _stats['misses']
+    lookups = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / lookups, 4) if lookups else None,
+    }
+
+
+class UserCardField(serializers.Field):
+    """
+    Read-only field rendering a user ID (e.g. source='user_id') as a cached user card.
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, user_id):
+        return render_card(user_id, self.context)
+
+
+def render_card(user_id, context):
+    """
+    Returns the card of a user as rendered in API responses, using the cards
+    already loaded into the serializer context when possible.
+    """
+    cards = context.get('user_cards')
+    if cards is None or user_id not in cards:
+        cards = get_cards([user_id])
+    card = cards.get(user_id)
+    if card is None:
+        return None
+
+    card = dict(card)
+    if card['profile_picture']:
+        url = CustomUser._meta.get_field('profile_picture').storage.url(card['profile_picture'])
+        request = context.get('request')
+        card['profile_picture'] = request.build_absolute_uri(url) if request is not None else url
+    return card
+
+
+def collect_user_ids(serializer, instance):
+    """
+    Returns the IDs of every user card rendered by `serializer` for `instance`,
+    including cards of nested (single object) serializers.
+    """
+    user_ids = set()
+    for field in serializer.fields.values():
+        if field.write_only:
+            continue
+        if isinstance(field, UserCardField):
+            user_ids.add(getattr(instance, field.source, None))
+        elif isinstance(field, serializers.Serializer):
+            nested = getattr(instance, field.source, None)
+            if nested is not None:
+                user_ids |= collect_user_ids(field, nested)
+    user_ids.discard(None)
+    return user_ids
+
+
+def prefetch_cards(context, user_ids):
+    """
+    Loads the cards not yet in the serializer context with a single multi-get.
+    """
+    cards = context.setdefault('user_cards', {})
+    missing = set(user_ids) - cards.keys()
+    if missing:
+        cards.update(get_cards(missing))
+
+
+class UserCardSerializerMixin:
+    """
+    Serializer mixin that resolves every user card of an object (nested ones
+    included) with one multi-get before it is serialized.
+    """
+    def prefetch_page(self, instances):
+        """
+        Hook run once for a whole page (or a single object) before it is serialized.
+        Serializers load per-page data here and return the IDs of any extra user
+        cards they render, so those are fetched in the same multi-get.
+        """
+        return set()
+
+    def to_representation(self, instance):
+        prefetch_cards(self.context, collect_user_ids(self, instance) | self.prefetch_page([instance]))
+        return super().to_representation(instance)
+
+
+class UserCardListSerializer(serializers.ListSerializer):
+    """
+    List serializer that resolves the user cards of every item with one multi-get
+    before the items are serialized.
+    """
+    def to_representation(self, data):
+        items = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        user_ids = set()
+        for item in items:
+            user_ids |= collect_user_ids(self.child, item)
+        if isinstance(self.child, UserCardSerializerMixin):
+            user_ids |= self.child.prefetch_page(items)
+        prefetch_cards(self.context, user_ids)
+        return super().to_representation(items)
@@ -0,0 +1,221 @@
+# users/deletion.py
+"""
+Account deletion in the background.
+
+Deleting a user with instance.delete() makes Django collect every post, like,
+comment, follow, feed entry and notification of the account in memory and
+delete them in one transaction, which for an active account means a long
+request and long row locks. Instead, request_deletion() deactivates the user
+and revokes their token right away (one short transaction) and records an
+AccountDeletion; the purge_deleted_accounts worker then deletes the account's
+data in stages (AccountDeletion.STAGES), at most `batch_size` rows per
+transaction.
+
+Each batch fixes up what other users see as it goes: like and comment
+counters of their posts, their unread notification counts, their follow
+graph lists and their feeds. The batch and the deletion's progress are
+committed together, so an interrupted purge resumes where it stopped.
+"""
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+
+from follows.graph import follow_graph
+from follows.models import FeedEntry, Follow, FollowSuggestion
+from notifications.models import Notification, NotificationOutbox, NotificationState
+from notifications.unread import delete_notifications
+from posts.comments import delete_comments
+from posts.counters import adjust_by_occurrence, adjust_counter
+from posts.models import Comment, Like, Post, PostTerm
+from posts.search import get_search_backend
+from .authentication import revoke_user_tokens
+from .cards import invalidate_card
+from .models import AccountDeletion, CustomUser
+
+
+def request_deletion(user):
+    """
+    Deactivates `user`, revokes their token and queues their account for the purge (once).
+    """
+    with transaction.atomic():
+        CustomUser.objects.filter(pk=user.pk).update(is_active=False)
+        Token.objects.filter(user_id=user.pk).delete()
+        AccountDeletion.objects.bulk_create(
+            [AccountDeletion(user_id=user.pk, username=user.username)], ignore_conflicts=True,
+        )
+        transaction.on_commit(partial(revoke_user_tokens, user.pk))
+
+
+def _first_ids(queryset, batch_size):
+    return list(queryset.order_by('pk').values_list('pk', flat=True)[:batch_size])
+
+
+def _delete_first_batch(querysets, batch_size):
+    """
+    Deletes up to `batch_size` rows of the first non-empty queryset. Returns the number of rows deleted.
+    """
+    for queryset in querysets:
+        ids = _first_ids(queryset, batch_size)
+        if ids:
+            return queryset.model.objects.filter(pk__in=ids).delete()[0]
+    return 0
+
+
+def purge_feed_entries(user_id, batch_size):
+    """
+    Removes the user's posts from other users' feeds first, so they disappear from feeds early.
+    """
+    return _delete_first_batch([FeedEntry.objects.filter(author_id=user_id)], batch_size)
+
+
+def purge_posts(user_id, batch_size):
+    """
+    Deletes the rows that depend on the user's oldest posts, one batch at a
+    time, then the posts themselves. Counters of deleted posts need no fixing.
+    """
+    post_ids = _first_ids(Post.objects.filter(user_id=user_id), batch_size)
+    if not post_ids:
+        return 0
+    deleted = delete_notifications(
+        Notification.objects.filter(Q(post_id__in=post_ids) | Q(comment__post_id__in=post_ids)).order_by('pk')[:batch_size]
+    )
+    deleted = deleted or _delete_first_batch([
+        NotificationOutbox.objects.filter(Q(post_id__in=post_ids) | Q(comment__post_id__in=post_ids)),
+        FeedEntry.objects.filter(post_id__in=post_ids),
+        PostTerm.objects.filter(post_id__in=post_ids),
+        Like.objects.filter(post_id__in=post_ids),
+        Comment.objects.filter(post_id__in=post_ids),
+    ], batch_size)
+    if deleted:
+        return deleted
+    deleted, _ = Post.objects.filter(pk__in=post_ids).delete()
+    backend = get_search_backend()
+    transaction.on_commit(lambda: [backend.remove_post(post_id) for post_id in post_ids])
+    return deleted
+
+
+def purge_sent_notifications(user_id, batch_size):
+    """
+    Deletes the notifications the user caused, off their recipients' unread counts.
+    """
+    deleted = delete_notifications(Notification.objects.filter(sender_id=user_id).order_by('pk')[:batch_size])
+    return deleted or _delete_first_batch([NotificationOutbox.objects.filter(sender_id=user_id)], batch_size)
+
+
+def purge_likes(user_id, batch_size):
+    """
+    Deletes the user's likes and takes them off the liked posts' counters.
+    """
+    rows = list(Like.objects.filter(user_id=user_id).order_by('pk').values_list('pk', 'post_id')[:batch_size])
+    if not rows:
+        return 0
+    deleted, _ = Like.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+    adjust_by_occurrence(
+        [post_id for _, post_id in rows], lambda post_ids, delta: adjust_counter(post_ids, 'likes_count', delta), -1,
+    )
+    return deleted
+
+
+def purge_comments(user_id, batch_size):
+    """
+    Deletes the user's comments with the replies under them (and the
+    notifications about them), fixing the posts' and threads' counters.
+    """
+    comment_ids = _first_ids(Comment.objects.filter(user_id=user_id), batch_size)
+    return delete_comments(comment_ids) if comment_ids else 0
+
+
+def purge_follows(user_id, batch_size):
+    """
+    Deletes the user's follow edges in both directions and updates the follow
+    graph lists (and so the follower / following counts) of the other side.
+    """
+    rows = list(
+        Follow.objects.filter(Q(follower_id=user_id) | Q(following_id=user_id))
+        .order_by('pk').values_list('pk', 'follower_id', 'following_id')[:batch_size]
+    )
+    if not rows:
+        return 0
+    deleted, _ = Follow.objects.filter(pk__in=[pk for pk, _, _ in rows]).delete()
+    for _, follower_id, following_id in rows:
+        transaction.on_commit(partial(follow_graph.remove_edge, follower_id, following_id))
+    return deleted
+
+
+def purge_own_data(user_id, batch_size):
+    """
+    Deletes what only the user saw: their feed, notifications and suggestions.
+    """
+    return _delete_first_batch([
+        FeedEntry.objects.filter(owner_id=user_id),
+        Notification.objects.filter(recipient_id=user_id),
+        NotificationOutbox.objects.filter(recipient_id=user_id),
+        FollowSuggestion.objects.filter(Q(user_id=user_id) | Q(suggested_id=user_id)),
+        NotificationState.objects.filter(user_id=user_id),
+    ], batch_size)
+
+
+def purge_account(user_id, batch_size):
+    """
+    Deletes the user row itself; nothing of any size refers to it any more.
+    """
+    deleted, _ = CustomUser.objects.filter(pk=user_id).delete()
+    transaction.on_commit(partial(invalidate_card, user_id))
+    transaction.on_commit(partial(follow_graph.forget_user, user_id))
+    return deleted
+
+
+STAGE_PURGES = {
+    'feed_entries': purge_feed_entries,
+    'posts': purge_posts,
+    'sent_notifications': purge_sent_notifications,
+    'likes': purge_likes,
+    'comments': purge_comments,
+    'follows': purge_follows,
+    'own_data': purge_own_data,
+    'account': purge_account,
+}
+STAGE_ORDER = [stage for stage, _ in AccountDeletion.STAGES]
+
+
+def purge_step(deletion_id, batch_size=500):
+    """
+    Runs one batch of a deletion's current stage, moving on to the next stage
+    once the current one has nothing left. Returns the deletion as saved, or
+    None when another worker holds it.
+    """
+    with transaction.atomic():
+        deletion = AccountDeletion.objects.select_for_update(skip_locked=True).filter(pk=deletion_id).first()
+        if deletion is None or deletion.stage == 'done':
+            return deletion
+        deleted = STAGE_PURGES[deletion.stage](deletion.user_id, batch_size)
+        if deleted:
+            deletion.deleted_rows[deletion.stage] = deletion.deleted_rows.get(deletion.stage, 0) + deleted
+        if not deleted or deletion.stage == 'account':
+            deletion.stage = STAGE_ORDER[STAGE_ORDER.index(deletion.stage) + 1]
+            if deletion.stage == 'done':
+                deletion.finished_at = timezone.now()
+        deletion.save(update_fields=['stage', 'deleted_rows', 'finished_at', 'updated_at'])
+    return deletion
+
+
+def purge_all(batch_size=500, stdout=None):
+    """
+    Purges every pending deletion to completion. Returns (accounts finished, rows deleted).
+    """
+    finished = rows = 0
+    for deletion_id in AccountDeletion.objects.filter(finished_at__isnull=True).values_list('pk', flat=True):
+        while True:
+            deletion = purge_step(deletion_id, batch_size)
+            if deletion is None:
+                break # Being purged by another worker
+            if deletion.stage == 'done':
+                finished += 1
+                rows += sum(deletion.deleted_rows.values())
+                if stdout is not None:
+                    stdout.write(f"Purged account {deletion.username}: {deletion.deleted_rows}")
+                break
+    return finished, rows
@@ -0,0 +1,30 @@
+# users/management/commands/purge_deleted_accounts.py
+import time
+
+from django.core.management.base import BaseCommand
+
+from users.deletion import purge_all
+
+
+class Command(BaseCommand):
+    """
+    Worker that purges the data of deleted accounts in batches (see users/deletion.py).
+    Runs once by default; use --loop to keep polling for new deletions.
+    Safe to interrupt: a purge resumes from its last committed batch.
+    """
+    help = "Deletes the posts, likes, comments, follows and notifications of deleted accounts in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help="Rows deleted per transaction.")
+        parser.add_argument('--loop', action='store_true', help="Keep purging until interrupted.")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds to sleep between checks (with --loop).")
+
+    def handle(self, *args, **options):
+        stdout = self.stdout if options['verbosity'] > 1 else None
+        while True:
+            finished, rows = purge_all(batch_size=options['batch_size'], stdout=stdout)
+            if finished or not options['loop']:
+                self.stdout.write(f"Purged {finished} deleted accounts ({rows} rows).")
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
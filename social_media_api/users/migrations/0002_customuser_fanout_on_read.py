@@ -0,0 +1,18 @@
+# Generated by Django 5.2.5 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='customuser',
+            name='fanout_on_read',
+            field=models.BooleanField(default=False, help_text='Posts by this user are merged into feeds at read time.'),
+        ),
+    ]
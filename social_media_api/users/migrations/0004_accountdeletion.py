@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0003_customuser_avatar_asset'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AccountDeletion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('user_id', models.PositiveBigIntegerField(unique=True)),
+                ('username', models.CharField(max_length=150)),
+                ('stage', models.CharField(choices=[('feed_entries', 'Posts in other feeds'), ('posts', 'Posts'), ('sent_notifications', 'Sent notifications'), ('likes', 'Likes'), ('comments', 'Comments'), ('follows', 'Follows'), ('own_data', 'Own feed and notifications'), ('account', 'Account'), ('done', 'Done')], default='feed_entries', max_length=32)),
+                ('deleted_rows', models.JSONField(blank=True, default=dict)),
+                ('requested_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-18 04:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('assets', '0001_initial'),
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0004_accountdeletion'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customuser',
+            index=models.Index(fields=['fanout_on_read'], name='user_fanout_on_read_idx'),
+        ),
+    ]
@@ -11,9 +11,52 @@ class CustomUser(AbstractUser):
     """
     bio = models.TextField(blank=True, null=True, help_text="A short biography about the user.")
     profile_picture = models.ImageField(upload_to='profile_pics/', blank=True, null=True, help_text="User's profile picture.")
+    # Deduplicated upload behind `profile_picture`, with its resized variants (see assets/)
+    avatar_asset = models.ForeignKey('assets.MediaAsset', on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    # Set once an account has too many followers to fan its posts out on write (see follows/feed.py)
+    fanout_on_read = models.BooleanField(default=False, help_text="Posts by this user are merged into feeds at read time.")
 
     # You can add more fields here if needed later (e.g., date_of_birth, location)
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # The few fan-out-on-read authors, looked up by every feed read on a cold cache
+            models.Index(fields=['fanout_on_read'], name='user_fanout_on_read_idx'),
+        ]
+
     def __str__(self):
         return self.username
 
+
+class AccountDeletion(models.Model):
+    """
+    A deleted account whose data is purged in the background, in batches, by
+    the purge_deleted_accounts worker (see users/deletion.py). The user is
+    deactivated when the row is created and deleted in the last stage; the
+    row is kept as a record of the deletion.
+    """
+    STAGES = [
+        ('feed_entries', 'Posts in other feeds'),
+        ('posts', 'Posts'),
+        ('sent_notifications', 'Sent notifications'),
+        ('likes', 'Likes'),
+        ('comments', 'Comments'),
+        ('follows', 'Follows'),
+        ('own_data', 'Own feed and notifications'),
+        ('account', 'Account'),
+        ('done', 'Done'),
+    ]
+    user_id = models.PositiveBigIntegerField(unique=True) # Not a foreign key: the user row goes away in the last stage
+    username = models.CharField(max_length=150)
+    stage = models.CharField(max_length=32, choices=STAGES, default='feed_entries')
+    deleted_rows = models.JSONField(default=dict, blank=True) # Stage -> rows deleted so far
+    requested_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"Deletion of {self.username} ({self.stage})"
+
@@ -14,6 +14,8 @@ class IsOwnerOrReadOnly(permissions.BasePermission):
         # Write permissions are only allowed to the owner of the snippet.
         # obj is assumed to be an instance of a model with a 'user' attribute (like Post)
         # OR the obj itself is a User instance (like for UserProfileViewSet).
+        if hasattr(obj, 'user_id'):
+            return obj.user_id == request.user.pk # Compare IDs so the owner row is not loaded
         if hasattr(obj, 'user'):
             return obj.user == request.user
         return obj == request.user
@@ -1,5 +1,8 @@
+from django.db import models
 from rest_framework import serializers
 from .models import CustomUser
+from follows.graph import follow_graph # Follower / following counts
+from assets.fields import MediaUploadField, MediaUploadSerializerMixin # Deduplicated uploads
 
 class UserRegistrationSerializer(serializers.ModelSerializer):
     """
@@ -41,23 +44,53 @@ class UserRegistrationSerializer(serializers.ModelSerializer):
         return user
 
 
-class UserProfileSerializer(serializers.ModelSerializer):
+class FollowStatsListSerializer(serializers.ListSerializer):
+    """
+    List serializer that loads the follow stats of every user on a page at once.
+    """
+    def to_representation(self, data):
+        users = list(data.all() if isinstance(data, models.manager.BaseManager) else data)
+        stats = self.context.setdefault('follow_stats', {})
+        stats.update(follow_graph.counts([user.pk for user in users if user.pk not in stats]))
+        return super().to_representation(users)
+
+
+class FollowStatsMixin(serializers.Serializer):
+    """
+    Adds `stats` ({"followers": n, "following": n}), read from the in-memory follow graph.
+    """
+    stats = serializers.SerializerMethodField()
+
+    def get_stats(self, user):
+        stats = self.context.get('follow_stats', {})
+        if user.pk not in stats:
+            stats = follow_graph.counts([user.pk])
+        return stats[user.pk]
+
+
+class UserProfileSerializer(FollowStatsMixin, MediaUploadSerializerMixin, serializers.ModelSerializer):
     """
     Serializer for viewing and updating user profiles.
     Excludes password for security.
     """
+    profile_picture = MediaUploadField(required=False, allow_null=True) # Stored deduplicated, resized by the worker
+
     class Meta:
         model = CustomUser
-        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'bio', 'profile_picture', 'date_joined']
+        list_serializer_class = FollowStatsListSerializer
+        fields = ['id', 'username', 'email', 'first_name', 'last_name', 'bio', 'profile_picture', 'date_joined', 'stats']
         read_only_fields = ['id', 'username', 'email', 'date_joined'] # These fields are not directly editable via profile update
 
+    media_fields = {'profile_picture': 'avatar_asset'}
+
 
-class UserPublicSerializer(serializers.ModelSerializer):
+class UserPublicSerializer(FollowStatsMixin, serializers.ModelSerializer):
     """
     Serializer for public user profiles (e.g., when viewing another user's profile).
     Excludes sensitive information like email and bio for privacy by default.
     """
     class Meta:
         model = CustomUser
-        fields = ['id', 'username', 'profile_picture']
+        list_serializer_class = FollowStatsListSerializer
+        fields = ['id', 'username', 'profile_picture', 'stats']
         read_only_fields = ['id', 'username', 'profile_picture']
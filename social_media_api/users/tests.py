@@ -1,3 +1,288 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.db.models import Q
+from django.test import TestCase, override_settings
+
+from follows.graph import follow_graph
+from follows.models import FeedEntry, Follow
+from notifications.models import Notification, NotificationState
+from notifications.unread import get_unread_count, recount_unread
+from posts.models import Comment, Like, Post
+from rest_framework.authtoken.models import Token
+from social_media_api.querycount import QueryCounter
+from social_media_api.testing import QueryBudgetTestCase, async_read_views
+from . import authentication, deletion
+from .authentication import LocalTokenCache, get_token_user, local_tokens
+from .cards import card_key
+from .deletion import purge_all
+from .models import AccountDeletion, CustomUser
+
+
+class UserRouteQueryBudgetTests(QueryBudgetTestCase):
+    """
+    Every route in users/urls.py must stay within a fixed number of SQL queries.
+    """
+    def test_register(self):
+        self.client.credentials()
+        with self.assertQueryBudget(6):
+            response = self.client.post('/api/users/register/', {
+                'username': 'newcomer', 'email': 'newcomer@example.com',
+                'password': 'Str0ng-pass!', 'password2': 'Str0ng-pass!',
+            })
+        self.assertEqual(response.status_code, 201)
+
+    def test_login(self):
+        self.client.credentials()
+        with self.assertQueryBudget(2):
+            response = self.client.post('/api/users/login/', {'username': self.user.username, 'password': 'Str0ng-pass!'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_logout(self):
+        with self.assertQueryBudget(2):
+            response = self.client.post('/api/users/logout/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_list(self):
+        with self.assertQueryBudget(3):
+            response = self.client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_retrieve(self):
+        with self.assertQueryBudget(2):
+            response = self.client.get(f'/api/users/{self.users[1].pk}/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_partial_update(self):
+        with self.assertQueryBudget(3):
+            response = self.client.patch(f'/api/users/{self.user.pk}/', {'bio': 'Hello there'})
+        self.assertEqual(response.status_code, 200)
+
+    def test_destroy(self):
+        with self.assertQueryBudget(7):
+            response = self.client.delete(f'/api/users/{self.user.pk}/')
+        self.assertEqual(response.status_code, 202)
+
+
+class UserCardCacheTests(QueryBudgetTestCase):
+    """
+    Public user cards are served from the shared cache and refreshed on profile changes.
+    """
+    def author_card(self):
+        return self.client.get(f'/api/posts/user/{self.user.pk}/').data['results'][0]['user']
+
+    def test_cold_cache_loads_all_cards_of_a_page_in_one_query(self):
+        cache.clear()
+        with self.assertQueryBudget(3):
+            self.client.get('/api/posts/')
+        with self.assertQueryBudget(2):
+            self.client.get('/api/posts/')
+
+    def test_profile_update_refreshes_the_card(self):
+        cache.set(card_key(self.user.pk), {'id': self.user.pk, 'username': 'stale', 'profile_picture': None})
+        self.assertEqual(self.author_card()['username'], 'stale')
+
+        self.client.patch(f'/api/users/{self.user.pk}/', {'bio': 'Hello there'})
+        self.assertEqual(self.author_card()['username'], self.user.username)
+
+    def test_metrics_report_card_hits_and_misses(self):
+        self.assertEqual(self.client.get('/api/metrics/').status_code, 403)
+
+        CustomUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+        authentication.revoke_user_tokens(self.user.pk) # As the admin does, see CustomUserAdmin.save_model
+        response = self.client.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(response.data['user_cards']), {'hits', 'misses', 'hit_ratio'})
+
+
+class CachedTokenAuthenticationTests(QueryBudgetTestCase):
+    """
+    Tokens are looked up once, then served from the process LRU and the shared cache until revoked.
+    """
+    def test_warm_token_skips_the_database(self):
+        with self.assertQueryBudget(2):
+            self.client.get('/api/posts/')
+        with self.assertQueryBudget(1): # Only the page itself
+            self.client.get('/api/posts/')
+        local_tokens.clear() # As seen from another process: the shared cache answers
+        with self.assertQueryBudget(1):
+            self.client.get('/api/posts/')
+
+    def test_cached_user_holds_no_password(self):
+        get_token_user(self.user.auth_token.key)
+        user, token = get_token_user(self.user.auth_token.key)
+        self.assertEqual((user.pk, user.username, token.user_id), (self.user.pk, self.user.username, self.user.pk))
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertIsNot(user, get_token_user(self.user.auth_token.key)[0]) # A fresh instance per request
+
+    def test_logout_revokes_the_token_at_once(self):
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/users/logout/')
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+
+    def test_lookup_racing_a_logout_does_not_cache_the_token(self):
+        key = self.user.auth_token.key
+        load_entry = authentication._load_entry
+
+        def logout_after_read(key):
+            entry = load_entry(key) # Read before the logout commits, written to the cache after it
+            Token.objects.filter(key=key).delete()
+            authentication.revoke_user_tokens(self.user.pk)
+            return entry
+
+        with mock.patch.object(authentication, '_load_entry', logout_after_read):
+            self.assertIsNotNone(get_token_user(key))
+        self.assertIsNone(get_token_user(key))
+
+    def test_revocation_survives_an_evicted_generation(self):
+        key = self.user.auth_token.key
+        get_token_user(key)
+        cache.delete(authentication.generation_key(self.user.pk))
+        Token.objects.filter(key=key).delete()
+        authentication.revoke_user_tokens(self.user.pk)
+        self.assertIsNone(get_token_user(key))
+
+    def test_profile_update_refreshes_the_cached_user(self):
+        key = self.user.auth_token.key
+        get_token_user(key)
+        self.client.patch(f'/api/users/{self.user.pk}/', {'bio': 'Renamed'})
+        self.assertEqual(get_token_user(key)[0].bio, 'Renamed')
+
+    def test_deactivated_user_is_refused(self):
+        get_token_user(self.user.auth_token.key)
+        CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+        authentication.revoke_user_tokens(self.user.pk)
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+
+    def test_local_cache_is_bounded_and_expires(self):
+        lru = LocalTokenCache()
+        with override_settings(AUTH_TOKEN_LOCAL_SIZE=2, AUTH_TOKEN_LOCAL_TTL=5):
+            with mock.patch.object(authentication.time, 'monotonic', return_value=100.0):
+                for user_id in (1, 2, 3):
+                    lru.set(f'key{user_id}', (user_id, None, (), 0))
+                self.assertIsNone(lru.get('key1')) # Least recently used, evicted
+                self.assertIsNotNone(lru.get('key2'))
+            with mock.patch.object(authentication.time, 'monotonic', return_value=105.0):
+                self.assertIsNone(lru.get('key2')) # Expired
+        lru.discard_user(3)
+        self.assertEqual(len(lru), 0)
+
+    def test_metrics_report_token_lookups(self):
+        CustomUser.objects.filter(pk=self.user.pk).update(is_staff=True)
+        authentication.revoke_user_tokens(self.user.pk)
+        response = self.client.get('/api/metrics/')
+        self.assertGreaterEqual(response.data['auth_tokens']['misses'], 1)
+        self.assertIn('local_size', response.data['auth_tokens'])
+
+
+@async_read_views
+class AsyncCachedTokenTests(QueryBudgetTestCase):
+    """
+    The async views authenticate through the same caches and see revocations.
+    """
+    def test_revoked_token_is_refused(self):
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+        with QueryCounter() as counter:
+            self.assertEqual(self.client.get('/api/notifications/').status_code, 200)
+        self.assertFalse([sql for sql in counter.queries if 'authtoken_token' in sql]) # Served by the process LRU
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/api/users/logout/')
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+
+
+class AccountDeletionTests(QueryBudgetTestCase):
+    """
+    Deleting an account deactivates it at once; purge_deleted_accounts then
+    deletes its data in batches and fixes up other users' counters and graphs.
+    """
+    def setUp(self):
+        super().setUp()
+        self.others = [user.pk for user in self.users[1:]]
+        for user_id in self.others:
+            get_unread_count(user_id) # Counters exist, so the purge must keep them right
+
+    def purge(self, batch_size=4):
+        with self.captureOnCommitCallbacks(execute=True):
+            return purge_all(batch_size=batch_size)
+
+    def assert_purged(self):
+        user_id = self.user.pk
+        self.assertFalse(CustomUser.objects.filter(pk=user_id).exists())
+        self.assertFalse(Post.objects.filter(user_id=user_id).exists())
+        self.assertFalse(Like.objects.filter(user_id=user_id).exists())
+        self.assertFalse(Comment.objects.filter(user_id=user_id).exists())
+        self.assertFalse(Follow.objects.filter(Q(follower_id=user_id) | Q(following_id=user_id)).exists())
+        self.assertFalse(FeedEntry.objects.filter(Q(owner_id=user_id) | Q(author_id=user_id)).exists())
+        self.assertFalse(Notification.objects.filter(Q(recipient_id=user_id) | Q(sender_id=user_id)).exists())
+
+        for post in Post.objects.all():
+            self.assertEqual((post.likes_count, post.comments_count), (post.likes.count(), post.comments.count()))
+        for user_id in self.others:
+            count = NotificationState.objects.get(user_id=user_id).unread_count
+            self.assertEqual(count, recount_unread(user_id))
+            self.assertEqual(follow_graph.counts([user_id])[user_id], {
+                'followers': Follow.objects.filter(following_id=user_id).count(),
+                'following': Follow.objects.filter(follower_id=user_id).count(),
+            })
+
+    def test_delete_deactivates_and_revokes_the_token(self):
+        with self.captureOnCommitCallbacks(execute=True): # Revokes the cached token lookup
+            response = self.client.delete(f'/api/users/{self.user.pk}/')
+        self.assertEqual(response.status_code, 202)
+        self.assertFalse(CustomUser.objects.get(pk=self.user.pk).is_active)
+        self.assertTrue(Post.objects.filter(user=self.user).exists()) # Purged later
+        self.assertEqual(AccountDeletion.objects.get(user_id=self.user.pk).stage, 'feed_entries')
+
+        self.assertEqual(self.client.get('/api/notifications/').status_code, 401)
+        self.client.credentials()
+        self.assertEqual(self.client.get(f'/api/users/{self.user.pk}/').status_code, 404)
+
+    def test_purge_fixes_up_other_users(self):
+        follow_graph.counts(self.others) # Warm lists must be updated in place
+        self.client.delete(f'/api/users/{self.user.pk}/')
+        finished, rows = self.purge()
+        deletion_row = AccountDeletion.objects.get()
+        self.assertEqual((finished, rows), (1, sum(deletion_row.deleted_rows.values())))
+        self.assertEqual(deletion_row.stage, 'done')
+        self.assertIsNotNone(deletion_row.finished_at)
+        self.assertGreater(deletion_row.deleted_rows['posts'], 12)
+        self.assertIsNone(cache.get(card_key(self.user.pk)))
+        self.assert_purged()
+
+    def test_purge_of_replies_in_own_threads(self):
+        other = self.users[2]
+        threads = []
+        for post in Post.objects.filter(user=self.users[1])[:2]:
+            url = f'/api/posts/{post.pk}/comments/'
+            self.authenticate(self.user)
+            top = self.client.post(url, {'content': "Mine"}).json()['id']
+            self.authenticate(other)
+            answer = self.client.post(url, {'content': "Theirs", 'parent': top}).json()['id']
+            self.authenticate(self.user)
+            self.client.post(url, {'content': "Mine again", 'parent': answer}) # Listed twice: own comment and in own thread
+            threads.append(top)
+        Comment.objects.filter(pk=threads[1]).update(replies_count=0) # Drifted: its replies must still come off the post's count
+        self.client.delete(f'/api/users/{self.user.pk}/')
+        self.purge(batch_size=500) # All of the user's comments in one batch
+        self.assertFalse(Comment.objects.filter(thread_id__in=threads).exists())
+        self.assert_purged()
+
+    def test_interrupted_purge_resumes(self):
+        self.client.delete(f'/api/users/{self.user.pk}/')
+        purge_comments = deletion.purge_comments
+        calls = []
+
+        def fail_once(user_id, batch_size):
+            calls.append(user_id)
+            if len(calls) == 2:
+                raise DatabaseError('connection lost')
+            return purge_comments(user_id, batch_size)
+
+        with mock.patch.dict(deletion.STAGE_PURGES, {'comments': fail_once}):
+            with self.assertRaises(DatabaseError):
+                self.purge(batch_size=2)
+        self.assertEqual(AccountDeletion.objects.get().stage, 'comments')
+        self.assertEqual(self.purge(batch_size=2)[0], 1)
+        self.assert_purged()
@@ -4,12 +4,17 @@ from django.shortcuts import render
 from rest_framework import generics, status, views, viewsets
 from rest_framework.response import Response
 from rest_framework.authtoken.models import Token # For token-based authentication
+from django.db import transaction
 from rest_framework.permissions import AllowAny, IsAuthenticated # Import permissions
 from django.contrib.auth import authenticate, login, logout # Django's built-in auth functions
 
 from .models import CustomUser
 from .serializers import UserRegistrationSerializer, UserProfileSerializer, UserPublicSerializer
 from .permissions import IsOwnerOrReadOnly # Import your custom permission
+from .cards import refresh_card # Cached public user cards
+from .authentication import revoke_user_tokens # Cached token lookups
+from .deletion import request_deletion # Accounts are purged in the background
+from social_media_api.replicas import use_primary # Replicas may not have new accounts yet
 
 # API for User Registration
 class UserRegisterView(generics.CreateAPIView):
@@ -23,7 +28,8 @@ class UserRegisterView(generics.CreateAPIView):
 
     def post(self, request, *args, **kwargs):
         serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
+        with use_primary(): # Username / email uniqueness must be checked against the latest data
+            serializer.is_valid(raise_exception=True)
         user = serializer.save()
         token, created = Token.objects.get_or_create(user=user) # Generate token for new user
         return Response({
@@ -46,7 +52,8 @@ class UserLoginView(views.APIView):
         username = request.data.get('username')
         password = request.data.get('password')
 
-        user = authenticate(request, username=username, password=password)
+        with use_primary(): # The account may have been created a moment ago
+            user = authenticate(request, username=username, password=password)
 
         if user:
             # login(request, user) # Optional: Use Django's session login if SessionAuthentication is enabled
@@ -60,15 +67,15 @@ class UserLoginView(views.APIView):
 class UserLogoutView(views.APIView):
     """
     API endpoint for user logout.
-    Deletes the user's authentication token.
+    Deletes the user's authentication token and its cached lookup, so it stops working at once.
     Requires authentication.
     """
     permission_classes = [IsAuthenticated] # Only logged-in users can logout
 
     def post(self, request, *args, **kwargs):
         # Delete the user's current authentication token
-        if hasattr(request.user, 'auth_token'):
-            request.user.auth_token.delete()
+        Token.objects.filter(user_id=request.user.pk).delete()
+        transaction.on_commit(lambda: revoke_user_tokens(request.user.pk))
         # logout(request) # Optional: Clear Django's session if SessionAuthentication is used
         return Response({"message": "Successfully logged out."}, status=status.HTTP_200_OK)
 
@@ -80,10 +87,11 @@ class UserProfileViewSet(viewsets.ModelViewSet):
     - List (GET /api/users/): Public, but only shows basic public info.
     - Retrieve (GET /api/users/<id>/): Public, shows basic public info.
     - Update (PUT/PATCH /api/users/<id>/): Authenticated, owner-only.
-    - Destroy (DELETE /api/users/<id>/): Authenticated, owner-only.
+    - Destroy (DELETE /api/users/<id>/): Authenticated, owner-only. Deactivates the account
+      right away (202 Accepted); its data is purged in the background (see users/deletion.py).
     - Create is handled by UserRegisterView separately.
     """
-    queryset = CustomUser.objects.all()
+    queryset = CustomUser.objects.filter(is_active=True) # Deactivated accounts are gone from the API
     lookup_field = 'pk' # Ensures URLs use primary key
 
     def get_serializer_class(self):
@@ -111,14 +119,25 @@ class UserProfileViewSet(viewsets.ModelViewSet):
             permission_classes = [IsAuthenticated]
         return [permission() for permission in permission_classes]
 
-    def perform_destroy(self, instance):
+    def perform_update(self, serializer):
+        """
+        Saves the profile and refreshes the user's cached public card and token lookup.
+        """
+        user = serializer.save()
+        refresh_card(user)
+        revoke_user_tokens(user.pk)
+
+    def destroy(self, request, *args, **kwargs):
         """
-        Handles user account deletion.
+        Handles user account deletion: the account is deactivated and its
+        token revoked now, and its data purged by the purge_deleted_accounts worker.
         """
-        username = instance.username # Get username before deleting
-        instance.delete()
-        # No 204 No Content for DRF DefaultRouter delete method as per common practice
-        return Response({"message": f"User {username} and all associated data deleted successfully."}, status=status.HTTP_200_OK)
+        instance = self.get_object()
+        request_deletion(instance)
+        return Response(
+            {"message": f"User {instance.username} deactivated; all associated data will be deleted shortly."},
+            status=status.HTTP_202_ACCEPTED,
+        )
 
 
 # Create your views here.